@@ -0,0 +1,167 @@
+"""
+Opt-in semantic answer cache (ANSWER_CACHE_ENABLED=true).
+
+Answers are stored under the embedding of the turn's search query. A later
+turn whose query embedding has cosine similarity >= ANSWER_CACHE_THRESHOLD
+with a stored one, under the same index generation (search_cache) and scope
+(index, chat deployment, image tool allowed), gets the stored answer without
+search or chat calls.
+
+Only standalone turns take part: the pipeline stores and looks up a turn only
+when the session has no messages and no summary yet (so the prompt that
+produced the answer held no user's history) and its rewrite was skipped.
+Turns that called tools (images) are not stored.
+
+The index generation is per process (see search_cache), so after a
+re-ingestion from another process a stored answer can stay stale for up to
+ANSWER_CACHE_TTL_SECONDS; the default is kept short for that reason.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .search_cache import search_cache
+
+
+class CachedAnswer(NamedTuple):
+    reply: str
+    query: str
+    similarity: float
+    cost_ms: float  # latency of the turn that produced the answer
+
+
+class _Entry(NamedTuple):
+    row: int
+    scope: Tuple  # (index, chat deployment, image tool allowed)
+    generation: int
+    expires_at: float
+    reply: str
+    query: str
+    cost_ms: float
+
+
+class AnswerCache:
+    """
+    Bounded LRU of answers with a float32 matrix of their unit query vectors
+    (brute-force cosine; the cache is small). Expired entries and entries of an
+    older index generation are misses and are dropped when met.
+    """
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 1000, ttl_seconds: float = 300.0):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()  # by row, LRU order
+        self._matrix: Optional[np.ndarray] = None
+        self._live: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.saved_ms = 0.0
+
+    @classmethod
+    def from_env(cls) -> Optional["AnswerCache"]:
+        """The configured cache, or None unless ANSWER_CACHE_ENABLED=true."""
+        if os.environ.get("ANSWER_CACHE_ENABLED", "false").lower() != "true":
+            return None
+        return cls(
+            threshold=float(os.environ.get("ANSWER_CACHE_THRESHOLD", "0.95")),
+            max_entries=int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", "1000")),
+            ttl_seconds=float(os.environ.get("ANSWER_CACHE_TTL_SECONDS", "300")),
+        )
+
+    @staticmethod
+    def _unit(vector: Sequence[float]) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def _drop(self, row: int):
+        del self._entries[row]
+        self._live[row] = False
+
+    def get(self, vector: Sequence[float], scope: Tuple) -> Optional[CachedAnswer]:
+        """Best live entry of `scope` at or above the threshold, or None."""
+        q = self._unit(vector)
+        now = time.monotonic()
+        with self._lock:
+            if self._matrix is not None and self._matrix.shape[1] == q.shape[0] and self._entries:
+                scores = self._matrix @ q
+                scores[~self._live] = -np.inf
+                for row in np.argsort(-scores):
+                    row = int(row)
+                    if scores[row] < self.threshold:
+                        break
+                    entry = self._entries[row]
+                    if entry.expires_at <= now or entry.generation != search_cache.generation:
+                        self._drop(row)
+                        continue
+                    if entry.scope != scope:
+                        continue
+                    self._entries.move_to_end(row)
+                    self.hits += 1
+                    return CachedAnswer(entry.reply, entry.query, float(scores[row]), entry.cost_ms)
+            self.misses += 1
+            return None
+
+    def put(self, vector: Sequence[float], scope: Tuple, query: str, reply: str, cost_ms: float):
+        if self.max_entries <= 0 or not reply:
+            return
+        v = self._unit(vector)
+        with self._lock:
+            if self._matrix is None or self._matrix.shape[1] != v.shape[0]:
+                self._matrix = np.zeros((self.max_entries, v.shape[0]), dtype=np.float32)
+                self._live = np.zeros(self.max_entries, dtype=bool)
+                self._entries.clear()
+            if len(self._entries) >= self.max_entries:
+                self._drop(next(iter(self._entries)))  # least recently used
+            row = int(np.argmin(self._live))  # first free row
+            self._matrix[row] = v
+            self._live[row] = True
+            self._entries[row] = _Entry(
+                row, scope, search_cache.generation, time.monotonic() + self.ttl_seconds, reply, query, cost_ms
+            )
+
+    def record_saved(self, hit: CachedAnswer, elapsed_ms: float):
+        """Count the latency a hit avoided: the original turn's cost minus this turn's."""
+        with self._lock:
+            self.saved_ms += max(0.0, hit.cost_ms - elapsed_ms)
+
+    def record_skipped(self):
+        with self._lock:
+            self.skipped += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._live is not None:
+                self._live[:] = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "skipped": self.skipped,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "saved_ms": round(self.saved_ms, 1),
+                "avg_saved_ms": round(self.saved_ms / self.hits, 1) if self.hits else 0.0,
+            }
+
+
+# Process-wide instance (None when disabled)
+answer_cache = AnswerCache.from_env()
+
+
+def answer_cache_stats() -> Optional[Dict[str, Any]]:
+    return answer_cache.stats() if answer_cache is not None else None
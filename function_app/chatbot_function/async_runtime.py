@@ -0,0 +1,54 @@
+import asyncio
+import logging
+import threading
+from typing import Optional
+
+# One long-lived event loop per worker process. The sync Functions entry point
+# submits coroutines here, so async SDK clients (OpenAI, Search, Cosmos) can be
+# created once and reused across invocations instead of being bound to a
+# throwaway asyncio.run() loop.
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_lock = threading.Lock()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    if _loop is not None:
+        return _loop
+
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=loop.run_forever,
+                name="chatbot-async-runtime",
+                daemon=True,
+            )
+            thread.start()
+            _loop = loop
+    return _loop
+
+
+def run(coro, timeout: Optional[float] = None):
+    """Run a coroutine on the shared loop and block the calling thread for its result."""
+    future = asyncio.run_coroutine_threadsafe(coro, get_loop())
+    return future.result(timeout)
+
+
+_background = set()
+
+def spawn(coro, name: Optional[str] = None) -> asyncio.Task:
+    """
+    Start background work on the running loop without awaiting it (e.g. after the
+    response is ready). Keeps a strong reference until done and logs failures.
+    """
+    task = asyncio.get_running_loop().create_task(coro, name=name)
+    _background.add(task)
+    task.add_done_callback(_finish_background)
+    return task
+
+
+def _finish_background(task: asyncio.Task):
+    _background.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logging.error("Background task %s failed", task.get_name(), exc_info=task.exception())
@@ -0,0 +1,152 @@
+"""
+Token-budgeted packing of retrieved passages into the prompt's Sources block.
+
+Passages of the same file with consecutive chunkIds are merged into one span
+(text repeated at the start of the next chunk is stripped), spans are added in
+relevance (retrieval) order until the budget is spent, and the result is one
+line per story: its title once, then its spans in document order.
+"""
+
+import os
+from typing import Any, Dict, List, Optional
+
+from .tokens import get_encoding
+
+
+# Token budget of the Sources block (0 = unlimited)
+RAG_SOURCES_MAX_TOKENS = int(os.environ.get("RAG_SOURCES_MAX_TOKENS", "2000"))
+
+# A span cut to fit the remaining budget is dropped when shorter than this
+_MIN_PARTIAL_TOKENS = 40
+# Shortest repeated text treated as overlap (shorter matches are coincidence)
+_MIN_OVERLAP_CHARS = 16
+# Between non-adjacent spans of one story
+_GAP = " ... "
+
+
+def strip_overlap(previous: str, following: str) -> str:
+    """
+    `following` without the prefix it repeats from the end of `previous` (the
+    longest such overlap starting at a word boundary, at least _MIN_OVERLAP_CHARS).
+    """
+    anchor = following[:_MIN_OVERLAP_CHARS]
+    if len(anchor) < _MIN_OVERLAP_CHARS:
+        return following
+    pos = previous.find(anchor, max(0, len(previous) - len(following)))
+    while pos != -1:
+        if (pos == 0 or previous[pos - 1].isspace()) and following.startswith(previous[pos:]):
+            return following[len(previous) - pos:].lstrip()
+        pos = previous.find(anchor, pos + 1)
+    return following
+
+
+class _Span:
+    __slots__ = ("group", "title", "rank", "first_chunk", "last_chunk", "texts", "last_content")
+
+    def __init__(self, group, title: str, rank: int, chunk_id: Optional[int], text: str):
+        self.group = group
+        self.title = title
+        self.rank = rank
+        self.first_chunk = self.last_chunk = chunk_id
+        self.texts = [text]
+        # Unstripped text of the last chunk: the next chunk's overlap is a suffix of it
+        self.last_content = text
+
+    @property
+    def text(self) -> str:
+        return " ".join(t for t in self.texts if t)
+
+
+def _spans(passages: List[Dict[str, Any]], stats: Dict[str, int]) -> List[_Span]:
+    """Merge runs of consecutive chunkIds per file; rank = best rank in the run."""
+    by_group: Dict[Any, List] = {}
+    for rank, p in enumerate(passages):
+        raw = p.get("raw") or {}
+        group = raw.get("fileId") or raw.get("fileName") or p.get("title") or f"#{rank}"
+        by_group.setdefault(group, []).append((raw.get("chunkId"), rank, p))
+
+    spans: List[_Span] = []
+    for group, items in by_group.items():
+        with_ids = sorted((item for item in items if item[0] is not None), key=lambda item: item[0])
+        current: Optional[_Span] = None
+        for chunk_id, rank, p in with_ids:
+            if current is not None and chunk_id == current.last_chunk:
+                current.rank = min(current.rank, rank)  # same chunk retrieved twice
+                continue
+            if current is not None and chunk_id == current.last_chunk + 1:
+                text = strip_overlap(current.last_content, p["content"])
+                stats["overlap_chars"] += len(p["content"]) - len(text)
+                stats["merged"] += 1
+                current.texts.append(text)
+                current.last_content = p["content"]
+                current.last_chunk = chunk_id
+                current.rank = min(current.rank, rank)
+                continue
+            current = _Span(group, p["title"], rank, chunk_id, p["content"])
+            spans.append(current)
+        spans.extend(_Span(group, p["title"], rank, None, p["content"]) for chunk_id, rank, p in items if chunk_id is None)
+    return spans
+
+
+def _truncate(encoding, tokens: List[int], limit: int) -> str:
+    """First `limit` tokens, cut back to the last whitespace so no word is split."""
+    text = encoding.decode(tokens[:limit])
+    cut = text.rfind(" ")
+    return text[:cut] if cut > 0 else text
+
+
+def pack_sources(
+    passages: List[Dict[str, Any]],
+    max_tokens: int = RAG_SOURCES_MAX_TOKENS,
+    deployment: Optional[str] = None,
+    stats: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Sources block for `passages` ({title, content, raw}, most relevant first)
+    within `max_tokens` tokens of the deployment's encoding (0 = no budget).
+    `stats` (optional) receives source_tokens, source_spans, source_merged,
+    source_overlap_chars, source_dropped and source_truncated.
+    """
+    encoding = get_encoding(deployment or os.environ.get("AZURE_OPENAI_DEPLOYMENT_NAME") or "")
+    counts = {"merged": 0, "overlap_chars": 0}
+    spans = sorted(_spans(passages, counts), key=lambda s: s.rank)
+
+    remaining = max_tokens if max_tokens > 0 else None
+    chosen: Dict[Any, List[_Span]] = {}  # insertion order = relevance order of the stories
+    dropped = truncated = 0
+    for span in spans:
+        text = span.text
+        if not text:
+            continue
+        # Title prefix (or gap) and newline are paid once per story / per extra span
+        overhead = len(encoding.encode(f"{span.title}: \n" if span.group not in chosen else _GAP))
+        tokens = encoding.encode(text)
+        cost = overhead + len(tokens)
+        if remaining is not None and cost > remaining:
+            room = remaining - overhead
+            if room < _MIN_PARTIAL_TOKENS:
+                dropped += 1
+                continue
+            span.texts = [_truncate(encoding, tokens, room)]
+            truncated += 1
+            cost = overhead + room
+        chosen.setdefault(span.group, []).append(span)
+        if remaining is not None:
+            remaining -= cost
+
+    lines = []
+    for group_spans in chosen.values():
+        group_spans.sort(key=lambda s: (s.first_chunk is None, s.first_chunk or 0))
+        lines.append(f"{group_spans[0].title}: " + _GAP.join(s.text for s in group_spans))
+    packed = "\n".join(lines)
+
+    if stats is not None:
+        stats.update(
+            source_tokens=len(encoding.encode(packed)),
+            source_spans=sum(len(s) for s in chosen.values()),
+            source_merged=counts["merged"],
+            source_overlap_chars=counts["overlap_chars"],
+            source_dropped=dropped,
+            source_truncated=truncated,
+        )
+    return packed
@@ -1,37 +1,141 @@
 from azure.cosmos import CosmosClient, PartitionKey
+from azure.cosmos.aio import CosmosClient as AsyncCosmosClient
+from azure.core import MatchConditions
+from azure.core.pipeline.transport import RequestsTransport
+from requests.adapters import HTTPAdapter
 import os
+import threading
+import requests
 from datetime import datetime
 
 
-class CosmosSessionManager:
-    def __init__(self, session_id, db_name="ChatDB", container_name="Sessions"):
-        self.session_id = session_id
-        self.cosmos_uri = os.environ.get("COSMOS_URI")
-        self.cosmos_key = os.environ.get("COSMOS_KEY")
+# Process-wide Cosmos handles. Creating a CosmosClient costs an account read plus
+# a TLS handshake, and create_*_if_not_exists two control-plane calls, so they are
+# done once per worker; a session turn is then one point read (+ one upsert).
+_lock = threading.Lock()
+_client = None
+_async_client = None
+_containers = {}
+_async_containers = {}
+
+
+def _auto_provision() -> bool:
+    return os.environ.get("COSMOS_AUTO_PROVISION", "true").lower() not in ("0", "false", "no")
+
+
+def get_cosmos_client(**kwargs) -> CosmosClient:
+    """
+    Shared sync CosmosClient with a pooled requests session
+    (COSMOS_CONNECTION_POOL_SIZE, default 20). kwargs only apply on first creation.
+    """
+    global _client
+    if _client is not None:
+        return _client
+
+    with _lock:
+        if _client is None:
+            if "transport" not in kwargs:
+                pool_size = int(os.environ.get("COSMOS_CONNECTION_POOL_SIZE", "20"))
+                session = requests.Session()
+                session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+                kwargs["transport"] = RequestsTransport(session=session, session_owner=False)
+            _client = CosmosClient(os.environ.get("COSMOS_URI"), credential=os.environ.get("COSMOS_KEY"), **kwargs)
+    return _client
+
+
+def provision(db_name="ChatDB", container_name="Sessions"):
+    """One-time setup: create the database and container if they do not exist yet."""
+    db = get_cosmos_client().create_database_if_not_exists(id=db_name)
+    return db.create_container_if_not_exists(
+        id=container_name,
+        partition_key=PartitionKey(path="/session_id")
+    )
 
-        self.client = CosmosClient(self.cosmos_uri, credential=self.cosmos_key)
-        self.db = self.client.create_database_if_not_exists(id=db_name)
-        self.container = self.db.create_container_if_not_exists(
+
+def get_container(db_name="ChatDB", container_name="Sessions"):
+    """
+    Cached container handle. The first call per process provisions the container
+    unless COSMOS_AUTO_PROVISION is false (then the handle is built with no round trip).
+    """
+    key = (db_name, container_name)
+    container = _containers.get(key)
+    if container is not None:
+        return container
+
+    with _lock:
+        container = _containers.get(key)
+        if container is None:
+            if _auto_provision():
+                container = provision(db_name, container_name)
+            else:
+                container = get_cosmos_client().get_database_client(db_name).get_container_client(container_name)
+            _containers[key] = container
+    return container
+
+
+def get_async_cosmos_client(**kwargs) -> AsyncCosmosClient:
+    """Shared azure.cosmos.aio client; its aiohttp session pools connections on the async_runtime loop."""
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncCosmosClient(
+            os.environ.get("COSMOS_URI"), credential=os.environ.get("COSMOS_KEY"), **kwargs
+        )
+    return _async_client
+
+
+async def get_async_container(db_name="ChatDB", container_name="Sessions"):
+    """Async counterpart of get_container(); call from the async_runtime loop only."""
+    key = (db_name, container_name)
+    container = _async_containers.get(key)
+    if container is not None:
+        return container
+
+    client = get_async_cosmos_client()
+    if _auto_provision():
+        db = await client.create_database_if_not_exists(id=db_name)
+        container = await db.create_container_if_not_exists(
             id=container_name,
             partition_key=PartitionKey(path="/session_id")
         )
+    else:
+        container = client.get_database_client(db_name).get_container_client(container_name)
+    return _async_containers.setdefault(key, container)
+
 
-        self.messages = self._load_messages()
+def _session_document(session):
+    return {
+        "id": session.session_id,
+        "session_id": session.session_id,
+        "created_at": datetime.utcnow().isoformat(),
+        "messages": session.messages,
+        # Rolling summary of the messages already folded out of `messages`;
+        # summary_upto counts them (absolute index of messages[0] in the session).
+        "summary": session.summary,
+        "summary_upto": session.summary_upto,
+    }
 
-    def _load_messages(self):
+
+class CosmosSessionManager:
+    def __init__(self, session_id, db_name="ChatDB", container_name="Sessions", load=True):
+        self.session_id = session_id
+        self.container = get_container(db_name, container_name)
+        self.messages = []
+        self.summary = ""
+        self.summary_upto = 0
+        if load:
+            self._load()
+
+    def _load(self):
         try:
             item = self.container.read_item(item=self.session_id, partition_key=self.session_id)
-            return item["messages"]
         except Exception:
-            return []
+            return
+        self.messages = item["messages"]
+        self.summary = item.get("summary") or ""
+        self.summary_upto = item.get("summary_upto") or 0
 
     def save(self):
-        self.container.upsert_item({
-            "id": self.session_id,
-            "session_id": self.session_id,
-            "created_at": datetime.utcnow().isoformat(),
-            "messages": self.messages
-        })
+        self.container.upsert_item(_session_document(self))
 
     def add_message(self, role, content):
         self.messages.append({"role": role, "content": content})
@@ -39,6 +143,8 @@ class CosmosSessionManager:
 
     def clear(self):
         self.messages = []
+        self.summary = ""
+        self.summary_upto = 0
         self.save()
 
     # def list_all_sessions(self):
@@ -70,4 +176,53 @@ class CosmosSessionManager:
     #             if content and content.lower() not in ["clear", "restart", "history", "list_sessions"]:
     #                 return content[:50] + "..." if len(content) > 50 else content
         
-    #     return "New Chat"
\ No newline at end of file
+    #     return "New Chat"
+
+
+class AsyncCosmosSessionManager:
+    """
+    azure.cosmos.aio counterpart of CosmosSessionManager for the async pipeline.
+    Build with `await AsyncCosmosSessionManager.open(session_id)`.
+    """
+
+    def __init__(self, session_id, container):
+        self.session_id = session_id
+        self.container = container
+        self.messages = []
+        self.summary = ""
+        self.summary_upto = 0
+        self.etag = None
+
+    @classmethod
+    async def open(cls, session_id, db_name="ChatDB", container_name="Sessions", load=True):
+        self = cls(session_id, await get_async_container(db_name, container_name))
+        if load:
+            await self._load()
+        return self
+
+    async def _load(self):
+        try:
+            item = await self.container.read_item(item=self.session_id, partition_key=self.session_id)
+        except Exception:
+            return
+        self.messages = item["messages"]
+        self.summary = item.get("summary") or ""
+        self.summary_upto = item.get("summary_upto") or 0
+        self.etag = item.get("_etag")
+
+    async def save(self, if_match=False):
+        """
+        Upsert the session. With if_match=True the write only succeeds if nobody
+        saved since this copy was loaded/saved (raises CosmosAccessConditionFailedError).
+        """
+        kwargs = {}
+        if if_match and self.etag:
+            kwargs = dict(etag=self.etag, match_condition=MatchConditions.IfNotModified)
+        item = await self.container.upsert_item(_session_document(self), **kwargs)
+        self.etag = (item or {}).get("_etag")
+
+    async def clear(self):
+        self.messages = []
+        self.summary = ""
+        self.summary_upto = 0
+        await self.save()
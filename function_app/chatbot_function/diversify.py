@@ -0,0 +1,116 @@
+"""
+Optional post-retrieval stage (RETRIEVAL_DIVERSIFY=true): over-fetch candidates,
+drop chunks adjacent to a better-ranked chunk of the same file (they overlap
+it), then pick the final k with Maximal Marginal Relevance so one story's
+neighbouring chunks do not crowd out other sources.
+"""
+
+import os
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+RETRIEVAL_DIVERSIFY = os.environ.get("RETRIEVAL_DIVERSIFY", "false").lower() == "true"
+RETRIEVAL_CANDIDATES = int(os.environ.get("RETRIEVAL_CANDIDATES", "30"))
+# chunkId distance within which a lower-ranked chunk of the same file is dropped (0 = off)
+RETRIEVAL_ADJACENT_WINDOW = int(os.environ.get("RETRIEVAL_ADJACENT_WINDOW", "1"))
+# 1.0 = relevance only, 0.0 = novelty only
+RETRIEVAL_MMR_LAMBDA = float(os.environ.get("RETRIEVAL_MMR_LAMBDA", "0.7"))
+# Fetch contentVector for MMR (RETRIEVAL_CANDIDATES x dimensions floats per search;
+# the index field must be retrievable). Off: similarity is word overlap between chunks
+RETRIEVAL_MMR_USE_VECTORS = os.environ.get("RETRIEVAL_MMR_USE_VECTORS", "false").lower() == "true"
+
+VECTOR_FIELD = "contentVector"
+
+_WORD = re.compile(r"\w+")
+
+
+def drop_adjacent(docs: Sequence[Dict[str, Any]], window: int = RETRIEVAL_ADJACENT_WINDOW) -> Tuple[List[Dict], int]:
+    """Keep docs in rank order, skipping any within `window` chunkIds of a kept doc of the same file."""
+    if window <= 0:
+        return list(docs), 0
+    kept: List[Dict[str, Any]] = []
+    taken: Dict[Any, List[int]] = {}
+    for doc in docs:
+        file_id, chunk_id = doc.get("fileId") or doc.get("fileName"), doc.get("chunkId")
+        if file_id is not None and chunk_id is not None:
+            near = taken.setdefault(file_id, [])
+            if any(abs(chunk_id - other) <= window for other in near):
+                continue
+            near.append(chunk_id)
+        kept.append(doc)
+    return kept, len(docs) - len(kept)
+
+
+def _unit_rows(vectors: Sequence[Sequence[float]]) -> np.ndarray:
+    m = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    return m / np.where(norms > 0, norms, 1)
+
+
+def _word_overlap(docs: Sequence[Dict[str, Any]]) -> np.ndarray:
+    """Pairwise Jaccard similarity of the chunks' word sets."""
+    sets = [set(_WORD.findall(str(d.get("chunk") or "").lower())) for d in docs]
+    n = len(sets)
+    sim = np.eye(n, dtype=np.float32)
+    for i in range(n):
+        for j in range(i + 1, n):
+            union = len(sets[i] | sets[j])
+            sim[i, j] = sim[j, i] = len(sets[i] & sets[j]) / union if union else 0.0
+    return sim
+
+
+def mmr(
+    query_vector: Optional[Sequence[float]],
+    docs: Sequence[Dict[str, Any]],
+    k: int,
+    lambda_: float = RETRIEVAL_MMR_LAMBDA,
+) -> List[Dict[str, Any]]:
+    """
+    Greedy MMR: repeatedly take the doc maximizing
+        lambda * relevance(doc) - (1 - lambda) * max similarity(doc, already taken).
+    Relevance and similarity are cosines when every doc carries its vector;
+    otherwise relevance follows the search rank and similarity is word overlap.
+    """
+    if len(docs) <= 1 or k <= 0:
+        return list(docs[:k])
+
+    if query_vector is not None and all(d.get(VECTOR_FIELD) for d in docs):
+        m = _unit_rows([d[VECTOR_FIELD] for d in docs])
+        relevance = m @ _unit_rows([query_vector])[0]
+        sim = m @ m.T
+    else:
+        n = len(docs)
+        relevance = 1.0 - np.arange(n, dtype=np.float32) / n
+        sim = _word_overlap(docs)
+
+    selected: List[int] = [int(np.argmax(relevance))]
+    redundancy = sim[selected[0]].copy()
+    remaining = np.ones(len(docs), dtype=bool)
+    remaining[selected[0]] = False
+    while len(selected) < min(k, len(docs)):
+        score = lambda_ * relevance - (1 - lambda_) * redundancy
+        score[~remaining] = -np.inf
+        best = int(np.argmax(score))
+        selected.append(best)
+        remaining[best] = False
+        redundancy = np.maximum(redundancy, sim[best])
+    return [docs[i] for i in selected]
+
+
+def diversify(
+    query_vector: Optional[Sequence[float]],
+    candidates: Sequence[Dict[str, Any]],
+    k: int,
+    diagnostics: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """drop_adjacent() then mmr(); candidates are in search rank order."""
+    kept, dropped = drop_adjacent(candidates)
+    final = mmr(query_vector, kept, k)
+    if diagnostics is not None:
+        diagnostics["candidates"] = len(candidates)
+        diagnostics["adjacent_dropped"] = dropped
+        diagnostics["distinct_files"] = len({d.get("fileId") or d.get("fileName") for d in final})
+    return final
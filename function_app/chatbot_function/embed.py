@@ -1,12 +1,175 @@
+import logging
 import os
-from .openai_client import init_openai_client
+import time
+from typing import Dict, List, Optional, Sequence
+
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+from .openai_client import init_openai_client, init_async_openai_client
+from .embedding_cache import EmbeddingCache, normalize_text
+from .tokens import get_encoding
 
 
 
 client, _ = init_openai_client()
 
 embedding_model = os.environ.get("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
+# Shortened vectors for models that support it (text-embedding-3-*); unset = native size.
+# Must match vector_search_dimensions of the index (scripts/create_search_index.py --dimensions).
+embedding_dimensions = int(os.environ.get("AZURE_OPENAI_EMBEDDING_DIMENSIONS", "0")) or None
+# Names the vector space: cache keys and chunk content hashes change with the dimensions
+embedding_id = f"{embedding_model}:{embedding_dimensions}" if embedding_dimensions else embedding_model
+_dimensions = {"dimensions": embedding_dimensions} if embedding_dimensions else {}
+
+# In-process LRU, plus a SQLite tier when EMBEDDING_CACHE_PATH is set
+embedding_cache = EmbeddingCache.from_env()
 
 def embed_text(text: str) -> list[float]:
-    response = client.embeddings.create(model=embedding_model, input=[text])
-    return response.data[0].embedding
+    cached = embedding_cache.get(embedding_id, text)
+    if cached is not None:
+        return cached.tolist()
+
+    response = client.embeddings.create(model=embedding_model, input=[text], **_dimensions)
+    emb = response.data[0].embedding
+    embedding_cache.put(embedding_id, text, emb)
+    return emb
+
+
+async def aembed_text(text: str, client=None) -> list[float]:
+    cached = embedding_cache.get(embedding_id, text)
+    if cached is not None:
+        return cached.tolist()
+
+    if client is None:
+        client, _ = init_async_openai_client()
+    response = await client.embeddings.create(model=embedding_model, input=[text], **_dimensions)
+    emb = response.data[0].embedding
+    embedding_cache.put(embedding_id, text, emb)
+    return emb
+
+
+async def aembed_texts(texts: Sequence[str], client=None) -> List[List[float]]:
+    """
+    Embeddings for a few query texts, in input order: cached texts are served
+    locally, the rest go out in one embeddings.create call (no batching limits;
+    for ingestion-sized inputs use embed_texts()).
+    """
+    vectors: List = [None] * len(texts)
+    pending: Dict[str, List[int]] = {}
+    for i, text in enumerate(texts):
+        cached = embedding_cache.get(embedding_id, text)
+        if cached is not None:
+            vectors[i] = cached.tolist()
+        else:
+            pending.setdefault(normalize_text(text), []).append(i)
+    if not pending:
+        return vectors
+
+    if client is None:
+        client, _ = init_async_openai_client()
+    unique = [texts[positions[0]] for positions in pending.values()]
+    response = await client.embeddings.create(model=embedding_model, input=unique, **_dimensions)
+    for text, d in zip(unique, sorted(response.data, key=lambda d: d.index)):
+        embedding_cache.put(embedding_id, text, d.embedding)
+        for i in pending[normalize_text(text)]:
+            vectors[i] = d.embedding
+    return vectors
+
+
+# ---- Batched embeddings (ingestion) ----
+
+# Limits per embeddings.create call (the service allows up to 2048 inputs)
+EMBED_BATCH_MAX_ITEMS = int(os.environ.get("EMBED_BATCH_MAX_ITEMS", "256"))
+EMBED_BATCH_MAX_TOKENS = int(os.environ.get("EMBED_BATCH_MAX_TOKENS", "100000"))
+# Same-batch retries for throttling/transient errors, on top of the client's own
+EMBED_BATCH_RETRIES = 3
+EMBED_BATCH_BACKOFF_SECONDS = 1.0
+
+_TRANSIENT_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+
+
+def pack_batches(texts: Sequence[str], max_items: int, max_tokens: int) -> List[List[int]]:
+    """
+    Group text indexes into consecutive batches of at most `max_items` texts and
+    `max_tokens` tokens (a single oversized text still gets its own batch).
+    """
+    enc = get_encoding(embedding_model or "")
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for i, text in enumerate(texts):
+        n = len(enc.encode(text))
+        if current and (len(current) >= max_items or current_tokens + n > max_tokens):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += n
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _create_embeddings(batch: List[str], stats: Dict[str, int]) -> List[List[float]]:
+    for attempt in range(EMBED_BATCH_RETRIES):
+        try:
+            stats["requests"] += 1
+            response = client.embeddings.create(model=embedding_model, input=batch, **_dimensions)
+            usage = getattr(response, "usage", None)
+            stats["tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+            return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+        except _TRANSIENT_ERRORS:
+            if attempt == EMBED_BATCH_RETRIES - 1:
+                raise
+            stats["retries"] += 1
+            time.sleep(EMBED_BATCH_BACKOFF_SECONDS * (2 ** attempt))
+
+
+def _embed_batch(batch: List[str], stats: Dict[str, int]) -> List[List[float]]:
+    """Embed one batch; on failure split it and retry only the halves (down to single texts)."""
+    try:
+        return _create_embeddings(batch, stats)
+    except Exception as e:
+        if len(batch) == 1:
+            raise
+        logging.warning(f"Embedding batch of {len(batch)} failed ({e}); retrying as two halves")
+        stats["splits"] += 1
+        mid = len(batch) // 2
+        return _embed_batch(batch[:mid], stats) + _embed_batch(batch[mid:], stats)
+
+
+def embed_texts(
+    texts: Sequence[str],
+    *,
+    max_items: int = EMBED_BATCH_MAX_ITEMS,
+    max_tokens: int = EMBED_BATCH_MAX_TOKENS,
+    stats: Optional[Dict[str, int]] = None,
+) -> List[List[float]]:
+    """
+    Embeddings for many texts, in input order, with as few embeddings.create
+    calls as the item/token limits allow. Cached texts and duplicates are not re-sent.
+    If given, `stats` is filled with requests, retries, splits, tokens (as billed)
+    and cached counts for this call.
+    """
+    if stats is None:
+        stats = {}
+    for key in ("requests", "retries", "splits", "tokens", "cached"):
+        stats.setdefault(key, 0)
+
+    vectors: List = [None] * len(texts)
+    pending: Dict[str, List[int]] = {}
+    for i, text in enumerate(texts):
+        cached = embedding_cache.get(embedding_id, text)
+        if cached is not None:
+            vectors[i] = cached.tolist()
+            stats["cached"] += 1
+        else:
+            pending.setdefault(normalize_text(text), []).append(i)
+
+    unique = [texts[positions[0]] for positions in pending.values()]
+    for batch in pack_batches(unique, max_items, max_tokens):
+        batch_texts = [unique[j] for j in batch]
+        for text, emb in zip(batch_texts, _embed_batch(batch_texts, stats)):
+            embedding_cache.put(embedding_id, text, emb)
+            for i in pending[normalize_text(text)]:
+                vectors[i] = emb
+    return vectors
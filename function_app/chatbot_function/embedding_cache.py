@@ -0,0 +1,161 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, Optional, Sequence
+
+
+def normalize_text(text: str) -> str:
+    """Whitespace-insensitive form used for cache keys."""
+    return " ".join((text or "").split())
+
+
+def cache_key(model: str, text: str) -> str:
+    h = hashlib.sha256()
+    h.update((model or "").encode("utf-8"))
+    h.update(b"\0")
+    h.update(normalize_text(text).encode("utf-8"))
+    return h.hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache keyed by sha256(deployment, normalized text).
+
+    - Memory tier: LRU of float32 arrays, evicted by total bytes.
+    - Disk tier (optional): SQLite file, evicted by total bytes (least recently used first).
+
+    Vectors are kept as array('f') (4 bytes per dimension) rather than lists of floats.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, path: Optional[str] = None,
+                 max_disk_bytes: int = 512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.path = path
+
+        self._lru: "OrderedDict[str, array]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._db = None
+        self._disk_bytes = 0
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS ix_last_used ON embeddings(last_used)")
+            self._db.commit()
+            self._disk_bytes = self._db.execute(
+                "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+            ).fetchone()[0]
+
+    @classmethod
+    def from_env(cls) -> "EmbeddingCache":
+        return cls(
+            max_bytes=int(float(os.environ.get("EMBEDDING_CACHE_MAX_MB", "64")) * 1024 * 1024),
+            path=os.environ.get("EMBEDDING_CACHE_PATH") or None,
+            max_disk_bytes=int(float(os.environ.get("EMBEDDING_CACHE_DISK_MAX_MB", "512")) * 1024 * 1024),
+        )
+
+    def get(self, model: str, text: str) -> Optional[array]:
+        key = cache_key(model, text)
+        with self._lock:
+            vec = self._lru.get(key)
+            if vec is not None:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return vec
+
+            if self._db is not None:
+                row = self._db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE embeddings SET last_used = ? WHERE key = ?", (time.time(), key))
+                    self._db.commit()
+                    vec = array("f")
+                    vec.frombytes(row[0])
+                    self._remember(key, vec)
+                    self.disk_hits += 1
+                    return vec
+
+            self.misses += 1
+            return None
+
+    def put(self, model: str, text: str, vector: Sequence[float]) -> array:
+        key = cache_key(model, text)
+        vec = array("f", vector)
+        with self._lock:
+            self._remember(key, vec)
+            if self._db is not None:
+                row = self._db.execute("SELECT LENGTH(vector) FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._disk_bytes -= row[0]
+                self._db.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                    (key, vec.tobytes(), time.time()),
+                )
+                self._disk_bytes += vec.itemsize * len(vec)
+                self._evict_disk()
+                self._db.commit()
+        return vec
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "entries": len(self._lru),
+                "bytes": self._bytes,
+                "disk_bytes": self._disk_bytes,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+            self._bytes = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM embeddings")
+                self._db.commit()
+                self._disk_bytes = 0
+
+    # -- internals (caller holds the lock) --
+
+    def _remember(self, key: str, vec: array):
+        old = self._lru.pop(key, None)
+        if old is not None:
+            self._bytes -= old.itemsize * len(old)
+        self._lru[key] = vec
+        self._bytes += vec.itemsize * len(vec)
+        while self._bytes > self.max_bytes and len(self._lru) > 1:
+            _, evicted = self._lru.popitem(last=False)
+            self._bytes -= evicted.itemsize * len(evicted)
+            self.evictions += 1
+
+    def _evict_disk(self):
+        if self._disk_bytes <= self.max_disk_bytes:
+            return
+        excess = self._disk_bytes - self.max_disk_bytes
+        freed = 0
+        doomed = []
+        for key, size in self._db.execute("SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used"):
+            doomed.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._db.executemany("DELETE FROM embeddings WHERE key = ?", doomed)
+        self._disk_bytes -= freed
+        self.evictions += len(doomed)
@@ -0,0 +1,436 @@
+"""
+In-process search backend (SEARCH_BACKEND=local): a small stand-in for Azure AI
+Search for offline runs, load tests and small story corpora.
+
+LocalSearchIndex implements the subset of SearchClient the app uses:
+  - search(search_text, vector_queries, select, top, filter): BM25 over `chunk`,
+    cosine KNN over `contentVector`, both fused with Reciprocal Rank Fusion
+    (as the service does for hybrid queries)
+  - upload_documents / delete_documents, with IndexingResult-like results
+  - filters: "fileId eq '<id>'" and "search.in(id, '<a,b,...>', ',')"
+Vectors are a float32 matrix searched by brute force, or an HNSW graph when
+LOCAL_SEARCH_ANN=hnsw and hnswlib is installed. With LOCAL_SEARCH_PATH the
+index is saved there (throttled, and at exit) and reloaded on start.
+"""
+
+import asyncio
+import atexit
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+try:
+    import hnswlib  # optional: approximate KNN for larger corpora
+except ImportError:  # pragma: no cover - brute force is used instead
+    hnswlib = None
+
+
+KEY_FIELD = "id"
+TEXT_FIELD = "chunk"
+VECTOR_FIELD = "contentVector"
+RRF_K = 60  # rank constant of Reciprocal Rank Fusion
+
+
+class IndexingResult(NamedTuple):
+    key: str
+    succeeded: bool
+    status_code: int
+    error_message: Optional[str] = None
+
+
+class _VectorStore:
+    """
+    Unit-normalized float32 rows (cosine = dot product; OpenAI embeddings are
+    already unit length, so retrieved vectors match the uploaded ones). Deleted
+    rows are reused; brute force masks them, the HNSW graph marks them deleted.
+    """
+
+    def __init__(self, use_hnsw: bool = False, m: int = 16, ef_construction: int = 200, ef_search: int = 64):
+        self.use_hnsw = use_hnsw and hnswlib is not None
+        if use_hnsw and hnswlib is None:
+            logging.warning("LOCAL_SEARCH_ANN=hnsw but hnswlib is not installed; using brute force")
+        self.m, self.ef_construction, self.ef_search = m, ef_construction, ef_search
+        self.matrix: Optional[np.ndarray] = None
+        self.alive = np.zeros(0, dtype=bool)
+        self.free: List[int] = []
+        self.size = 0  # rows ever used
+        self._hnsw = None
+
+    def _grow(self, dim: int):
+        capacity = max(1024, 2 * len(self.alive))
+        matrix = np.zeros((capacity, dim), dtype=np.float32)
+        if self.matrix is not None:
+            matrix[: self.size] = self.matrix[: self.size]
+        self.matrix = matrix
+        self.alive = np.concatenate([self.alive, np.zeros(capacity - len(self.alive), dtype=bool)])
+        if self.use_hnsw:
+            if self._hnsw is None:
+                self._hnsw = hnswlib.Index(space="ip", dim=dim)
+                self._hnsw.init_index(max_elements=capacity, ef_construction=self.ef_construction, M=self.m)
+                self._hnsw.set_ef(self.ef_search)
+            else:
+                self._hnsw.resize_index(capacity)
+
+    @property
+    def dim(self) -> Optional[int]:
+        return None if self.matrix is None else self.matrix.shape[1]
+
+    def put_many(self, rows: List[Optional[int]], vectors: np.ndarray) -> List[int]:
+        """Store vectors (n x dim) in the given rows, or in free/new rows where None."""
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms > 0, norms, 1)
+        rows = list(rows)
+        for i, row in enumerate(rows):
+            if row is None:
+                if self.free:
+                    row = self.free.pop()
+                else:
+                    if self.matrix is None or self.size == len(self.alive):
+                        self._grow(vectors.shape[1])
+                    row = self.size
+                    self.size += 1
+                rows[i] = row
+        self.matrix[rows] = vectors
+        self.alive[rows] = True
+        if self._hnsw is not None:
+            # One call per batch (hnswlib inserts in parallel); re-adding a label
+            # (row reuse or update) replaces its vector and un-deletes it
+            self._hnsw.add_items(vectors, np.asarray(rows))
+        return rows
+
+    def remove(self, row: int):
+        self.alive[row] = False
+        self.free.append(row)
+        if self._hnsw is not None:
+            self._hnsw.mark_deleted(row)
+
+    def search(self, vector: Sequence[float], k: int, allowed: Optional[np.ndarray] = None) -> List[tuple]:
+        """[(row, cosine)] best first; `allowed` is a row mask from a filter."""
+        if self.matrix is None or k <= 0:
+            return []
+        q = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(q))
+        if norm:
+            q = q / norm
+
+        mask = self.alive[: self.size]
+        if allowed is not None:
+            mask = mask & allowed[: self.size]
+        live = int(mask.sum())
+        if not live:
+            return []
+        k = min(k, live)
+
+        if self._hnsw is not None and allowed is None:
+            self._hnsw.set_ef(max(self.ef_search, k))
+            labels, distances = self._hnsw.knn_query(q[None, :], k=k)
+            return [(int(row), 1.0 - float(d)) for row, d in zip(labels[0], distances[0])]
+
+        scores = self.matrix[: self.size] @ q
+        scores[~mask] = -np.inf
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return [(int(row), float(scores[row])) for row in top if np.isfinite(scores[row])]
+
+
+_TOKEN = re.compile(r"\w+")
+
+
+def _terms(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+class _BM25:
+    """Inverted index over one text field (Okapi BM25, k1=1.2, b=0.75)."""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1, self.b = k1, b
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.lengths: Dict[int, int] = {}
+        self.total_length = 0
+
+    def add(self, row: int, text: str):
+        counts = Counter(_terms(text))
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[row] = tf
+        length = sum(counts.values())
+        self.lengths[row] = length
+        self.total_length += length
+
+    def remove(self, row: int, text: str):
+        for term in set(_terms(text)):
+            rows = self.postings.get(term)
+            if rows is not None:
+                rows.pop(row, None)
+                if not rows:
+                    del self.postings[term]
+        self.total_length -= self.lengths.pop(row, 0)
+
+    def search(self, query: str, k: int, allowed: Optional[np.ndarray] = None) -> List[tuple]:
+        n = len(self.lengths)
+        if not n:
+            return []
+        avgdl = self.total_length / n or 1.0
+        scores: Dict[int, float] = {}
+        for term in set(_terms(query)):
+            rows = self.postings.get(term)
+            if not rows:
+                continue
+            idf = math.log(1 + (n - len(rows) + 0.5) / (len(rows) + 0.5))
+            for row, tf in rows.items():
+                if allowed is not None and not allowed[row]:
+                    continue
+                norm = tf + self.k1 * (1 - self.b + self.b * self.lengths[row] / avgdl)
+                scores[row] = scores.get(row, 0.0) + idf * tf * (self.k1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: -item[1])[:k]
+
+
+def rrf(rankings: Iterable[List[tuple]], k: int = RRF_K) -> List[tuple]:
+    """Reciprocal Rank Fusion of [(row, score)] lists: score = sum of 1 / (k + rank)."""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, (row, _) in enumerate(ranking, start=1):
+            fused[row] = fused.get(row, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: -item[1])
+
+
+_FILTER_EQ = re.compile(r"^\s*(\w+)\s+eq\s+'((?:[^']|'')*)'\s*$")
+_FILTER_IN = re.compile(r"^\s*search\.in\(\s*(\w+)\s*,\s*'([^']*)'\s*(?:,\s*'([^']*)'\s*)?\)\s*$")
+
+
+class LocalSearchIndex:
+    """Thread-safe in-memory index with the SearchClient methods listed in the module docstring."""
+
+    def __init__(self, path: Optional[str] = None, *, ann: str = "bruteforce", save_seconds: float = 5.0):
+        self.path = path
+        self.save_seconds = save_seconds
+        self._vectors = _VectorStore(use_hnsw=(ann == "hnsw"))
+        self._bm25 = _BM25()
+        self._docs: Dict[int, Dict[str, Any]] = {}  # row -> doc without its vector
+        self._rows: Dict[str, int] = {}              # key -> row
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        if path and os.path.exists(os.path.join(path, "docs.jsonl")):
+            self._load()
+
+    @classmethod
+    def from_env(cls) -> "LocalSearchIndex":
+        index = cls(
+            os.environ.get("LOCAL_SEARCH_PATH") or None,
+            ann=os.environ.get("LOCAL_SEARCH_ANN", "bruteforce").lower(),
+            save_seconds=float(os.environ.get("LOCAL_SEARCH_SAVE_SECONDS", "5")),
+        )
+        if index.path:
+            atexit.register(index.save)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    # -- writes --
+
+    def upload_documents(self, documents: List[Dict[str, Any]]) -> List[IndexingResult]:
+        results: List[IndexingResult] = []
+        with self._lock:
+            self._upsert_many(documents, results)
+            self._changed()
+        return results
+
+    def delete_documents(self, documents: List[Dict[str, Any]]) -> List[IndexingResult]:
+        with self._lock:
+            for doc in documents:
+                row = self._rows.pop(doc[KEY_FIELD], None)
+                if row is not None:
+                    self._drop(row)
+            self._changed()
+        return [IndexingResult(doc[KEY_FIELD], True, 200) for doc in documents]
+
+    def _upsert_many(self, documents: List[Dict[str, Any]], results: List[IndexingResult]):
+        # Last write wins for a key repeated within the batch
+        batch: Dict[str, Dict[str, Any]] = {}
+        vectors: Dict[str, np.ndarray] = {}
+        for doc in documents:
+            key = doc.get(KEY_FIELD)
+            vector = doc.get(VECTOR_FIELD)
+            error = None
+            if not key:
+                error = f"document has no '{KEY_FIELD}'"
+            elif vector is None:
+                error = f"document '{key}' has no '{VECTOR_FIELD}'"
+            else:
+                vector = np.asarray(vector, dtype=np.float32)
+                dim = self._vectors.dim or next(iter(vectors.values()), vector).shape[0]
+                if vector.ndim != 1 or vector.shape[0] != dim:
+                    error = f"vector of '{key}' has shape {vector.shape}, index has {dim} dimensions"
+            if error:
+                results.append(IndexingResult(key, False, 400, error))
+                continue
+            batch[key] = {name: value for name, value in doc.items() if name != VECTOR_FIELD}
+            vectors[key] = vector
+            results.append(IndexingResult(key, True, 201))
+        if not batch:
+            return
+
+        keys = list(batch)
+        for key in keys:
+            row = self._rows.get(key)
+            if row is not None:
+                self._bm25.remove(row, self._docs[row].get(TEXT_FIELD) or "")
+        rows = self._vectors.put_many([self._rows.get(key) for key in keys], np.stack([vectors[key] for key in keys]))
+        for key, row in zip(keys, rows):
+            self._rows[key] = row
+            self._docs[row] = batch[key]
+            self._bm25.add(row, batch[key].get(TEXT_FIELD) or "")
+
+    def _drop(self, row: int):
+        doc = self._docs.pop(row)
+        self._bm25.remove(row, doc.get(TEXT_FIELD) or "")
+        self._vectors.remove(row)
+
+    # -- reads --
+
+    def _allowed(self, filter: Optional[str]) -> Optional[np.ndarray]:
+        if not filter:
+            return None
+        mask = np.zeros(max(self._vectors.size, 1), dtype=bool)
+        m = _FILTER_EQ.match(filter)
+        if m:
+            field, value = m.group(1), m.group(2).replace("''", "'")
+            rows = [row for row, doc in self._docs.items() if doc.get(field) == value]
+        else:
+            m = _FILTER_IN.match(filter)
+            if not m:
+                raise ValueError(f"Unsupported filter for the local search backend: {filter}")
+            # Default delimiters of search.in are space and comma
+            values = set(m.group(2).split(m.group(3))) if m.group(3) else set(re.split(r"[ ,]+", m.group(2)))
+            field = m.group(1)
+            if field == KEY_FIELD:
+                rows = [self._rows[v] for v in values if v in self._rows]
+            else:
+                rows = [row for row, doc in self._docs.items() if doc.get(field) in values]
+        mask[rows] = True
+        return mask
+
+    def search(
+        self,
+        search_text: Optional[str] = None,
+        *,
+        vector_queries: Optional[List[Any]] = None,
+        select: Optional[Any] = None,
+        top: Optional[int] = None,
+        filter: Optional[str] = None,
+        **kwargs,  # query_type, semantic_configuration_name, ...: not supported locally, ignored
+    ) -> List[Dict[str, Any]]:
+        if isinstance(select, str):
+            select = [f.strip() for f in select.split(",") if f.strip()]
+
+        with self._lock:
+            allowed = self._allowed(filter)
+            limit = top if top is not None else max(len(self._rows), 1)
+            rankings = []
+            text = (search_text or "").strip()
+            if text and text != "*":
+                rankings.append(self._bm25.search(text, limit, allowed))
+            for vq in vector_queries or []:
+                k = getattr(vq, "k_nearest_neighbors", None) or limit
+                rankings.append(self._vectors.search(vq.vector, k, allowed))
+
+            if not rankings:
+                # "*" or no query: every (filtered) document, unranked
+                rows = [row for row in self._docs if allowed is None or allowed[row]]
+                hits = [(row, 1.0) for row in rows[:limit]]
+            elif len(rankings) == 1:
+                hits = rankings[0][:limit]
+            else:
+                hits = rrf(rankings)[:limit]
+
+            results = []
+            for row, score in hits:
+                doc = self._docs[row]
+                if select:
+                    out = {f: (self._vectors.matrix[row].tolist() if f == VECTOR_FIELD else doc.get(f)) for f in select}
+                else:
+                    out = dict(doc)
+                out["@search.score"] = score
+                results.append(out)
+            return results
+
+    # -- persistence --
+
+    def _changed(self):
+        self._dirty = True
+        if self.path and time.monotonic() - self._saved_at >= self.save_seconds:
+            self.save()
+
+    def save(self):
+        """Write docs.jsonl + vectors.npy under `path` (atomically, via temp files)."""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(self.path, exist_ok=True)
+            rows = list(self._docs)
+            docs_tmp = os.path.join(self.path, "docs.jsonl.tmp")
+            with open(docs_tmp, "w", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps(self._docs[row], ensure_ascii=False) + "\n")
+            vectors_tmp = os.path.join(self.path, "vectors.tmp.npy")
+            np.save(vectors_tmp, self._vectors.matrix[rows] if rows else np.zeros((0, 0), dtype=np.float32))
+            os.replace(vectors_tmp, os.path.join(self.path, "vectors.npy"))
+            os.replace(docs_tmp, os.path.join(self.path, "docs.jsonl"))
+            self._dirty = False
+            self._saved_at = time.monotonic()
+
+    def _load(self):
+        with open(os.path.join(self.path, "docs.jsonl"), "r", encoding="utf-8") as f:
+            docs = [json.loads(line) for line in f if line.strip()]
+        vectors = np.load(os.path.join(self.path, "vectors.npy"))
+        with self._lock:
+            for i in range(0, len(docs), 1000):
+                batch = [{**doc, VECTOR_FIELD: vector} for doc, vector in zip(docs[i : i + 1000], vectors[i : i + 1000])]
+                self._upsert_many(batch, [])
+        logging.info(f"Loaded {len(docs)} documents into the local search index from {self.path}")
+
+
+class _AsyncResults:
+    def __init__(self, results: List[Dict[str, Any]]):
+        self._results = iter(results)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._results)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class AsyncLocalSearchClient:
+    """aio SearchClient shape over a LocalSearchIndex; queries run in a worker thread."""
+
+    def __init__(self, index: LocalSearchIndex):
+        self.index = index
+
+    async def search(self, search_text: Optional[str] = None, **kwargs) -> _AsyncResults:
+        results = await asyncio.to_thread(self.index.search, search_text, **kwargs)
+        return _AsyncResults(results)
+
+    async def upload_documents(self, documents: List[Dict[str, Any]]) -> List[IndexingResult]:
+        return await asyncio.to_thread(self.index.upload_documents, documents)
+
+    async def delete_documents(self, documents: List[Dict[str, Any]]) -> List[IndexingResult]:
+        return await asyncio.to_thread(self.index.delete_documents, documents)
+
+    async def close(self):
+        pass
@@ -0,0 +1,79 @@
+"""
+Query variants for multi-query retrieval (RETRIEVAL_MULTI_QUERY=true): the
+rewritten query, the raw user input and the entity names they mention are
+searched concurrently and the result lists are fused with Reciprocal Rank
+Fusion, so chunks that word a character or event differently still surface.
+"""
+
+import os
+import re
+from typing import Any, Dict, Hashable, Iterable, List, Optional
+
+from .embedding_cache import normalize_text
+
+
+RETRIEVAL_MULTI_QUERY = os.environ.get("RETRIEVAL_MULTI_QUERY", "false").lower() == "true"
+RETRIEVAL_MAX_QUERIES = int(os.environ.get("RETRIEVAL_MAX_QUERIES", "3"))
+
+# Runs of capitalized words ("Little Red Riding Hood", "Mr. O'Brien", "Alice in Wonderland")
+_CAPITALIZED_RUN = re.compile(
+    r"\b(?:(?:Mr|Mrs|Ms|Dr|St)\.\s+)?[A-Z][\w'’-]*(?:\s+(?:(?:of|the|in|de|la|van|von)\s+)?[A-Z][\w'’-]*)*"
+)
+# Capitalized only because they start a question or a command
+_NOT_NAMES = {
+    "a", "an", "and", "are", "but", "can", "could", "describe", "did", "do", "does", "explain", "give",
+    "how", "i", "in", "is", "me", "my", "on", "please", "show", "summarize", "tell", "the", "was",
+    "were", "what", "when", "where", "which", "who", "whom", "whose", "why", "would",
+}
+
+
+def extract_entities(text: str) -> List[str]:
+    """Capitalized names in `text`, in order, without leading question/command words."""
+    names: List[str] = []
+    for match in _CAPITALIZED_RUN.finditer(text or ""):
+        words = match.group(0).split()
+        while words and words[0].lower() in _NOT_NAMES:
+            words.pop(0)
+        name = " ".join(words)
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def query_variants(user_input: str, search_query: str, max_queries: int = RETRIEVAL_MAX_QUERIES) -> List[str]:
+    """
+    [search_query, user_input, entity names] without duplicates (compared
+    normalized), at most `max_queries`. The first one is the primary query.
+    """
+    entities = extract_entities(search_query) or extract_entities(user_input)
+    variants: List[str] = []
+    seen = set()
+    for query in (search_query, user_input, " ".join(entities)):
+        key = normalize_text(query or "")
+        if key and key not in seen:
+            seen.add(key)
+            variants.append(query.strip())
+    return variants[:max(1, max_queries)]
+
+
+def _doc_key(doc: Dict[str, Any]) -> Hashable:
+    if doc.get("chunkId") is not None and (doc.get("fileId") or doc.get("fileName")):
+        return doc.get("fileId") or doc.get("fileName"), doc["chunkId"]
+    return doc.get("chunk")
+
+
+def fuse(rankings: Iterable[List[Dict[str, Any]]], k: Optional[int] = None) -> List[Dict[str, Any]]:
+    """RRF over ranked doc lists (k: local_search.RRF_K); a doc found by several queries is kept once (first copy)."""
+    # Imported here so the local backend's module loads only when it is used
+    from .local_search import RRF_K, rrf
+
+    docs: Dict[Hashable, Dict[str, Any]] = {}
+    keyed = []
+    for ranking in rankings:
+        keys = []
+        for doc in ranking:
+            key = _doc_key(doc)
+            docs.setdefault(key, doc)
+            keys.append((key, None))
+        keyed.append(keys)
+    return [docs[key] for key, _ in rrf(keyed, RRF_K if k is None else k)]
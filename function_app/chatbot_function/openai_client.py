@@ -1,16 +1,21 @@
 import os
-from openai import AzureOpenAI
+from openai import AzureOpenAI, AsyncAzureOpenAI
 
-def init_openai_client():
+
+def _read_settings():
     endpoint = os.environ.get("AZURE_OPENAI_ENDPOINT")
     api_key = os.environ.get("AZURE_OPENAI_KEY")
     api_version = os.environ.get("AZURE_OPENAI_API_VERSION")
     deployment_name = os.environ.get("AZURE_OPENAI_DEPLOYMENT_NAME")
 
-
     if not all([endpoint, api_key, api_version, deployment_name]):
         raise ValueError("Missing one or more required environment variables.")
-    
+
+    return endpoint, api_key, api_version, deployment_name
+
+
+def init_openai_client():
+    endpoint, api_key, api_version, deployment_name = _read_settings()
 
     client = AzureOpenAI(
         api_version=api_version,
@@ -19,3 +24,23 @@ def init_openai_client():
     )
 
     return client, deployment_name
+
+
+_async_client_singleton = None
+
+def init_async_openai_client():
+    """
+    Async counterpart of init_openai_client() used by the request pipeline.
+    The client is shared process-wide; it lives on the loop owned by async_runtime.
+    """
+    global _async_client_singleton
+    endpoint, api_key, api_version, deployment_name = _read_settings()
+
+    if _async_client_singleton is None:
+        _async_client_singleton = AsyncAzureOpenAI(
+            api_version=api_version,
+            azure_endpoint=endpoint,
+            api_key=api_key,
+        )
+
+    return _async_client_singleton, deployment_name
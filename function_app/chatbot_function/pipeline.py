@@ -0,0 +1,543 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
+
+from .utils import afold_summary, summary_message, trim_conversation_by_tokens
+from .async_runtime import spawn
+from .tokens import annotate, api_messages, message_tokens
+from .retrieval import asearch_multi_query, asearch_top_k_hybrid, format_sources_for_prompt
+from .multi_query import RETRIEVAL_MULTI_QUERY, query_variants
+from .prompts import SYSTEM_PROMPT, make_grounded_user_message
+from .query_rewrite import REWRITE_SKIPPED, arewrite_query_cached, rewrite_stats
+from .answer_cache import CachedAnswer, answer_cache
+from .embed import aembed_text
+
+from .tools import TOOLS, TOOL_ROUTER, TurnContext, turn_context
+
+
+_COMPLETION_ARGS = dict(temperature=0.2, max_tokens=700, top_p=1.0)
+
+# Tool loop bounds: model calls per turn, per-tool timeout, overall deadline
+TOOL_MAX_ROUNDS = int(os.environ.get("TOOL_MAX_ROUNDS", "3"))
+TOOL_TIMEOUT_SECONDS = float(os.environ.get("TOOL_TIMEOUT_SECONDS", "60"))
+TOOL_LOOP_DEADLINE_SECONDS = float(os.environ.get("TOOL_LOOP_DEADLINE_SECONDS", "120"))
+
+# Prompt budget of a turn: history + grounded message + reply (max_tokens)
+PROMPT_MAX_TOKENS = int(os.environ.get("PROMPT_MAX_TOKENS", "8192"))
+# Kept free in that budget for the reply, when trimming both the prompt and the stored history
+PROMPT_SAFETY_MARGIN = _COMPLETION_ARGS["max_tokens"]
+
+
+def _tool_calls_as_dicts(tool_calls) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": tc.id,
+            "type": "function",
+            "function": {
+                "name": tc.function.name,
+                "arguments": tc.function.arguments,
+            },
+        }
+        for tc in tool_calls
+    ]
+
+
+async def _call_tool(tc: Dict[str, Any], session_id: str, timeout: float) -> Dict[str, Any]:
+    name = tc["function"]["name"]
+    try:
+        args = json.loads(tc["function"]["arguments"] or "{}")
+    except Exception:
+        args = {}
+
+    if name not in TOOL_ROUTER:
+        return {"error": f"tool {name} not allowed"}
+
+    tool = TOOL_ROUTER[name]
+    try:
+        if asyncio.iscoroutinefunction(tool):
+            call = tool(session_id=session_id, **args)
+        else:
+            # Sync tools run off the loop
+            call = asyncio.to_thread(tool, session_id=session_id, **args)
+        return await asyncio.wait_for(call, timeout=timeout)
+    except asyncio.TimeoutError:
+        logging.warning(f"Tool {name} timed out after {timeout:.1f}s")
+        return {"error": f"tool {name} timed out"}
+    except Exception as e:
+        logging.exception("Tool execution error")
+        return {"error": str(e)}
+
+
+async def _run_tool_calls(
+    working: List[Dict], content: Optional[str], tool_calls: List[Dict[str, Any]], session_id: str, timeout: float
+) -> Tuple[List[str], Optional[str]]:
+    """
+    Append the assistant tool_calls message, execute the tools concurrently (each
+    bounded by `timeout`) and append their results in call order.
+    Returns (image_urls, final_reply); final_reply is set when every tool already
+    produced the user-facing answer, so no follow-up completion is needed.
+    """
+    # Append the assistant message EXACTLY with tool_calls
+    working.append({"role": "assistant", "content": content or None, "tool_calls": tool_calls})
+
+    results = await asyncio.gather(*(_call_tool(tc, session_id, timeout) for tc in tool_calls))
+
+    image_urls = []
+    final_replies = []
+    for tc, result in zip(tool_calls, results):
+        try:
+            for it in result.get("images", []):
+                if it.get("url"):
+                    image_urls.append(it["url"])
+            final_replies.append(result.get("final_reply"))
+        except Exception:
+            final_replies.append(None)
+
+        working.append({
+            "role": "tool",
+            "tool_call_id": tc["id"],
+            "name": tc["function"]["name"],
+            "content": json.dumps(result, ensure_ascii=False),
+        })
+
+    final_reply = None
+    if final_replies and all(final_replies) and len(set(final_replies)) == 1:
+        final_reply = final_replies[0]
+    return image_urls, final_reply
+
+
+class _StreamedMessage:
+    """Accumulates a streamed completion: text deltas plus fragmented tool_calls."""
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self._tool_calls: Dict[int, Dict[str, Any]] = {}
+
+    @property
+    def content(self) -> str:
+        return "".join(self.parts)
+
+    @property
+    def tool_calls(self) -> List[Dict[str, Any]]:
+        return [self._tool_calls[i] for i in sorted(self._tool_calls)]
+
+    def feed(self, chunk) -> Optional[str]:
+        """Consume one ChatCompletionChunk; return its text delta (if any)."""
+        if not chunk.choices:
+            return None
+        delta = chunk.choices[0].delta
+        if delta is None:
+            return None
+
+        for tc in getattr(delta, "tool_calls", None) or []:
+            slot = self._tool_calls.setdefault(tc.index, {
+                "id": None,
+                "type": "function",
+                "function": {"name": "", "arguments": ""},
+            })
+            if tc.id:
+                slot["id"] = tc.id
+            if tc.function is not None:
+                slot["function"]["name"] += tc.function.name or ""
+                slot["function"]["arguments"] += tc.function.arguments or ""
+
+        if delta.content:
+            self.parts.append(delta.content)
+            return delta.content
+        return None
+
+
+async def _stream_completion(client, message: _StreamedMessage, **kwargs) -> AsyncIterator[str]:
+    stream = await client.chat.completions.create(stream=True, **kwargs)
+    async for chunk in stream:
+        text = message.feed(chunk)
+        if text:
+            yield text
+
+
+async def _chat_with_tools(
+    client,
+    deployment_name,
+    base_messages,
+    session_id: str,
+    image_urls: List[str],
+    *,
+    passages: Optional[List[Dict]] = None,
+    stream: bool = False,
+    max_rounds: Optional[int] = None,
+    deadline_seconds: Optional[float] = None,
+) -> AsyncIterator[str]:
+    """
+    Tool-calling loop of up to `max_rounds` model calls within an overall deadline:
+      1) Ask model with tools advertised.
+      2) If tool_calls present -> run them concurrently -> append results -> repeat.
+      3) The last round (or any round once the deadline has passed) is asked
+         without tools, so it has to answer; tool calls requested after the
+         deadline has passed are not run.
+    When every tool of a round returned a `final_reply`, that is the answer and
+    no follow-up completion is made.
+    Yields reply text: each delta when stream=True, otherwise the final content
+    once. Image URLs from tools are appended to `image_urls`.
+    Tools see the client, deployment and `passages` of this turn via turn_context.
+    """
+    context = TurnContext(client, deployment_name, passages or [])
+    max_rounds = max_rounds or TOOL_MAX_ROUNDS
+    deadline = time.monotonic() + (deadline_seconds or TOOL_LOOP_DEADLINE_SECONDS)
+    working = list(base_messages)
+
+    for round_no in range(max_rounds):
+        remaining = deadline - time.monotonic()
+        final_round = round_no == max_rounds - 1 or remaining <= 0
+
+        kwargs = dict(model=deployment_name, messages=working, **_COMPLETION_ARGS)
+        if not final_round:
+            kwargs.update(tools=TOOLS, tool_choice="auto")
+
+        if stream:
+            msg = _StreamedMessage()
+            async for text in _stream_completion(client, msg, **kwargs):
+                yield text
+            content, tool_calls = msg.content, msg.tool_calls
+        else:
+            resp = await client.chat.completions.create(**kwargs)
+            message = resp.choices[0].message
+            content = message.content
+            tool_calls = _tool_calls_as_dicts(getattr(message, "tool_calls", None) or [])
+
+        if not tool_calls:
+            if not stream and content:
+                yield content
+            return
+
+        # The completion used part of the budget: the tools get only what is left
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            logging.warning(f"Tool loop deadline passed in round {round_no + 1}, skipping {len(tool_calls)} tool calls")
+            if not stream and content:
+                yield content
+            return
+
+        with turn_context(context):
+            urls, final_reply = await _run_tool_calls(
+                working, content, tool_calls, session_id, timeout=min(TOOL_TIMEOUT_SECONDS, remaining)
+            )
+        image_urls.extend(urls)
+        if final_reply:
+            yield final_reply
+            return
+
+
+async def _rewrite(client, deployment_name, conversation, user_input, diagnostics) -> Tuple[str, str]:
+    """Rewrite (skipped/cached when possible); returns (search_query, status)."""
+    start = time.perf_counter()
+    try:
+        search_query, status = await arewrite_query_cached(client, deployment_name, conversation, user_input)
+    except Exception:
+        search_query, status = user_input, "failed"
+    diagnostics["rewrite"] = status
+    diagnostics["rewrite_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    # Process-wide counts per status and the estimated latency the skip/cache layer saved
+    diagnostics["rewrite_stats"] = rewrite_stats()
+    return search_query, status
+
+
+async def _retrieve(client, user_input, search_query, diagnostics, search_client=None):
+    """
+    Critical path after the rewrite: embed -> search; with RETRIEVAL_MULTI_QUERY
+    the query variants are embedded together and searched concurrently.
+    """
+    if RETRIEVAL_MULTI_QUERY:
+        return await asearch_multi_query(
+            query_variants(user_input, search_query), k=5,
+            search_client=search_client, openai_client=client, diagnostics=diagnostics,
+        )
+    return await asearch_top_k_hybrid(
+        search_query, k=5, search_client=search_client, openai_client=client, diagnostics=diagnostics
+    )
+
+
+class _AnswerLookup(NamedTuple):
+    query: str
+    vector: List[float]
+    scope: Tuple[str, str, bool]
+    hit: Optional[CachedAnswer]
+
+
+def _answer_scope(deployment_name: str, allow_image_tool: bool) -> Tuple[str, str, bool]:
+    return os.environ.get("AZURE_SEARCH_INDEX") or "", deployment_name, allow_image_tool
+
+
+async def _lookup_answer(
+    session, client, deployment_name, search_query, status, allow_image_tool, diagnostics
+) -> Optional[_AnswerLookup]:
+    """
+    Semantic answer cache lookup (when enabled) for standalone turns only: the
+    first turn of a session (no messages, no summary), whose prompt carries no
+    user's history, and whose rewrite was skipped. The query embedding is
+    cached, so search reuses it.
+    """
+    if answer_cache is None:
+        return None
+    if status != REWRITE_SKIPPED or session.messages or session.summary:
+        answer_cache.record_skipped()
+        diagnostics["answer_cache"] = "skipped"
+        return None
+
+    vector = await aembed_text(search_query, client=client)
+    scope = _answer_scope(deployment_name, allow_image_tool)
+    hit = answer_cache.get(vector, scope)
+    diagnostics["answer_cache"] = "hit" if hit else "miss"
+    if hit:
+        diagnostics["answer_cache_similarity"] = round(hit.similarity, 4)
+    return _AnswerLookup(search_query, vector, scope, hit)
+
+
+def _record_answer(lookup: Optional[_AnswerLookup], reply, image_urls, start, diagnostics):
+    """Store a fresh answer (no tool output) or account for the latency a hit saved."""
+    if lookup is None:
+        return
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if lookup.hit is not None:
+        answer_cache.record_saved(lookup.hit, elapsed_ms)
+        diagnostics["answer_cache_saved_ms"] = round(max(0.0, lookup.hit.cost_ms - elapsed_ms), 1)
+    elif not image_urls:
+        answer_cache.put(lookup.vector, lookup.scope, lookup.query, reply, elapsed_ms)
+    diagnostics["answer_cache_stats"] = answer_cache.stats()
+
+
+# Fold the oldest messages into the rolling summary once more than
+# SUMMARY_TRIGGER messages are unsummarized (same threshold as summarize()).
+SUMMARY_BATCH = 5
+SUMMARY_TRIGGER = SUMMARY_BATCH * 2
+
+
+def _session_conversation(session) -> List[Dict]:
+    """System prompt + stored rolling summary + unsummarized messages."""
+    conversation = [{"role": "system", "content": SYSTEM_PROMPT}]
+    if session.summary:
+        conversation.append(summary_message(session.summary))
+    if session.messages:
+        conversation += session.messages
+    return conversation
+
+
+class _PreparedTurn(NamedTuple):
+    grounded: Optional[List[Dict]]  # None on an answer cache hit
+    conversation: List[Dict]
+    passages: List[Dict]
+    answer: Optional[_AnswerLookup]
+
+
+async def _prepare_turn(
+    session, user_input, client, deployment_name, diagnostics, search_client=None, allow_image_tool=True
+) -> _PreparedTurn:
+    """
+    Retrieve and ground the prompt; per-turn measurements go into `diagnostics`.
+    Returns the prompt (conversation_with_retrieved_sources), the storage
+    conversation, the passages and the answer cache lookup; on a cache hit
+    nothing is retrieved and there is no prompt.
+    """
+    # Build conversation with session memory
+    conversation = _session_conversation(session)
+
+    search_query, status = await _rewrite(client, deployment_name, conversation, user_input, diagnostics)
+    answer = await _lookup_answer(
+        session, client, deployment_name, search_query, status, allow_image_tool, diagnostics
+    )
+    if answer is not None and answer.hit is not None:
+        return _PreparedTurn(None, conversation + [{"role": "user", "content": user_input}], [], answer)
+
+    passages = await _retrieve(client, user_input, search_query, diagnostics, search_client)
+
+    conversation = conversation + [{"role": "user", "content": user_input}]
+
+    # RAG: sources packed into RAG_SOURCES_MAX_TOKENS
+    sources_formatted = format_sources_for_prompt(passages, deployment=deployment_name, stats=diagnostics)
+    grounded_user_msg = make_grounded_user_message(user_input, sources_formatted)
+
+    # History is trimmed to what fits next to the grounded message and the reply
+    history = trim_conversation_by_tokens(
+        conversation=conversation,
+        max_tokens=PROMPT_MAX_TOKENS - message_tokens(grounded_user_msg, deployment_name),
+        model=deployment_name,
+        safety_margin=PROMPT_SAFETY_MARGIN,
+    )
+    diagnostics["history_dropped"] = len(conversation) - len(history)
+
+    # Fresh dicts without stored token memos (the chat API rejects unknown keys)
+    conversation_with_retrieved_sources = api_messages(history + [grounded_user_msg])
+    return _PreparedTurn(conversation_with_retrieved_sources, conversation, passages, answer)
+
+
+async def refresh_summary(session, client, deployment_name) -> bool:
+    """
+    Fold the oldest SUMMARY_BATCH messages into session.summary once the
+    unsummarized tail is longer than SUMMARY_TRIGGER, and save conditionally on
+    the session's etag so a newer turn saved meanwhile is never overwritten
+    (that turn's next refresh retries instead). Returns True when folded.
+    """
+    if len(session.messages) <= SUMMARY_TRIGGER:
+        return False
+
+    folded = session.messages[:SUMMARY_BATCH]
+    summary = await afold_summary(session.summary, folded, client, deployment_name)
+    if not summary:
+        return False
+
+    session.summary = summary
+    session.summary_upto += len(folded)
+    session.messages = session.messages[len(folded):]
+    try:
+        await session.save(if_match=True)
+    except Exception as e:
+        logging.info(f"Summary refresh for {session.session_id} skipped: {e}")
+        return False
+    return True
+
+
+async def _finish_turn(session, conversation, client, deployment_name, reply: str, skip_session_save: bool) -> bool:
+    """
+    Trim and persist; the summary refresh runs in the background after the
+    save, off the request path. Returns True when the session was saved.
+    """
+    # Stored history (and so the rolling summary's input) is sized to the prompt budget
+    conversation = trim_conversation_by_tokens(
+        conversation=conversation,
+        max_tokens=PROMPT_MAX_TOKENS,
+        model=deployment_name,
+        safety_margin=PROMPT_SAFETY_MARGIN,
+    )
+
+    # Persist only user/assistant roles
+    conversation.append({"role": "assistant", "content": reply})
+    if skip_session_save:
+        return False
+
+    to_save = [m for m in conversation if m.get("role") in ("user", "assistant")]
+    # Persist token counts with the messages so later turns never re-encode them
+    annotate(to_save, deployment_name)
+    session.messages = to_save
+    await session.save()
+
+    if len(session.messages) > SUMMARY_TRIGGER:
+        spawn(refresh_summary(session, client, deployment_name), name=f"summary-{session.session_id}")
+    return True
+
+
+async def run_turn(
+    session,
+    user_input: str,
+    client,
+    deployment_name: str,
+    *,
+    allow_image_tool: bool = True,
+    skip_session_save: bool = False,
+    search_client=None,
+) -> Tuple[str, List[str], Dict[str, Any]]:
+    """
+    One chat turn on the async clients.
+
+    The prompt carries the session's stored rolling summary, so the critical
+    path is rewrite + embed + search + chat (+ save); refreshing the summary
+    happens in the background after the save.
+
+    `session` needs `.session_id`, `.messages`, `.summary`, `.summary_upto` and
+    an async `save(if_match=False)`; `search_client` defaults to the shared
+    async SearchClient.
+    With ANSWER_CACHE_ENABLED, a session's first question close enough to an
+    earlier one is answered from the answer cache (no search or chat call).
+    Returns: (reply, image_urls, diagnostics)
+    """
+    start = time.perf_counter()
+    diagnostics: Dict[str, Any] = {}
+    grounded, conversation, passages, answer = await _prepare_turn(
+        session, user_input, client, deployment_name, diagnostics, search_client, allow_image_tool
+    )
+
+    # Tool vs no-tool path
+    image_urls: List[str] = []
+    if answer is not None and answer.hit is not None:
+        reply = answer.hit.reply
+    elif allow_image_tool:
+        parts = [
+            text async for text in _chat_with_tools(
+                client, deployment_name, grounded, session.session_id, image_urls, passages=passages
+            )
+        ]
+        reply = "".join(parts).strip()
+    else:
+        tool_free_resp = await client.chat.completions.create(
+            model=deployment_name,
+            messages=grounded,
+            **_COMPLETION_ARGS,
+        )
+        reply = (tool_free_resp.choices[0].message.content or "").strip()
+
+    _record_answer(answer, reply, image_urls, start, diagnostics)
+    await _finish_turn(session, conversation, client, deployment_name, reply, skip_session_save)
+    return reply, image_urls, diagnostics
+
+
+async def _replay(reply: str) -> AsyncIterator[str]:
+    """A cached answer as a single delta."""
+    yield reply
+
+
+async def stream_turn(
+    session,
+    user_input: str,
+    client,
+    deployment_name: str,
+    *,
+    allow_image_tool: bool = True,
+    skip_session_save: bool = False,
+    search_client=None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streaming form of run_turn(). Yields events:
+      {"type": "delta", "content": "..."}   for every token delta
+      {"type": "done", "reply", "session_id", "images", "saved", "diagnostics"}   once the session is persisted
+    The v1 HTTP endpoint does not use it (its binding cannot flush a partial
+    response); it is for a host that can relay the events as they come.
+    """
+    start = time.perf_counter()
+    diagnostics: Dict[str, Any] = {}
+    grounded, conversation, passages, answer = await _prepare_turn(
+        session, user_input, client, deployment_name, diagnostics, search_client, allow_image_tool
+    )
+
+    image_urls: List[str] = []
+    if answer is not None and answer.hit is not None:
+        deltas = _replay(answer.hit.reply)
+    elif allow_image_tool:
+        deltas = _chat_with_tools(
+            client, deployment_name, grounded, session.session_id, image_urls,
+            passages=passages, stream=True,
+        )
+    else:
+        deltas = _stream_completion(
+            client, _StreamedMessage(),
+            model=deployment_name,
+            messages=grounded,
+            **_COMPLETION_ARGS,
+        )
+
+    parts = []
+    async for text in deltas:
+        parts.append(text)
+        yield {"type": "delta", "content": text}
+
+    reply = "".join(parts).strip()
+    _record_answer(answer, reply, image_urls, start, diagnostics)
+    saved = await _finish_turn(session, conversation, client, deployment_name, reply, skip_session_save)
+    yield {
+        "type": "done",
+        "reply": reply,
+        "session_id": session.session_id,
+        "images": image_urls,
+        "saved": saved,
+        "diagnostics": diagnostics,
+    }
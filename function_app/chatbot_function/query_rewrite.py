@@ -1,4 +1,10 @@
-from typing import List, Dict
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Tuple
 
 REWRITE_PROMPT = """You will be given a chat history and the latest user prompt.
 Rewrite the latest user prompt into a single, self-contained question/prompt that preserves context.
@@ -25,14 +31,123 @@ def collect_recent_history(messages: List[Dict], max_chars: int = 2000) -> str:
             break
     return "\n".join(buf[-12:])
 
-def rewrite_query(client, model: str, messages: List[Dict], user_input: str) -> str:
+def _rewrite_request(model: str, messages: List[Dict], user_input: str) -> Dict:
     history = collect_recent_history(messages)
     prompt = REWRITE_PROMPT.format(history=history, question=user_input)
-    out = client.chat.completions.create(
+    return dict(
         model=model,
         messages=[{"role": "user", "content": prompt}],
         temperature=0.0,
         max_tokens=200,
     )
+
+def rewrite_query(client, model: str, messages: List[Dict], user_input: str) -> str:
+    out = client.chat.completions.create(**_rewrite_request(model, messages, user_input))
+    rewritten = out.choices[0].message.content.strip()
+    return rewritten or user_input
+
+async def arewrite_query(client, model: str, messages: List[Dict], user_input: str) -> str:
+    out = await client.chat.completions.create(**_rewrite_request(model, messages, user_input))
     rewritten = out.choices[0].message.content.strip()
     return rewritten or user_input
+
+
+# ---- Skip-or-cache layer ----
+
+REWRITE_SKIPPED = "skipped"
+REWRITE_CACHED = "cached"
+REWRITE_COMPUTED = "computed"
+
+# Words that only make sense with earlier turns: pronouns, demonstratives and
+# continuation cues ("what happened next?", "and then?", "tell me more").
+_CONTEXT_CUES = re.compile(
+    r"\b(he|she|they|it|him|her|them|his|hers|their|theirs|its|himself|herself|themselves|itself"
+    r"|this|that|these|those|there|then|next|before|after|later|earlier|again|also|too|else|more"
+    r"|another|other|others|same|former|latter|previous|last|above|continue|one|ones)\b",
+    re.IGNORECASE,
+)
+
+
+def needs_rewrite(messages: List[Dict], user_input: str) -> bool:
+    """
+    Local decision: can rewriting change the query at all?
+    False on the first turn (no user/assistant history to resolve against) and
+    for standalone prompts without pronouns or continuation cues.
+    """
+    if not any(m.get("role") in ("user", "assistant") for m in messages):
+        return False
+    return bool(_CONTEXT_CUES.search(user_input or ""))
+
+
+class _RewriteCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value: str):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_rewrite_cache = _RewriteCache(int(os.environ.get("REWRITE_CACHE_MAX_ENTRIES", "1024")))
+_stats = {REWRITE_SKIPPED: 0, REWRITE_CACHED: 0, REWRITE_COMPUTED: 0, "computed_ms": 0.0}
+_stats_lock = threading.Lock()
+
+
+def _cache_key(messages: List[Dict], user_input: str) -> Tuple[str, str]:
+    history = collect_recent_history(messages)
+    return hashlib.sha256(history.encode("utf-8")).hexdigest(), user_input.strip()
+
+
+def _record(status: str, elapsed_ms: float = 0.0):
+    with _stats_lock:
+        _stats[status] += 1
+        if status == REWRITE_COMPUTED:
+            _stats["computed_ms"] += elapsed_ms
+
+
+def rewrite_stats() -> Dict[str, float]:
+    """Counts per status and the estimated latency saved (avoided calls x mean rewrite latency)."""
+    with _stats_lock:
+        stats = dict(_stats)
+    computed = stats[REWRITE_COMPUTED]
+    avg_ms = stats["computed_ms"] / computed if computed else 0.0
+    stats["avg_computed_ms"] = avg_ms
+    stats["estimated_saved_ms"] = (stats[REWRITE_SKIPPED] + stats[REWRITE_CACHED]) * avg_ms
+    return stats
+
+
+async def arewrite_query_cached(client, model: str, messages: List[Dict], user_input: str) -> Tuple[str, str]:
+    """
+    arewrite_query() behind a local skip decision and a cache keyed on
+    (recent-history hash, user_input). Returns (query, status) where status is
+    REWRITE_SKIPPED, REWRITE_CACHED or REWRITE_COMPUTED.
+    """
+    if not needs_rewrite(messages, user_input):
+        _record(REWRITE_SKIPPED)
+        return user_input, REWRITE_SKIPPED
+
+    key = _cache_key(messages, user_input)
+    cached = _rewrite_cache.get(key)
+    if cached is not None:
+        _record(REWRITE_CACHED)
+        return cached, REWRITE_CACHED
+
+    start = time.perf_counter()
+    rewritten = await arewrite_query(client, model, messages, user_input)
+    _record(REWRITE_COMPUTED, (time.perf_counter() - start) * 1000)
+    _rewrite_cache.put(key, rewritten)
+    return rewritten, REWRITE_COMPUTED
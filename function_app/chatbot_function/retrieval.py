@@ -1,20 +1,32 @@
-from typing import List, Dict, Any, Optional
+import asyncio
+import logging
+import os
+import time
+from typing import List, Dict, Any, Optional, Tuple
 from azure.search.documents.models import VectorizedQuery
-from .search_client import get_search_client
-from .embed import embed_text  
+from .search_client import get_search_client, get_async_search_client
+from .embed import embed_text, aembed_text, aembed_texts
+from .search_cache import search_cache, project
+from .context_pack import RAG_SOURCES_MAX_TOKENS, pack_sources
+from .diversify import (
+    RETRIEVAL_ADJACENT_WINDOW,
+    RETRIEVAL_CANDIDATES,
+    RETRIEVAL_DIVERSIFY,
+    RETRIEVAL_MMR_LAMBDA,
+    RETRIEVAL_MMR_USE_VECTORS,
+    diversify as diversify_candidates,
+)
+from .multi_query import fuse
 
 
-RAG_SELECT = "title,chunk,chunkId,fileName"
+RAG_SELECT = "title,chunk,chunkId,fileName,fileId"
 RAG_VECTOR_FIELD = "contentVector"  
+# Cleared for the process when the index refuses to return the vector field
+_select_vectors = RETRIEVAL_MMR_USE_VECTORS
 
-def search_top_k_hybrid(query: str, k: int = 5, semantic_config: Optional[str] = None) -> List[Dict[str, Any]]:
-    """
-    Hybrid retrieval against your RAG index: BM25 over 'chunk' + vector over 'contentVector'.
-    Returns: [{ title, content, raw }]
-    """
-    client = get_search_client()
-    vec = embed_text(query)
-
+def _hybrid_search_kwargs(
+    query: str, vec: List[float], k: int, semantic_config: Optional[str], select: str = RAG_SELECT
+) -> Dict[str, Any]:
     vq = VectorizedQuery(
         vector=vec,
         k_nearest_neighbors=k,
@@ -24,31 +36,215 @@ def search_top_k_hybrid(query: str, k: int = 5, semantic_config: Optional[str] =
     kwargs = dict(
         search_text=query,  # keyword/BM25 and vector search
         vector_queries=[vq],
-        select=RAG_SELECT,
+        select=select,
         top=k,
     )
     if semantic_config:
         kwargs.update(query_type="semantic", semantic_configuration_name=semantic_config)
+    return kwargs
+
+def _to_passage(doc) -> Dict[str, Any]:
+    title = str(doc.get("title") or "")
+    content = str(doc.get("chunk") or "")
+    return {
+        "title": title.strip(),
+        "content": content.strip(),
+        "raw": doc
+    }
+
+def _cache_key(query: str, k: int, semantic_config: Optional[str], diversify: bool = False):
+    variant = (
+        f"mmr:{RETRIEVAL_CANDIDATES}:{RETRIEVAL_MMR_LAMBDA}:{RETRIEVAL_ADJACENT_WINDOW}:{_select_vectors}"
+        if diversify else ""
+    )
+    return search_cache.key(query, k, semantic_config, os.environ.get("AZURE_SEARCH_INDEX"), variant)
+
+def _fetch_plan(k: int, diversify: bool) -> Tuple[int, str, Tuple[str, ...]]:
+    """(top, select, extra projected fields) of the search call; diversifying over-fetches candidates."""
+    if not diversify:
+        return k, RAG_SELECT, ()
+    extra = (RAG_VECTOR_FIELD,) if _select_vectors else ()
+    return max(k, RETRIEVAL_CANDIDATES), ",".join((RAG_SELECT,) + extra), extra
 
+def _select(
+    vec: List[float], candidates: List[Dict[str, Any]], k: int, diversify: bool, diagnostics: Optional[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """Final k docs (vectors dropped) out of the ranked candidates."""
+    if not diversify:
+        return candidates[:k]
+
+    start = time.perf_counter()
+    docs = [project(doc) for doc in diversify_candidates(vec, candidates, k, diagnostics)]
+    if diagnostics is not None:
+        diagnostics["diversify_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return docs
+
+def _record(diagnostics: Optional[Dict[str, Any]], start: float, cached: bool):
+    if diagnostics is not None:
+        diagnostics["search_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        diagnostics["search_cached"] = cached
+
+def search_top_k_hybrid(
+    query: str,
+    k: int = 5,
+    semantic_config: Optional[str] = None,
+    *,
+    diversify: Optional[bool] = None,
+    diagnostics: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Hybrid retrieval against your RAG index: BM25 over 'chunk' + vector over 'contentVector'.
+    With diversify (default: RETRIEVAL_DIVERSIFY) RETRIEVAL_CANDIDATES hits are
+    fetched and reduced to k by diversify.diversify().
+    Results are served from search_cache while fresh; `diagnostics` (optional)
+    receives timings (source token counts come from format_sources_for_prompt).
+    Returns: [{ title, content, raw }]
+    """
+    start = time.perf_counter()
+    diversify = RETRIEVAL_DIVERSIFY if diversify is None else diversify
+    key = _cache_key(query, k, semantic_config, diversify)
+    cached = search_cache.get(key)
+    if cached is not None:
+        _record(diagnostics, start, cached=True)
+        return [_to_passage(doc) for doc in cached]
+
+    client = get_search_client()
+    vec = embed_text(query)
+    top, select, extra = _fetch_plan(k, diversify)
+
+    candidates = _search_candidates(client, query, vec, top, semantic_config, select, extra)
+
+    docs = _select(vec, candidates, k, diversify, diagnostics)
+    search_cache.put(key, docs)
+    _record(diagnostics, start, cached=False)
+    return [_to_passage(doc) for doc in docs]
+
+async def asearch_top_k_hybrid(
+    query: str,
+    k: int = 5,
+    semantic_config: Optional[str] = None,
+    *,
+    search_client=None,
+    openai_client=None,
+    diversify: Optional[bool] = None,
+    diagnostics: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Async variant of search_top_k_hybrid() for the request pipeline.
+    Clients default to the shared async singletons; tests/benchmarks can pass stubs.
+    """
+    start = time.perf_counter()
+    diversify = RETRIEVAL_DIVERSIFY if diversify is None else diversify
+    key = _cache_key(query, k, semantic_config, diversify)
+    cached = search_cache.get(key)
+    if cached is not None:
+        _record(diagnostics, start, cached=True)
+        return [_to_passage(doc) for doc in cached]
+
+    client = search_client or get_async_search_client()
+    vec = await aembed_text(query, client=openai_client)
+    top, select, extra = _fetch_plan(k, diversify)
+    candidates = await _asearch_candidates(client, query, vec, top, semantic_config, select, extra)
+
+    docs = _select(vec, candidates, k, diversify, diagnostics)
+    search_cache.put(key, docs)
+    _record(diagnostics, start, cached=False)
+    return [_to_passage(doc) for doc in docs]
+
+def _search_failed(error: Exception, extra: Tuple[str, ...]) -> bool:
+    """Log a failed hybrid search; True to retry it without the extra (vector) fields."""
+    global _select_vectors
+    if extra:
+        _select_vectors = False
+        logging.warning(
+            f"Hybrid search selecting {', '.join(extra)} failed, retrying without it and no longer selecting it "
+            f"(is the field retrievable? set RETRIEVAL_MMR_USE_VECTORS=false): {error}"
+        )
+        return True
+    logging.warning(f"Hybrid search failed, falling back to keyword-only search: {error}")
+    return False
+
+def _search_candidates(
+    client, query: str, vec: List[float], top: int, semantic_config: Optional[str], select: str, extra: Tuple[str, ...]
+) -> List[Dict[str, Any]]:
+    try:
+        results = client.search(**_hybrid_search_kwargs(query, vec, top, semantic_config, select))
+        return [project(doc, extra) for doc in results]
+    except Exception as e:
+        if _search_failed(e, extra):
+            return _search_candidates(client, query, vec, top, semantic_config, RAG_SELECT, ())
+        results = client.search(search_text=query, select=RAG_SELECT, top=top)
+        return [project(doc) for doc in results]
+
+async def _asearch_candidates(
+    client, query: str, vec: List[float], top: int, semantic_config: Optional[str], select: str, extra: Tuple[str, ...]
+) -> List[Dict[str, Any]]:
     try:
-        results = client.search(**kwargs)
-    except Exception:
-        # Fallback to keyword-only if vector fails
-        results = client.search(search_text=query, select=RAG_SELECT, top=k)
-
-    passages: List[Dict[str, Any]] = []
-    for doc in results:
-        title = str(doc.get("title") or "")
-        content = str(doc.get("chunk") or "")
-        passages.append({
-            "title": title.strip(),
-            "content": content.strip(),
-            "raw": doc
-        })
-    return passages
-
-def format_sources_for_prompt(passages: List[Dict[str, Any]]) -> str:
-    lines = []
-    for p in passages:
-        lines.append(f'{p["title"]}: {p["content"]}')
-    return "\n".join(lines)
+        results = await client.search(**_hybrid_search_kwargs(query, vec, top, semantic_config, select))
+        return [project(doc, extra) async for doc in results]
+    except Exception as e:
+        if _search_failed(e, extra):
+            return await _asearch_candidates(client, query, vec, top, semantic_config, RAG_SELECT, ())
+        results = await client.search(search_text=query, select=RAG_SELECT, top=top)
+        return [project(doc) async for doc in results]
+
+async def asearch_multi_query(
+    queries: List[str],
+    k: int = 5,
+    semantic_config: Optional[str] = None,
+    *,
+    search_client=None,
+    openai_client=None,
+    diversify: Optional[bool] = None,
+    diagnostics: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Multi-query form of asearch_top_k_hybrid() (see multi_query.query_variants):
+    all queries are embedded in one call, searched concurrently and fused with
+    RRF before the final k are selected; queries[0] is the primary query
+    (MMR relevance). Wall clock is about one embed call plus the slowest search.
+    """
+    if len(queries) == 1:
+        return await asearch_top_k_hybrid(
+            queries[0], k, semantic_config, search_client=search_client, openai_client=openai_client,
+            diversify=diversify, diagnostics=diagnostics,
+        )
+
+    start = time.perf_counter()
+    diversify = RETRIEVAL_DIVERSIFY if diversify is None else diversify
+    key = _cache_key("\n".join(queries), k, semantic_config, diversify)
+    cached = search_cache.get(key)
+    if cached is not None:
+        _record(diagnostics, start, cached=True)
+        return [_to_passage(doc) for doc in cached]
+
+    client = search_client or get_async_search_client()
+    vectors = await aembed_texts(queries, client=openai_client)
+    top, select, extra = _fetch_plan(k, diversify)
+    rankings = await asyncio.gather(*(
+        _asearch_candidates(client, query, vec, top, semantic_config, select, extra)
+        for query, vec in zip(queries, vectors)
+    ))
+    candidates = fuse(rankings)
+    if diagnostics is not None:
+        diagnostics["queries"] = len(queries)
+        diagnostics["fused_candidates"] = len(candidates)
+
+    docs = _select(vectors[0], candidates, k, diversify, diagnostics)
+    search_cache.put(key, docs)
+    _record(diagnostics, start, cached=False)
+    return [_to_passage(doc) for doc in docs]
+
+def format_sources_for_prompt(
+    passages: List[Dict[str, Any]],
+    max_tokens: Optional[int] = None,
+    *,
+    deployment: Optional[str] = None,
+    stats: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Sources block of the grounded prompt: one `title: text` line per story,
+    adjacent chunks merged, filled in relevance order up to `max_tokens`
+    (default RAG_SOURCES_MAX_TOKENS; see context_pack.pack_sources).
+    """
+    return pack_sources(passages, RAG_SOURCES_MAX_TOKENS if max_tokens is None else max_tokens, deployment, stats)
@@ -0,0 +1,115 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+# Fields kept per hit; mirrors retrieval.RAG_SELECT
+PROJECTED_FIELDS = ("title", "chunk", "chunkId", "fileName", "fileId")
+
+
+def project(doc, extra_fields: Tuple[str, ...] = ()) -> Dict[str, Any]:
+    """Copy only the selected fields out of an SDK result (drops @search.* metadata)."""
+    return {f: doc.get(f) for f in PROJECTED_FIELDS + extra_fields}
+
+
+class SearchResultCache:
+    """
+    TTL cache for search_top_k_hybrid results.
+
+    Keys are (query, k, semantic_config, index, variant); variant names the
+    post-retrieval settings (e.g. diversification) the result was built with.
+    Each entry also remembers the index generation it was filled under;
+    bump_generation() (called after ingestion uploads) makes every older entry
+    a miss.
+
+    The generation counter is per process: it only invalidates the cache of
+    the worker that ran the ingestion. Other instances (and the chat function
+    when ingestion runs in a separate invocation host) keep serving their
+    entries until they expire, so staleness after a re-index is bounded only
+    by ttl_seconds (SEARCH_CACHE_TTL_SECONDS, default 60).
+    """
+
+    def __init__(self, ttl_seconds: float = 60.0, max_entries: int = 512):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.generation = 0
+
+        self._entries: "OrderedDict[Tuple, Tuple[float, int, List[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> "SearchResultCache":
+        return cls(
+            ttl_seconds=float(os.environ.get("SEARCH_CACHE_TTL_SECONDS", "60")),
+            max_entries=int(os.environ.get("SEARCH_CACHE_MAX_ENTRIES", "512")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    @staticmethod
+    def key(query: str, k: int, semantic_config: Optional[str], index: Optional[str], variant: str = "") -> Tuple:
+        return (query, k, semantic_config or "", index or "", variant)
+
+    def get(self, key: Tuple) -> Optional[List[Dict[str, Any]]]:
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, generation, docs = entry
+                if expires_at > now and generation == self.generation:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return [dict(d) for d in docs]
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Tuple, docs: List[Dict[str, Any]]):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (
+                time.monotonic() + self.ttl_seconds,
+                self.generation,
+                [dict(d) for d in docs],
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def bump_generation(self) -> int:
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            return self.generation
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "generation": self.generation,
+            }
+
+
+# Process-wide instance shared by retrieval and ingestion
+search_cache = SearchResultCache.from_env()
+
+
+def bump_index_generation() -> int:
+    """
+    Invalidate this process's cached search results after the index content
+    changed; other processes see the change once their entries' TTL expires.
+    """
+    return search_cache.bump_generation()
@@ -1,16 +1,31 @@
 import os
 from typing import Optional
 from azure.search.documents import SearchClient
+from azure.search.documents.aio import SearchClient as AsyncSearchClient
 from azure.core.credentials import AzureKeyCredential
 from azure.identity import DefaultAzureCredential
+from azure.identity.aio import DefaultAzureCredential as AsyncDefaultAzureCredential
 
 _search_client_singleton: Optional[SearchClient] = None
+_async_search_client_singleton: Optional[AsyncSearchClient] = None
+_local_index = None
+
+
+def search_backend() -> str:
+    """SEARCH_BACKEND: "azure" (default) or "local" (in-process index, see local_search.py)."""
+    return os.environ.get("SEARCH_BACKEND", "azure").strip().lower()
+
+
+def get_local_index():
+    """Shared LocalSearchIndex (local_search is only imported when the local backend is used)."""
+    global _local_index
+    if _local_index is None:
+        from .local_search import LocalSearchIndex
+        _local_index = LocalSearchIndex.from_env()
+    return _local_index
 
-def get_search_client() -> SearchClient:
-    global _search_client_singleton
-    if _search_client_singleton:
-        return _search_client_singleton
 
+def _read_settings():
     endpoint = os.environ.get("AZURE_SEARCH_ENDPOINT")
     index_name = os.environ.get("AZURE_SEARCH_INDEX")
     api_key = os.environ.get("AZURE_SEARCH_API_KEY", "")
@@ -18,6 +33,20 @@ def get_search_client() -> SearchClient:
     if not endpoint or not index_name:
         raise RuntimeError("AZURE_SEARCH_ENDPOINT and AZURE_SEARCH_INDEX must be set")
 
+    return endpoint, index_name, api_key
+
+
+def get_search_client() -> SearchClient:
+    global _search_client_singleton
+    if _search_client_singleton:
+        return _search_client_singleton
+
+    if search_backend() == "local":
+        _search_client_singleton = get_local_index()
+        return _search_client_singleton
+
+    endpoint, index_name, api_key = _read_settings()
+
     if api_key:
         cred = AzureKeyCredential(api_key)
     else:
@@ -30,3 +59,29 @@ def get_search_client() -> SearchClient:
         credential=cred,
     )
     return _search_client_singleton
+
+
+def get_async_search_client() -> AsyncSearchClient:
+    """Async SearchClient for the request pipeline (shared on the async_runtime loop)."""
+    global _async_search_client_singleton
+    if _async_search_client_singleton:
+        return _async_search_client_singleton
+
+    if search_backend() == "local":
+        from .local_search import AsyncLocalSearchClient
+        _async_search_client_singleton = AsyncLocalSearchClient(get_local_index())
+        return _async_search_client_singleton
+
+    endpoint, index_name, api_key = _read_settings()
+
+    if api_key:
+        cred = AzureKeyCredential(api_key)
+    else:
+        cred = AsyncDefaultAzureCredential(exclude_interactive_browser_credential=True)
+
+    _async_search_client_singleton = AsyncSearchClient(
+        endpoint=endpoint,
+        index_name=index_name,
+        credential=cred,
+    )
+    return _async_search_client_singleton
@@ -0,0 +1,106 @@
+import os
+from functools import lru_cache
+from typing import Dict, Iterable, List
+
+import tiktoken
+
+# Per-message token counts are memoized on the message itself under this key,
+# as {encoding_name: count}, and persisted with the session document.
+TOKENS_KEY = "tokens"
+
+# Per-message overhead of the chat format, and reply priming per request
+_TOKENS_PER_MESSAGE = 4
+_TOKENS_PER_REQUEST = 2
+
+DEFAULT_ENCODING = "cl100k_base"
+
+# Model-family prefixes for names tiktoken does not know (checked in order)
+_PREFIX_ENCODINGS = (
+    ("gpt-4o", "o200k_base"),
+    ("gpt-4.1", "o200k_base"),
+    ("gpt-5", "o200k_base"),
+    ("o1", "o200k_base"),
+    ("o3", "o200k_base"),
+    ("o4", "o200k_base"),
+    ("gpt-4", "cl100k_base"),
+    ("gpt-35", "cl100k_base"),
+    ("gpt-3.5", "cl100k_base"),
+    ("text-embedding", "cl100k_base"),
+)
+
+
+def _deployment_encodings() -> Dict[str, str]:
+    """
+    AZURE_OPENAI_DEPLOYMENT_ENCODINGS="my-chat=o200k_base,my-embed=cl100k_base"
+    maps Azure deployment names (which tiktoken cannot resolve) to encodings.
+    """
+    mapping = {}
+    for pair in os.environ.get("AZURE_OPENAI_DEPLOYMENT_ENCODINGS", "").split(","):
+        name, sep, encoding = pair.partition("=")
+        if sep and name.strip() and encoding.strip():
+            mapping[name.strip()] = encoding.strip()
+    return mapping
+
+
+@lru_cache(maxsize=None)
+def encoding_name_for(deployment: str) -> str:
+    """Resolve a deployment or model name to a tiktoken encoding name."""
+    explicit = _deployment_encodings().get(deployment)
+    if explicit:
+        return explicit
+
+    try:
+        return tiktoken.encoding_name_for_model(deployment)
+    except KeyError:
+        pass
+
+    lowered = (deployment or "").lower()
+    for prefix, encoding in _PREFIX_ENCODINGS:
+        if lowered.startswith(prefix):
+            return encoding
+    return DEFAULT_ENCODING
+
+
+@lru_cache(maxsize=None)
+def get_encoding(deployment: str) -> tiktoken.Encoding:
+    """Cached encoder for a deployment/model name."""
+    return tiktoken.get_encoding(encoding_name_for(deployment))
+
+
+def message_tokens(message: Dict, deployment: str) -> int:
+    """Token cost of one message, computed once per encoding and memoized on the message."""
+    encoding_name = encoding_name_for(deployment)
+    memo = message.get(TOKENS_KEY)
+    if isinstance(memo, dict) and encoding_name in memo:
+        return memo[encoding_name]
+
+    encoding = get_encoding(deployment)
+    n = _TOKENS_PER_MESSAGE
+    for key, value in message.items():
+        if key != TOKENS_KEY and isinstance(value, str):
+            n += len(encoding.encode(value))
+
+    if isinstance(memo, dict):
+        memo[encoding_name] = n
+    else:
+        message[TOKENS_KEY] = {encoding_name: n}
+    return n
+
+
+def count_tokens(messages: Iterable[Dict], deployment: str) -> int:
+    return sum(message_tokens(m, deployment) for m in messages) + _TOKENS_PER_REQUEST
+
+
+def annotate(messages: Iterable[Dict], deployment: str) -> None:
+    """Make sure every message carries its memoized count (e.g. before saving)."""
+    for m in messages:
+        message_tokens(m, deployment)
+
+
+def api_message(message: Dict) -> Dict:
+    """Copy of a message without bookkeeping keys the chat API does not accept."""
+    return {k: v for k, v in message.items() if k != TOKENS_KEY}
+
+
+def api_messages(messages: Iterable[Dict]) -> List[Dict]:
+    return [api_message(m) for m in messages]
@@ -1,12 +1,16 @@
-import time
-from typing import Dict, Any, Optional
+import asyncio
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple
 import os, requests, logging
 # Reuse your existing components
 from .openai_client import init_openai_client
 from .retrieval import search_top_k_hybrid, format_sources_for_prompt
 from .prompts import make_grounded_user_message
-from .query_rewrite import rewrite_query
-from .utils import summarize, trim_conversation_by_tokens
+from .embedding_cache import normalize_text
+from .search_cache import search_cache
 
 
 
@@ -41,6 +45,8 @@ def sanitize_prompt(user_prompt: str) -> str:
 
 
 
+_REFUSAL = "I can only generate images related to the stories in the knowledge base."
+
 _IMAGE_POLICY = (
     "You ONLY generate images related to the knowledge base stories.\n"
     "If unrelated, reply EXACTLY with: 'I can only generate images related to the stories in the knowledge base.'\n"
@@ -48,46 +54,135 @@ _IMAGE_POLICY = (
     "Do not add disclaimers or extra text."
 )
 
-def _expand_prompt_via_kb(user_prompt: str) -> Optional[str]:
-    """Return a KB-grounded visual description or None if unrelated."""
-    client, deployment = init_openai_client()
-    convo = [{"role": "system", "content": _IMAGE_POLICY}]
+class TurnContext(NamedTuple):
+    """What the current chat turn already has: async client, deployment and retrieved passages."""
+    client: Any
+    deployment_name: str
+    passages: List[Dict]
+
+
+_turn_context: ContextVar[Optional[TurnContext]] = ContextVar("turn_context", default=None)
 
-    # Rewrite -> retrieve -> grounded user msg
+
+@contextmanager
+def turn_context(ctx: TurnContext):
+    """Expose `ctx` to tools called in this block (tasks/threads started inside inherit it)."""
+    token = _turn_context.set(ctx)
     try:
-        q = rewrite_query(client, deployment, convo, user_prompt)
-    except Exception:
-        q = user_prompt
+        yield ctx
+    finally:
+        _turn_context.reset(token)
 
-    hits = search_top_k_hybrid(q, k=5)
-    if not hits:
-        return None
 
-    sources = format_sources_for_prompt(hits)
-    grounded = make_grounded_user_message(user_prompt, sources)
+class _DescriptionCache:
+    """
+    LRU of expanded descriptions keyed by (normalized prompt, ids of the
+    passages they were grounded in, index generation); see _description_key().
+    Only real descriptions are stored, never refusals or empty results.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[str]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Tuple, description: str):
+        if self.max_entries <= 0 or not description:
+            return
+        with self._lock:
+            self._entries[key] = description
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
 
-    convo.append({"role": "user", "content": user_prompt})
-    convo2 = list(convo) + [grounded]
 
-    # housekeeping
-    convo2 = summarize(convo2, client, deployment)
-    convo2 = trim_conversation_by_tokens(convo2, max_tokens=8192, model=deployment, safety_margin=500)
+_description_cache = _DescriptionCache(int(os.environ.get("IMAGE_DESCRIPTION_CACHE_MAX_ENTRIES", "256")))
 
-    # ask for final visual description
-    resp = client.chat.completions.create(
-        model=deployment,
-        messages=convo2,
+
+def _description_request(model: str, user_prompt: str, passages: List[Dict]) -> Dict:
+    grounded = make_grounded_user_message(user_prompt, format_sources_for_prompt(passages, deployment=model))
+    return dict(
+        model=model,
+        messages=[{"role": "system", "content": _IMAGE_POLICY}, grounded],
         temperature=0.2,
         max_tokens=700,
         top_p=1.0,
     )
+
+
+def _parse_description(resp) -> Optional[str]:
     desc = (resp.choices[0].message.content or "").strip()
-    refusal = "I can only generate images related to the stories in the knowledge base."
-    if not desc or refusal in desc:
+    if not desc or _REFUSAL in desc:
         return None
     return desc
 
 
+def _expand_prompt_via_kb(user_prompt: str) -> Optional[str]:
+    """
+    Return a KB-grounded visual description or None if unrelated.
+    Standalone path (no turn context): one retrieval for the prompt, then one completion.
+    """
+    client, deployment = init_openai_client()
+    hits = search_top_k_hybrid(user_prompt, k=5)
+    if not hits:
+        return None
+    resp = client.chat.completions.create(**_description_request(deployment, user_prompt, hits))
+    return _parse_description(resp)
+
+
+def _description_key(prompt: str, passages: Optional[List[Dict]]) -> Tuple:
+    """
+    Cache key of a description: the prompt, the passages it is grounded in
+    ((file, chunkId) ids; None when _expand_prompt_via_kb() retrieves its own)
+    and the search index generation, so other passages or a re-index
+    (in this process) produce a new description.
+    """
+    ids = None
+    if passages is not None:
+        ids = []
+        for p in passages:
+            raw = p.get("raw") or {}
+            ids.append((raw.get("fileId") or raw.get("fileName") or p.get("title"), raw.get("chunkId")))
+        ids = tuple(ids)
+    return normalize_text(prompt), ids, search_cache.generation
+
+
+async def _aexpand_prompt(user_prompt: str) -> Optional[str]:
+    """
+    Description for the image prompt, grounded in the passages the current turn
+    already retrieved (one completion on the turn's client, no new rewrite/search).
+    Descriptions are cached per prompt and passages; refusals are not cached.
+    """
+    ctx = _turn_context.get()
+    if ctx is not None and not ctx.passages:
+        # Nothing retrieved this turn: unrelated
+        return None
+
+    key = _description_key(user_prompt, ctx.passages if ctx is not None else None)
+    cached = _description_cache.get(key)
+    if cached is not None:
+        return cached
+
+    if ctx is None:
+        desc = await asyncio.to_thread(_expand_prompt_via_kb, user_prompt)
+    else:
+        resp = await ctx.client.chat.completions.create(
+            **_description_request(ctx.deployment_name, user_prompt, ctx.passages)
+        )
+        desc = _parse_description(resp)
+
+    if desc:
+        _description_cache.put(key, desc)
+    return desc
+
+
 def _normalize_image_result(result: Any, prompt: str, size: str, expanded: Optional[str]) -> Dict[str, Any]:
     images = []
     if isinstance(result, str):
@@ -105,33 +200,43 @@ def _normalize_image_result(result: Any, prompt: str, size: str, expanded: Optio
     }
 
 
-def tool_generate_image(
+# Retries around the DALLE helper (covers transient 429s); no wait after the last one
+IMAGE_ATTEMPTS = 4
+IMAGE_BACKOFF_SECONDS = 1.0
+
+
+async def tool_generate_image(
     prompt: str,
     size: str = "1024x1024",
     session_id: Optional[str] = None,  # not used here but kept for API symmetry
 ) -> Dict[str, Any]:
     """
     In-process image generation:
-      - KB-check + visual description via chat
+      - KB-check + visual description via chat, grounded in the passages the
+        current turn already retrieved (see turn_context)
       - DALLE generation via your existing helper
+    The blocking helpers run in worker threads and the backoff is asyncio.sleep,
+    so the event loop (and other tool calls) keep running meanwhile.
     """
     # 1) KB gate + expansion
-    expanded = _expand_prompt_via_kb(prompt)
+    expanded = await _aexpand_prompt(prompt)
     if expanded is None:
-        return {"error": "I can only generate images related to the stories in the knowledge base."}
+        # The refusal is the answer; no follow-up completion needed
+        return {"error": _REFUSAL, "final_reply": _REFUSAL}
 
-    # 2) Call DALLE with light backoff around your helper (covers transient 429s)
+    # 2) Call DALLE with light backoff around your helper
     last_err = None
-    for attempt in range(4):
+    for attempt in range(IMAGE_ATTEMPTS):
         try:
-            result = generate_image(prompt=expanded, size=size)
+            result = await asyncio.to_thread(generate_image, prompt=expanded, size=size)
             return _normalize_image_result(result, prompt, size, expanded)
         except Exception as e:
             last_err = e
-            # small exponential backoff
-            time.sleep(1.0 * (2 ** attempt))
+            if attempt < IMAGE_ATTEMPTS - 1:
+                # small exponential backoff
+                await asyncio.sleep(IMAGE_BACKOFF_SECONDS * (2 ** attempt))
 
-    logging.exception("Image generation failed after retries", exc_info=last_err)
+    logging.error("Image generation failed after retries", exc_info=last_err)
     return {"error": f"image generation failed: {last_err}", "prompt": prompt, "size": size}
 
 
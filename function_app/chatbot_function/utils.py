@@ -1,6 +1,8 @@
-import tiktoken
+import logging
 import re
 
+from . import tokens
+
 
 def summarize(conversation, client, model, num_to_summarize=5):
     """
@@ -19,16 +21,7 @@ def summarize(conversation, client, model, num_to_summarize=5):
     if len(conversation) <= 1 + num_to_summarize * 2:
         return conversation  # not long enough to summarize
 
-    system_prompt = conversation[0]
-
-    # get oldest N messages (excluding system prompt)
-    old_history = conversation[1:1 + num_to_summarize]
-    recent_messages = conversation[1 + num_to_summarize:]
-
-    summary_prompt = [
-        {"role": "system", "content": "Summarize the following chat history briefly:"},
-        {"role": "user", "content": "\n".join([m["content"] for m in old_history if m.get("content")])}
-    ]
+    system_prompt, recent_messages, summary_prompt = _split_for_summary(conversation, num_to_summarize)
 
     try:
         summary_response = client.chat.completions.create(
@@ -39,27 +32,80 @@ def summarize(conversation, client, model, num_to_summarize=5):
 
         summary_text = summary_response.choices[0].message.content.strip()
 
-        return [
-            system_prompt,
-            {"role": "system", "content": f"Summary of prior conversation: {summary_text}"},
-            *recent_messages
-        ]
+        return _with_summary(system_prompt, summary_text, recent_messages)
 
     except Exception as e:
-        print(f"Summarization failed: {e}")
+        logging.warning(f"Summarization failed: {e}")
         return [system_prompt] + recent_messages
 
 
+async def afold_summary(previous_summary, messages, client, model):
+    """
+    Fold `messages` into a rolling conversation summary (async client).
+
+    Args:
+        previous_summary (str): Summary so far ("" when there is none yet).
+        messages (list): Oldest not-yet-summarized messages, in order.
+        client (AsyncAzureOpenAI): OpenAI client.
+        model (str): OpenAI deployment name.
+
+    Returns:
+        str: Updated summary, or None if the model call failed.
+    """
+    transcript = "\n".join(f'{m["role"]}: {m["content"]}' for m in messages if m.get("content"))
+    if previous_summary:
+        prompt = [
+            {"role": "system", "content": "Update the running summary of a chat with the new messages. Keep it brief."},
+            {"role": "user", "content": f"Current summary:\n{previous_summary}\n\nNew messages:\n{transcript}"},
+        ]
+    else:
+        prompt = [
+            {"role": "system", "content": "Summarize the following chat history briefly:"},
+            {"role": "user", "content": transcript},
+        ]
+
+    try:
+        response = await client.chat.completions.create(
+            model=model,
+            messages=prompt,
+            temperature=0.3
+        )
+        return (response.choices[0].message.content or "").strip() or None
+    except Exception as e:
+        logging.warning(f"Summarization failed: {e}")
+        return None
+
+
+def summary_message(summary_text):
+    return {"role": "system", "content": f"Summary of prior conversation: {summary_text}"}
+
+
+def _split_for_summary(conversation, num_to_summarize):
+    system_prompt = conversation[0]
+
+    # get oldest N messages (excluding system prompt)
+    old_history = conversation[1:1 + num_to_summarize]
+    recent_messages = conversation[1 + num_to_summarize:]
+
+    summary_prompt = [
+        {"role": "system", "content": "Summarize the following chat history briefly:"},
+        {"role": "user", "content": "\n".join([m["content"] for m in old_history if m.get("content")])}
+    ]
+    return system_prompt, recent_messages, summary_prompt
+
+
+def _with_summary(system_prompt, summary_text, recent_messages):
+    return [
+        system_prompt,
+        summary_message(summary_text),
+        *recent_messages
+    ]
+
+
 
 def count_tokens(messages, model="gpt-4"):
-    encoding = tiktoken.encoding_for_model(model)
-    tokens = 0
-    for message in messages:
-        tokens += 4 
-        for key, value in message.items():
-            tokens += len(encoding.encode(value))
-    tokens += 2  
-    return tokens
+    """Token count for a message list; `model` may be a model or an Azure deployment name."""
+    return tokens.count_tokens(messages, model)
 
 def trim_conversation_by_tokens(conversation, max_tokens=8192, model="gpt-4", safety_margin=500):
     """
@@ -67,42 +113,65 @@ def trim_conversation_by_tokens(conversation, max_tokens=8192, model="gpt-4", sa
     - Keeps system prompt (index 0)
     - Keeps as many recent messages as fit within budget
     - Discards everything else (summary included)
+    Per-message counts are memoized on the messages (see tokens.py), so
+    stored history is only encoded once; one pass over the conversation.
     """
     if not conversation:
         return []
 
     system_prompt = conversation[0]
     allowed_tokens = max_tokens - safety_margin
-    total_tokens = count_tokens([system_prompt])
+    total_tokens = tokens.count_tokens([system_prompt], model)
 
-    trimmed = []
+    kept = []
     for msg in reversed(conversation[1:]):
-        msg_tokens = count_tokens([msg])
+        msg_tokens = tokens.message_tokens(msg, model)
         if total_tokens + msg_tokens <= allowed_tokens:
-            trimmed.insert(0, msg)
+            kept.append(msg)
             total_tokens += msg_tokens
         else:
             break
 
-    return [system_prompt] + trimmed
+    kept.append(system_prompt)
+    kept.reverse()
+    return kept
+
+# clean_text() patterns, compiled once. Each starts with a literal character so
+# the regex engine can skip ahead instead of trying every position.
+_SPACE_RUN = re.compile(r"  +")
+_SOFT_BREAK = re.compile(r"\n(?<=\w\n)(?=\w)")   # same as (?<=\w)\n(?=\w)
+_EXTRA_NEWLINES = re.compile(r"\n\n\n+")
+# Control characters left after whitespace normalization (\t\v\f\r are gone, \n is kept)
+_CONTROL = re.compile(r"[\x00-\x08\x0e-\x1f]")
+_STRIP_CONTROL = {i: None for i in range(32) if chr(i) not in "\n\t"}
+
 
 def clean_text(text: str) -> str:
     if not text:
         return ""
 
     # normalize newlines
-    t = text.replace("\r\n", "\n").replace("\r", "\n")
+    t = text
+    if "\r" in t:
+        t = t.replace("\r\n", "\n").replace("\r", "\n")
 
     # collapse spaces/tabs/formfeeds/vertical-tabs
-    t = re.sub(r"[ \t\f\v]+", " ", t)
+    for ch in "\t\f\v":
+        if ch in t:
+            t = t.replace(ch, " ")
+    if "  " in t:
+        t = _SPACE_RUN.sub(" ", t)
 
     # join lines that are likely part of the same sentence
-    t = re.sub(r"(?<=\w)\n(?=\w)", " ", t)
+    t = _SOFT_BREAK.sub(" ", t)
 
     # reduce 3+ newlines to 2 (paragraphs)
-    t = re.sub(r"\n{3,}", "\n\n", t)
+    if "\n\n\n" in t:
+        t = _EXTRA_NEWLINES.sub("\n\n", t)
 
-    # strip non-printables
-    t = "".join(ch for ch in t if ch == "\n" or ch == "\t" or ord(ch) >= 32)
+    # strip non-printables (last, so they still block the joins above as before);
+    # str.translate is only fast on ASCII strings
+    if _CONTROL.search(t):
+        t = t.translate(_STRIP_CONTROL) if t.isascii() else _CONTROL.sub("", t)
 
-    return t.strip()
\ No newline at end of file
+    return t.strip()
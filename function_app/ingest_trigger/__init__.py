@@ -5,24 +5,38 @@ import logging
 import azure.functions as func
 
 from .document_intelligence import extract_text_from_document
-from .ingestion_pipeline import process_and_index_text
+from .ingestion_pipeline import process_and_index_text, summary_counts
+from .metrics import IngestTrace
 
 
 def main(inputBlob: func.InputStream):
     logging.info(f"--- Blob Triggered: {inputBlob.name} ({inputBlob.length} bytes)")
 
-    raw_bytes = inputBlob.read()
     filename = inputBlob.name.split("/")[-1]
+    # Per-stage timings and counts go to the metrics sink (structured log lines by default)
+    trace = IngestTrace(filename)
 
     try:
-        extracted_text = extract_text_from_document(raw_bytes, filename)
+        with trace.stage("read") as fields:
+            raw_bytes = inputBlob.read()
+            fields["bytes"] = len(raw_bytes)
+
+        with trace.stage("extract", bytes=len(raw_bytes)) as fields:
+            extracted_text = extract_text_from_document(raw_bytes, filename, stats=fields)
+            fields["chars"] = len(extracted_text)
 
         if not extracted_text.strip():
             logging.warning("No text extracted from document.")
+            trace.finish(status="empty")
             return
 
-        process_and_index_text(text=extracted_text, filename=filename)
+        stats = process_and_index_text(text=extracted_text, filename=filename, trace=trace)
+        if stats is None:
+            trace.finish(status="empty")
+            return
+        trace.finish(status="indexed", **summary_counts(stats))
         logging.info("Document successfully processed and indexed.")
 
     except Exception as e:
         logging.exception(f"Ingestion failed: {str(e)}")
+        trace.finish(status="failed", error=str(e))
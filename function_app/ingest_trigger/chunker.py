@@ -0,0 +1,145 @@
+# function_app/ingest_trigger/chunker.py
+
+from __future__ import annotations
+
+import re
+from collections import deque
+from functools import lru_cache
+from typing import Iterator, NamedTuple, Tuple
+
+import tiktoken
+
+
+class Chunk(NamedTuple):
+    text: str
+    start: int  # character offset of text[0] in the source
+    end: int    # character offset just past the last character
+
+
+# A sentence ends at terminal punctuation (plus closing quotes/brackets) followed
+# by whitespace, or at a CJK full stop; blank lines end a paragraph.
+_BOUNDARY = re.compile(r"(?:[.!?…][\"'”’)\]]*\s+|[。！？]\s*|\n\s*\n\s*)")
+_WORD = re.compile(r"\S+\s*")
+
+
+@lru_cache(maxsize=None)
+def _get_encoder(encoding_name: str):
+    return tiktoken.get_encoding(encoding_name)
+
+
+def _segments(text: str) -> Iterator[Tuple[int, int, bool]]:
+    """(start, end, ends_paragraph) of each sentence, trailing whitespace included."""
+    pos = 0
+    for m in _BOUNDARY.finditer(text):
+        yield pos, m.end(), "\n" in m.group()
+        pos = m.end()
+    if pos < len(text):
+        yield pos, len(text), True
+
+
+def _trimmed(text: str, start: int, end: int) -> Chunk:
+    raw = text[start:end]
+    stripped = raw.strip()
+    lead = len(raw) - len(raw.lstrip())
+    return Chunk(stripped, start + lead, start + lead + len(stripped))
+
+
+def _split_long(text: str, start: int, end: int, max_tokens: int, enc) -> Iterator[Tuple[int, int]]:
+    """Spans of a sentence longer than the budget: cut between words, or inside a huge word."""
+    span_start, span_tokens = start, 0
+    for m in _WORD.finditer(text, start, end):
+        n = len(enc.encode_ordinary(m.group()))
+        if n > max_tokens:
+            if span_tokens:
+                yield span_start, m.start()
+            yield from _split_chars(text, m.start(), m.end(), max_tokens, enc)
+            span_start, span_tokens = m.end(), 0
+            continue
+        if span_tokens + n > max_tokens:
+            yield span_start, m.start()
+            span_start, span_tokens = m.start(), 0
+        span_tokens += n
+    if span_start < end:
+        yield span_start, end
+
+
+def _split_chars(text: str, start: int, end: int, max_tokens: int, enc) -> Iterator[Tuple[int, int]]:
+    while start < end:
+        size = min(end - start, max_tokens * 4)
+        while size > 1 and len(enc.encode_ordinary(text[start:start + size])) > max_tokens:
+            size = max(1, int(size * 0.8))
+        yield start, start + size
+        start += size
+
+
+def iter_chunks(
+    text: str,
+    max_tokens: int = 300,
+    *,
+    overlap_sentences: int = 0,
+    encoding_name: str = "cl100k_base",
+) -> Iterator[Chunk]:
+    """
+    Yield chunks of at most ~`max_tokens` tokens, made of whole sentences.
+
+    Works incrementally over `text` (one sentence is encoded at a time, nothing
+    is decoded), so memory does not grow with document size. Chunks end at a
+    paragraph break once they are at least half full, otherwise at the sentence
+    that would overflow the budget; a single sentence longer than the budget is
+    cut between words. `overlap_sentences` repeats the last N sentences of a
+    chunk at the start of the next one (0 = no overlap).
+    Offsets are into `text`, so chunk.text == text[chunk.start:chunk.end].
+    """
+    if max_tokens <= 0:
+        raise ValueError("max_tokens must be positive")
+
+    enc = _get_encoder(encoding_name)
+    # Sentences of the chunk being built: (start, end, tokens); `fresh` counts the
+    # tokens not already emitted as overlap of the previous chunk
+    current: deque = deque()
+    current_tokens = 0
+    fresh = 0
+
+    def flush(overlap: bool = True) -> Iterator[Chunk]:
+        nonlocal current_tokens, fresh
+        chunk = _trimmed(text, current[0][0], current[-1][1])
+        if chunk.text:
+            yield chunk
+        keep = list(current)[-overlap_sentences:] if overlap and overlap_sentences else []
+        current.clear()
+        current_tokens = fresh = 0
+        for sentence in reversed(keep):
+            if current_tokens + sentence[2] > max_tokens // 2:
+                break
+            current.appendleft(sentence)
+            current_tokens += sentence[2]
+
+    for start, end, ends_paragraph in _segments(text):
+        n = len(enc.encode_ordinary(text[start:end]))
+
+        if n > max_tokens:
+            if fresh:
+                yield from flush(overlap=False)
+            current.clear()
+            current_tokens = fresh = 0
+            for span_start, span_end in _split_long(text, start, end, max_tokens, enc):
+                chunk = _trimmed(text, span_start, span_end)
+                if chunk.text:
+                    yield chunk
+            continue
+
+        if fresh and current_tokens + n > max_tokens:
+            yield from flush()
+        while current and current_tokens + n > max_tokens:
+            # Overlap carried over from the previous chunk must leave room
+            current_tokens -= current.popleft()[2]
+
+        current.append((start, end, n))
+        current_tokens += n
+        fresh += n
+
+        if ends_paragraph and fresh >= max_tokens // 2:
+            yield from flush()
+
+    if fresh:
+        yield from flush(overlap=False)
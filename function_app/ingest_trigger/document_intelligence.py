@@ -1,28 +1,90 @@
 import os
 import io
+import re
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 from PIL import Image
 from azure.core.credentials import AzureKeyCredential
 from azure.core.exceptions import HttpResponseError, ResourceNotFoundError
 from azure.ai.formrecognizer import DocumentAnalysisClient
+from pypdf import PdfReader, PdfWriter
 
 
-_endpoint = os.environ.get("DOCUMENT_INTELLIGENCE_ENDPOINT")
-_key = os.environ.get("DOCUMENT_INTELLIGENCE_KEY")
+# Large PDFs are split into page ranges, analyzed by up to DI_MAX_POLLERS concurrent pollers
+DI_PARALLEL_MIN_PAGES = int(os.environ.get("DI_PARALLEL_MIN_PAGES", "40"))
+DI_PAGES_PER_RANGE = int(os.environ.get("DI_PAGES_PER_RANGE", "20"))
+DI_MAX_POLLERS = int(os.environ.get("DI_MAX_POLLERS", "4"))
 
-if not _endpoint or not _key:
-    raise RuntimeError(
-        "Missing Document Intelligence settings.\n"
-        "Set DOCUMENT_INTELLIGENCE_ENDPOINT and DOCUMENT_INTELLIGENCE_KEY in your environment."
+_client: Optional[DocumentAnalysisClient] = None
+
+
+def get_document_analysis_client():
+    """Shared client, built on first use from DOCUMENT_INTELLIGENCE_ENDPOINT / _KEY."""
+    global _client
+    if _client is not None:
+        return _client
+
+    endpoint = os.environ.get("DOCUMENT_INTELLIGENCE_ENDPOINT")
+    key = os.environ.get("DOCUMENT_INTELLIGENCE_KEY")
+    if not endpoint or not key:
+        raise RuntimeError(
+            "Missing Document Intelligence settings.\n"
+            "Set DOCUMENT_INTELLIGENCE_ENDPOINT and DOCUMENT_INTELLIGENCE_KEY in your environment."
+        )
+
+    # Normalize endpoint (avoid double slashes)
+    _client = DocumentAnalysisClient(
+        endpoint=endpoint.rstrip("/"),
+        credential=AzureKeyCredential(key),
     )
+    return _client
 
-# Normalize endpoint (avoid double slashes)
-_endpoint = _endpoint.rstrip("/")
 
+def set_document_analysis_client(client) -> None:
+    """Swap the client (e.g. a local stub with begin_analyze_document) for offline runs."""
+    global _client
+    _client = client
 
-document_analysis_client = DocumentAnalysisClient(
-    endpoint=_endpoint,
-    credential=AzureKeyCredential(_key),
-)
+
+_PDF_PAGE = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+
+
+def pdf_page_count(data: bytes) -> Optional[int]:
+    """Page count of a PDF (pypdf, else a scan for page objects); None if unknown."""
+    if not data.startswith(b"%PDF"):
+        return None
+    try:
+        return len(PdfReader(io.BytesIO(data)).pages)
+    except Exception:
+        pass
+    # Unparseable file: compressed object streams can hide page objects, then no count
+    return len(_PDF_PAGE.findall(data)) or None
+
+
+def page_ranges(page_count: int, per_range: int) -> List[Tuple[int, int]]:
+    return [(first, min(first + per_range - 1, page_count)) for first in range(1, page_count + 1, per_range)]
+
+
+def split_pdf(data: bytes, ranges: List[Tuple[int, int]]) -> Optional[List[bytes]]:
+    """
+    One smaller PDF per (first, last) page range, so each range request uploads
+    only its own pages; None if pypdf cannot read or rewrite the file.
+    """
+    try:
+        reader = PdfReader(io.BytesIO(data))
+        parts = []
+        for first, last in ranges:
+            writer = PdfWriter()
+            for index in range(first - 1, last):
+                writer.add_page(reader.pages[index])
+            out = io.BytesIO()
+            writer.write(out)
+            parts.append(out.getvalue())
+        return parts
+    except Exception as e:
+        logging.warning(f"Could not split PDF into page ranges ({e})")
+        return None
 
 
 def _normalize_image_bytes(name: str, data: bytes) -> bytes:
@@ -41,38 +103,67 @@ def _normalize_image_bytes(name: str, data: bytes) -> bytes:
 
 
 
-def extract_text_from_document(file_bytes: bytes, filename: str = None) -> str:
+def _result_text(result) -> str:
+    if getattr(result, "content", None):
+        return result.content
+
+    lines = []
+    for page in getattr(result, "pages", []) or []:
+        for line in getattr(page, "lines", []) or []:
+            if line.content:
+                lines.append(line.content)
+    return "\n".join(lines)
+
+
+def _analyze_pages(data: bytes) -> str:
+    poller = get_document_analysis_client().begin_analyze_document(
+        model_id="prebuilt-read",
+        document=data,
+    )
+    return _result_text(poller.result())
+
+
+def _analyze_parts(parts: List[bytes], page_count: int) -> str:
+    """Analyze the split page ranges on up to DI_MAX_POLLERS pollers; text in page order."""
+    logging.info(f"Analyzing {page_count} pages as {len(parts)} ranges ({DI_MAX_POLLERS} concurrent)")
+    with ThreadPoolExecutor(max_workers=DI_MAX_POLLERS, thread_name_prefix="di-range") as pool:
+        # map() yields in submission order, i.e. page order
+        return "\n".join(p for p in pool.map(_analyze_pages, parts) if p)
+
+
+def extract_text_from_document(file_bytes: bytes, filename: str = None, stats: Optional[Dict] = None) -> str:
     """
     Analyze a document using the prebuilt-read model (Form Recognizer v3)
     and return extracted text. For .txt files, decode directly.
+    PDFs of DI_PARALLEL_MIN_PAGES pages or more are split into page ranges
+    (one smaller PDF each) that are analyzed concurrently; if the PDF cannot be
+    split it is analyzed in one request.
 
     Args:
         file_bytes (bytes): File content in bytes (from blob trigger input).
         filename (str, optional): File name for logging/debugging.
+        stats (dict, optional): Filled with method ("text"/"read"), pages, ranges
+            and normalized (image re-encoded after a format error).
 
     Returns:
         str: Extracted text from the document.
     """
-    def _analyze(data: bytes) -> str:
-        poller = document_analysis_client.begin_analyze_document(
-            model_id="prebuilt-read",
-            document=data,
-        )
-        result = poller.result()
-
-        if getattr(result, "content", None):
-            return result.content
+    info = stats if stats is not None else {}
 
-        lines = []
-        for page in getattr(result, "pages", []) or []:
-            for line in getattr(page, "lines", []) or []:
-                if line.content:
-                    lines.append(line.content)
-        return "\n".join(lines)
+    def _analyze(data: bytes) -> str:
+        page_count = pdf_page_count(data)
+        info.update(method="read", pages=page_count, ranges=1)
+        if page_count and page_count >= DI_PARALLEL_MIN_PAGES:
+            parts = split_pdf(data, page_ranges(page_count, DI_PAGES_PER_RANGE))
+            if parts:
+                info["ranges"] = len(parts)
+                return _analyze_parts(parts, page_count)
+        return _analyze_pages(data)
 
     # --- Case 1: plain text files ---
     ext = (os.path.splitext(filename or "")[1] or "").lower()
     if ext == ".txt":
+        info["method"] = "text"
         try:
             return file_bytes.decode("utf-8")
         except UnicodeDecodeError:
@@ -88,6 +179,7 @@ def extract_text_from_document(file_bytes: bytes, filename: str = None) -> str:
         if "InvalidContent" in msg or "Invalid request" in msg:
             try:
                 fixed = _normalize_image_bytes(filename or "image", file_bytes)
+                info["normalized"] = True
                 return _analyze(fixed)
             except Exception:
                 pass  # fall through to raise original error
@@ -0,0 +1,190 @@
+# function_app/ingest_trigger/ingest_engine.py
+
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+_DONE = object()
+
+
+class IngestConfig:
+    """
+    Concurrency and backpressure knobs of IngestionEngine (env defaults):
+      INGEST_EMBED_WORKERS   threads calling the embeddings API
+      INGEST_EMBED_BATCH     chunks per embed call made by one worker
+      INGEST_QUEUE_SIZE      max docs waiting in each queue (bounds memory)
+      INGEST_UPLOAD_BATCH    docs per upload flush
+    """
+
+    def __init__(
+        self,
+        embed_workers: Optional[int] = None,
+        embed_batch: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        upload_batch: Optional[int] = None,
+    ):
+        self.embed_workers = embed_workers or int(os.environ.get("INGEST_EMBED_WORKERS", "4"))
+        self.embed_batch = embed_batch or int(os.environ.get("INGEST_EMBED_BATCH", "64"))
+        self.queue_size = queue_size or int(os.environ.get("INGEST_QUEUE_SIZE", "256"))
+        self.upload_batch = upload_batch or int(os.environ.get("INGEST_UPLOAD_BATCH", "100"))
+
+
+class IngestionEngine:
+    """
+    Streaming ingestion: the caller's docs (vectors optional) flow through
+
+        producer --[chunk queue]--> N embed workers --[doc queue]--> uploader
+
+    Both queues are bounded, so a slow stage blocks the one before it and at most
+    ~2 x queue_size docs (+ one batch per worker and the pending upload batch)
+    are in memory, whatever the size of the document.
+
+    `embed(texts) -> vectors` and `upload(docs)` are injected so stages can be
+    swapped (e.g. stubs in scripts/bench_ingest_pipeline.py).
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[Sequence[str]], List[List[float]]],
+        upload: Callable[[List[Dict]], object],
+        config: Optional[IngestConfig] = None,
+        *,
+        text_field: str = "chunk",
+        vector_field: str = "contentVector",
+    ):
+        self.embed = embed
+        self.upload = upload
+        self.config = config or IngestConfig()
+        self.text_field = text_field
+        self.vector_field = vector_field
+
+        self._chunks: "queue.Queue" = queue.Queue(maxsize=self.config.queue_size)
+        self._docs: "queue.Queue" = queue.Queue(maxsize=self.config.queue_size)
+        self._error: Optional[BaseException] = None
+        self._lock = threading.Lock()
+        # *_seconds: time spent inside embed/upload calls, summed over threads
+        self.stats = {
+            "chunks": 0, "embedded": 0, "uploaded": 0, "embed_calls": 0, "upload_calls": 0,
+            "embed_seconds": 0.0, "upload_seconds": 0.0,
+        }
+
+    def run(self, docs: Iterable[Dict]) -> Dict[str, float]:
+        """Embed and upload `docs`; returns stage counters, busy and elapsed seconds."""
+        start = time.perf_counter()
+        workers = [
+            threading.Thread(target=self._embed_worker, name=f"ingest-embed-{i}", daemon=True)
+            for i in range(self.config.embed_workers)
+        ]
+        uploader = threading.Thread(target=self._uploader, name="ingest-upload", daemon=True)
+        for t in workers:
+            t.start()
+        uploader.start()
+
+        try:
+            for doc in docs:
+                self._put(self._chunks, doc)
+                self.stats["chunks"] += 1
+        finally:
+            for _ in workers:
+                self._chunks.put(_DONE)
+            for t in workers:
+                t.join()
+            self._docs.put(_DONE)
+            uploader.join()
+
+        if self._error is not None:
+            raise RuntimeError(f"Ingestion failed: {self._error}") from self._error
+
+        self.stats["embed_seconds"] = round(self.stats["embed_seconds"], 3)
+        self.stats["upload_seconds"] = round(self.stats["upload_seconds"], 3)
+        self.stats["seconds"] = round(time.perf_counter() - start, 3)
+        return self.stats
+
+    # -- stages --
+
+    def _put(self, q: "queue.Queue", item):
+        # Block while the next stage is saturated, but stop feeding a failed pipeline
+        while True:
+            if self._error is not None:
+                raise RuntimeError(f"Ingestion failed: {self._error}") from self._error
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _fail(self, e: BaseException):
+        with self._lock:
+            if self._error is None:
+                logging.exception("Ingestion stage failed")
+                self._error = e
+
+    def _next_batch(self) -> Tuple[List[Dict], bool]:
+        """Block for one doc, then take whatever else is ready up to embed_batch."""
+        item = self._chunks.get()
+        if item is _DONE:
+            return [], True
+        batch = [item]
+        while len(batch) < self.config.embed_batch:
+            try:
+                item = self._chunks.get_nowait()
+            except queue.Empty:
+                break
+            if item is _DONE:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _embed_worker(self):
+        done = False
+        while not done:
+            batch, done = self._next_batch()
+            if not batch or self._error is not None:
+                continue  # keep draining so the producer never blocks forever
+            try:
+                # Docs that already carry a vector (e.g. reused on re-ingestion) skip the embed call
+                todo = [d for d in batch if d.get(self.vector_field) is None]
+                if todo:
+                    start = time.perf_counter()
+                    vectors = self.embed([d[self.text_field] for d in todo])
+                    with self._lock:
+                        self.stats["embed_seconds"] += time.perf_counter() - start
+                        self.stats["embed_calls"] += 1
+                        self.stats["embedded"] += len(todo)
+                    for doc, vector in zip(todo, vectors):
+                        doc[self.vector_field] = vector
+                for doc in batch:
+                    self._put(self._docs, doc)
+            except BaseException as e:
+                self._fail(e)
+
+    def _uploader(self):
+        pending: List[Dict] = []
+        while True:
+            item = self._docs.get()
+            if item is _DONE:
+                break
+            if self._error is not None:
+                continue
+            pending.append(item)
+            if len(pending) >= self.config.upload_batch:
+                self._flush(pending)
+                pending = []
+        if pending and self._error is None:
+            self._flush(pending)
+
+    def _flush(self, docs: List[Dict]):
+        try:
+            start = time.perf_counter()
+            self.upload(docs)
+            self.stats["upload_seconds"] += time.perf_counter() - start
+            self.stats["upload_calls"] += 1
+            self.stats["uploaded"] += len(docs)
+        except BaseException as e:
+            self._fail(e)
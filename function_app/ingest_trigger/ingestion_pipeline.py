@@ -2,53 +2,123 @@
 
 from __future__ import annotations
 
-from typing import List, Dict
+import hashlib
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from datetime import datetime
 
-import tiktoken, base64
+import base64
 
-from ..chatbot_function.embed import embed_text
+from azure.core.exceptions import HttpResponseError
+
+from ..chatbot_function.embed import embed_texts, embedding_id
 from ..chatbot_function.search_client import get_search_client
+from ..chatbot_function.search_cache import bump_index_generation
 from ..chatbot_function.utils import clean_text
+from .chunker import Chunk, iter_chunks
+from .ingest_engine import IngestConfig, IngestionEngine
+from .metrics import IngestTrace
+
+
+# Upload batches are cut by serialized size (the service caps a request at 16 MB
+# and 1000 docs); failed keys are retried with backoff when the status allows it.
+UPLOAD_MAX_BATCH_BYTES = int(os.environ.get("SEARCH_UPLOAD_MAX_BATCH_BYTES", str(8 * 1024 * 1024)))
+UPLOAD_MAX_BATCH_DOCS = int(os.environ.get("SEARCH_UPLOAD_MAX_BATCH_DOCS", "1000"))
+UPLOAD_CONCURRENCY = int(os.environ.get("SEARCH_UPLOAD_CONCURRENCY", "1"))
+UPLOAD_RETRIES = 4
+UPLOAD_BACKOFF_SECONDS = 1.0
+_RETRYABLE_STATUS = {409, 422, 429, 503}
+
+
+def _size_batches(documents: Iterable[Dict], max_bytes: int, max_docs: int) -> Iterator[Tuple[List[Dict], int]]:
+    """(batch, serialized bytes) pairs."""
+    batch: List[Dict] = []
+    batch_bytes = 0
+    for doc in documents:
+        size = len(json.dumps(doc, ensure_ascii=False).encode("utf-8"))
+        if batch and (batch_bytes + size > max_bytes or len(batch) >= max_docs):
+            yield batch, batch_bytes
+            batch, batch_bytes = [], 0
+        batch.append(doc)
+        batch_bytes += size
+    if batch:
+        yield batch, batch_bytes
 
 
-def _get_encoder(encoding_name: str = "cl100k_base"):
-    return tiktoken.get_encoding(encoding_name)
-
-def _split_text_into_chunks(
-    text: str,
-    max_tokens: int = 300,
-    overlap: int = 60,
-    encoding_name: str = "cl100k_base",
-) -> List[str]:
-    
-    enc = _get_encoder(encoding_name)
-    tokens = enc.encode(text)
-    n = len(tokens)
-    if n == 0:
-        return []
-
-    chunks: List[str] = []
-    start = 0
-    step = max_tokens - overlap if max_tokens > overlap else max_tokens
-
-    while start < n:
-        end = min(start + max_tokens, n)
-        chunk = enc.decode(tokens[start:end]).strip()
-        if chunk:
-            chunks.append(chunk)
-        if end == n:
+def _upload_batch(client, batch: List[Dict], batch_bytes: int = 0, key_field: str = "id") -> Dict:
+    """Upload one batch; resend only the keys that failed with a retryable status."""
+    start = time.perf_counter()
+    pending = batch
+    retries = 0
+    failed: Dict[str, str] = {}
+    for attempt in range(UPLOAD_RETRIES + 1):
+        results = client.upload_documents(pending)
+        by_key = {doc[key_field]: doc for doc in pending}
+        retry = []
+        for r in results:
+            if r.succeeded:
+                failed.pop(r.key, None)
+                continue
+            failed[r.key] = f"{r.status_code}: {r.error_message}"
+            if r.status_code in _RETRYABLE_STATUS and r.key in by_key:
+                retry.append(by_key[r.key])
+        if not retry or attempt == UPLOAD_RETRIES:
             break
-        start += step
+        retries += 1
+        time.sleep(UPLOAD_BACKOFF_SECONDS * (2 ** attempt))
+        pending = retry
 
-    return chunks
+    return {
+        "docs": len(batch),
+        "bytes": batch_bytes,
+        "succeeded": len(batch) - len(failed),
+        "failed": failed,
+        "retries": retries,
+        "ms": round((time.perf_counter() - start) * 1000, 1),
+    }
 
-def upload_documents_to_search(documents: List[Dict]):
+
+def upload_documents_to_search(
+    documents: Iterable[Dict],
+    *,
+    max_batch_bytes: Optional[int] = None,
+    max_batch_docs: Optional[int] = None,
+    concurrency: Optional[int] = None,
+) -> List[Dict]:
+    """
+    Upload docs in batches sized by serialized bytes, up to `concurrency` batches
+    at a time. Returns per-batch stats (docs, bytes, succeeded, failed keys, retries, ms);
+    raises if any doc still failed after retries, so nothing is lost silently.
+    """
     client = get_search_client()
-    batch_size = 100
-    for i in range(0, len(documents), batch_size):
-        batch = documents[i : i + batch_size]
-        client.upload_documents(batch)
+    batches = _size_batches(
+        documents,
+        max_batch_bytes or UPLOAD_MAX_BATCH_BYTES,
+        max_batch_docs or UPLOAD_MAX_BATCH_DOCS,
+    )
+    workers = concurrency or UPLOAD_CONCURRENCY
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="search-upload") as pool:
+            stats = list(pool.map(lambda b: _upload_batch(client, *b), batches))
+    else:
+        stats = [_upload_batch(client, *b) for b in batches]
+
+    for i, batch in enumerate(stats, start=1):
+        logging.debug(
+            f"Upload batch {i}: {batch['succeeded']}/{batch['docs']} ok, "
+            f"{batch['retries']} retries, {batch['ms']} ms"
+        )
+    failed = {key: error for batch in stats for key, error in batch["failed"].items()}
+    if failed:
+        raise RuntimeError(f"{len(failed)} documents failed to upload: {dict(list(failed.items())[:5])}")
+    return stats
 
 
 def safe_id(value: str) -> str:
@@ -59,44 +129,247 @@ def safe_id(value: str) -> str:
 
 
 
-def process_and_index_text(text: str, filename: str, *, title: str = "", max_tokens_per_chunk: int = 300,
-    chunk_overlap: int = 60, encoding_name: str = "cl100k_base",):
+def content_hash(chunk: str) -> str:
+    """Hash of a chunk's exact text and the embedding deployment (and dimensions) that vectorize it."""
+    h = hashlib.sha256()
+    h.update((embedding_id or "").encode("utf-8"))
+    h.update(b"\0")
+    h.update(chunk.encode("utf-8"))
+    return h.hexdigest()
+
+
+def _chunk_docs(chunks: Iterable[Chunk], filename: str, file_id: str, title: str, created_at: str) -> Iterator[Dict]:
+    """Index documents for each chunk, without vectors (the embed stage adds contentVector)."""
+    for i, chunk in enumerate(chunks, start=1):
+        yield {
+            "id": f"{file_id}-chunk-{str(i).zfill(4)}",
+            "fileId": file_id,
+            "fileName": filename,
+            "title": title or file_id,
+            "chunk": chunk.text,
+            "chunkId": i,
+            # Character offsets of the chunk in the cleaned document text
+            "chunkStart": chunk.start,
+            "chunkEnd": chunk.end,
+            "contentHash": content_hash(chunk.text),
+            "createdAt": created_at,
+        }
+
+
+# ---- Incremental re-ingestion ----
+
+# Stored vectors are fetched this many docs at a time for chunks that moved
+_VECTOR_LOOKUP_BATCH = 100
+
+
+def _existing_chunks(client, file_id: str) -> Dict[str, Dict]:
+    """{doc id: {contentHash, chunkStart}} of the chunks already indexed for `file_id`."""
+    results = client.search(
+        search_text="*",
+        filter=f"fileId eq '{file_id}'",
+        select=["id", "contentHash", "chunkStart"],
+    )
+    return {r["id"]: {"contentHash": r.get("contentHash"), "chunkStart": r.get("chunkStart")} for r in results}
+
+
+def _stored_vectors(client, ids: List[str]) -> Dict[str, List[float]]:
+    results = client.search(
+        search_text="*",
+        filter=f"search.in(id, '{','.join(ids)}', ',')",
+        select=["id", "contentVector"],
+        top=len(ids),
+    )
+    return {r["id"]: r["contentVector"] for r in results if r.get("contentVector")}
+
+
+def _with_stored_vectors(client, moved: List[tuple], stats: Dict[str, int]) -> Iterator[Dict]:
+    """Attach the vector already stored under the chunk's old id (embed only if unavailable)."""
+    try:
+        vectors = _stored_vectors(client, [old_id for _, old_id in moved])
+    except HttpResponseError as e:
+        logging.warning(f"Stored vector lookup failed, re-embedding {len(moved)} chunks: {e}")
+        vectors = {}
+    for doc, old_id in moved:
+        vector = vectors.get(old_id)
+        if vector is not None:
+            doc["contentVector"] = vector
+            stats["reused"] += 1
+        yield doc
+
+
+def _changed_docs(client, docs: Iterable[Dict], existing: Dict[str, Dict],
+                  kept_ids: set, stats: Dict[str, int]) -> Iterator[Dict]:
+    """
+    Drop chunks already indexed with the same id, content hash and offset, reuse
+    stored vectors for content that only moved (other id or offset), and pass
+    the rest on for embedding. Ids of all current chunks are collected into `kept_ids`.
+    """
+    by_hash = {row["contentHash"]: doc_id for doc_id, row in existing.items() if row["contentHash"]}
+    moved: List[tuple] = []
+    for doc in docs:
+        kept_ids.add(doc["id"])
+        h = doc["contentHash"]
+        if existing.get(doc["id"]) == {"contentHash": h, "chunkStart": doc["chunkStart"]}:
+            stats["unchanged"] += 1
+            continue
+
+        old_id = by_hash.get(h)
+        if old_id is None:
+            yield doc
+            continue
+
+        moved.append((doc, old_id))
+        if len(moved) >= _VECTOR_LOOKUP_BATCH:
+            yield from _with_stored_vectors(client, moved, stats)
+            moved = []
+    if moved:
+        yield from _with_stored_vectors(client, moved, stats)
+
+
+def _delete_orphans(client, existing: Dict[str, Dict], kept_ids: set) -> int:
+    """Remove chunks of an older, longer version of the file."""
+    orphans = [{"id": doc_id} for doc_id in existing if doc_id not in kept_ids]
+    for i in range(0, len(orphans), 1000):
+        client.delete_documents(orphans[i : i + 1000])
+    return len(orphans)
 
-    cleaned = clean_text(text)
+
+class IncrementalUpdate:
+    """
+    Re-ingestion state of one file: the chunks already indexed for it, the ids
+    of the new version's chunks, and unchanged/reused counters.
+
+        update = IncrementalUpdate(client, file_id)
+        engine.run(update.changed(docs))   # only new/changed docs reach the engine
+        update.delete_orphans()             # after the new version is uploaded
+    """
+
+    def __init__(self, client, file_id: str):
+        self.client = client
+        self.file_id = file_id
+        try:
+            self.existing = _existing_chunks(client, file_id)
+        except HttpResponseError as e:
+            logging.warning(f"Existing chunk lookup failed for {file_id}, re-indexing all chunks: {e}")
+            self.existing = {}
+        self.kept_ids: set = set()
+        self.counts = {"unchanged": 0, "reused": 0}
+
+    def changed(self, docs: Iterable[Dict]) -> Iterator[Dict]:
+        return _changed_docs(self.client, docs, self.existing, self.kept_ids, self.counts)
+
+    def delete_orphans(self) -> int:
+        return _delete_orphans(self.client, self.existing, self.kept_ids)
+
+
+def document_id(filename: str) -> str:
+    base_name = filename.rsplit(".", 1)[0]   # remove extension
+    return safe_id(base_name)                # safe for Azure Search keys
+
+
+def document_chunks(text: str, filename: str, *, max_tokens_per_chunk: int = 300, overlap_sentences: int = 0,
+                    encoding_name: str = "cl100k_base", trace: Optional[IngestTrace] = None) -> Iterator[Dict]:
+    """
+    Clean and chunk one document into index docs without vectors (lazily; none if
+    no text). With a trace, records the "clean" and "chunk" stages.
+    """
+    with (trace.stage("clean", chars=len(text)) if trace else nullcontext({})) as fields:
+        cleaned = clean_text(text)
+        fields["chars_out"] = len(cleaned)
     if not cleaned:
-        return
+        return iter(())
 
-    chunks = _split_text_into_chunks(
+    chunks = iter_chunks(
         cleaned,
         max_tokens=max_tokens_per_chunk,
-        overlap=chunk_overlap,
+        overlap_sentences=overlap_sentences,
         encoding_name=encoding_name,
     )
-    if not chunks:
+
+    title = filename.rsplit(".", 1)[0]
+    created_at = datetime.utcnow().isoformat() + "Z"
+    docs = _chunk_docs(chunks, filename, document_id(filename), title, created_at)
+    # Chunking runs lazily inside the pipeline; only the time spent producing docs counts
+    return trace.timed_iter("chunk", docs, chars=len(cleaned)) if trace else docs
+
+
+def summary_counts(stats: Dict) -> Dict[str, int]:
+    """The counters of process_and_index_text() stats, without timings."""
+    return {key: value for key, value in stats.items() if not key.endswith("seconds")}
+
+
+def process_and_index_text(text: str, filename: str, *, title: str = "", max_tokens_per_chunk: int = 300,
+    overlap_sentences: int = 0, encoding_name: str = "cl100k_base", config: Optional[IngestConfig] = None,
+    trace: Optional[IngestTrace] = None,):
+    """
+    Clean, chunk, embed and upload one document through IngestionEngine: chunks
+    (sentence-aligned, see chunker.iter_chunks) stream through bounded queues to
+    concurrent batched embedding and an uploader that flushes as batches fill.
+
+    Re-ingesting is incremental: chunks whose contentHash is already indexed under
+    the same id are skipped, moved chunks reuse their stored vector, and chunk ids
+    the new version no longer has are deleted. Returns the stats (None if no text).
+
+    Stage timings and counts go to `trace` (see metrics.IngestTrace); without one,
+    a trace is created and finished here.
+    """
+    own_trace = trace is None
+    if own_trace:
+        trace = IngestTrace(filename)
+
+    docs = document_chunks(
+        text,
+        filename,
+        max_tokens_per_chunk=max_tokens_per_chunk,
+        overlap_sentences=overlap_sentences,
+        encoding_name=encoding_name,
+        trace=trace,
+    )
+    first = next(docs, None)
+    if first is None:
+        if own_trace:
+            trace.finish(status="empty")
         return
+    docs = itertools.chain([first], docs)
 
-    docs: List[Dict] = []
+    # Only new/changed chunks are embedded and uploaded; unchanged ones are skipped
+    with trace.stage("lookup") as fields:
+        update = IncrementalUpdate(get_search_client(), document_id(filename))
+        fields["existing"] = len(update.existing)
 
-    base_name = filename.rsplit(".", 1)[0]   # remove extension
-    file_id = safe_id(base_name)             # safe for Azure Search keys
-    title = base_name                       
+    embed_stats: Dict[str, int] = {}
+    upload_stats: List[Dict] = []
+    lock = threading.Lock()
 
-    created_at = datetime.utcnow().isoformat() + "Z"
+    def embed(texts):
+        call: Dict[str, int] = {}
+        vectors = embed_texts(texts, stats=call)
+        with lock:
+            for key, value in call.items():
+                embed_stats[key] = embed_stats.get(key, 0) + value
+        return vectors
 
-    for i, chunk in enumerate(chunks, start=1):
-        emb = embed_text(chunk)
-        print(f"[DEBUG] {filename}-chunk-{i} embedding length: {len(emb)}")
+    def upload(batch):
+        upload_stats.extend(upload_documents_to_search(batch))
 
-        doc = {
-            "id": f"{file_id}-chunk-{str(i).zfill(4)}",
-            "fileId": file_id,
-            "fileName": filename,
-            "title": title or file_id,
-            "chunk": chunk,
-            "chunkId": i,
-            "contentVector": emb,
-            "createdAt": created_at,
-        }
-        docs.append(doc)
+    engine = IngestionEngine(embed=embed, upload=upload, config=config)
+    stats = engine.run(update.changed(docs))
+    stats.update(update.counts)
+
+    # Embed/upload seconds are busy time summed over threads; "pipeline" is wall time
+    trace.record("embed", stats["embed_seconds"], chunks=stats["embedded"], calls=stats["embed_calls"],
+                 workers=engine.config.embed_workers, **embed_stats)
+    trace.record("upload", stats["upload_seconds"], chunks=stats["uploaded"], batches=len(upload_stats),
+                 bytes=sum(b["bytes"] for b in upload_stats), retries=sum(b["retries"] for b in upload_stats))
+    trace.record("pipeline", stats["seconds"], chunks=stats["chunks"], unchanged=update.counts["unchanged"],
+                 reused=update.counts["reused"])
+
+    with trace.stage("delete") as fields:
+        stats["deleted"] = fields["deleted"] = update.delete_orphans()
 
-    upload_documents_to_search(docs)
+    if stats["uploaded"] or stats["deleted"]:
+        # New content is searchable: drop cached results served from the old index
+        bump_index_generation()
+    if own_trace:
+        trace.finish(status="indexed", **summary_counts(stats))
+    return stats
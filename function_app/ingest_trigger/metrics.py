@@ -0,0 +1,140 @@
+# function_app/ingest_trigger/metrics.py
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class MetricsSink(ABC):
+    """Receives ingestion measurements as (event name, fields) pairs."""
+
+    @abstractmethod
+    def emit(self, event: str, fields: Dict[str, Any]) -> None:
+        ...
+
+
+class LoggingSink(MetricsSink):
+    """Default sink: one structured log line per event ("ingest.embed {...json...}")."""
+
+    def __init__(self, logger: Optional[logging.Logger] = None, level: int = logging.INFO):
+        self.logger = logger or logging.getLogger("ingest.metrics")
+        self.level = level
+
+    def emit(self, event: str, fields: Dict[str, Any]) -> None:
+        self.logger.log(self.level, "%s %s", event, json.dumps(fields, sort_keys=True, default=str))
+
+
+class MemorySink(MetricsSink):
+    """Keeps events in memory for inspection (scripts/bench_ingest_pipeline.py checks the stage events with it)."""
+
+    def __init__(self):
+        self.events: List[Tuple[str, Dict[str, Any]]] = []
+        self._lock = threading.Lock()
+
+    def emit(self, event: str, fields: Dict[str, Any]) -> None:
+        with self._lock:
+            self.events.append((event, dict(fields)))
+
+    def find(self, event: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [fields for name, fields in self.events if name == event]
+
+    def clear(self) -> None:
+        with self._lock:
+            self.events.clear()
+
+
+_sink: MetricsSink = LoggingSink()
+
+
+def get_metrics_sink() -> MetricsSink:
+    return _sink
+
+
+def set_metrics_sink(sink: Optional[MetricsSink]) -> None:
+    """Swap the process-wide sink (None restores the logging default)."""
+    global _sink
+    _sink = sink if sink is not None else LoggingSink()
+
+
+# Counted fields that also get a per-second rate on their stage event
+_RATE_FIELDS = ("bytes", "chars", "chunks", "tokens")
+
+
+class IngestTrace:
+    """
+    Per-document stage timings and counters. Each stage is emitted as
+    "ingest.<stage>" when it ends (seconds, counts, and <count>_per_s rates);
+    finish() emits an "ingest.document" summary with the time of every stage.
+
+        trace = IngestTrace(filename)
+        with trace.stage("extract", bytes=len(data)) as fields:
+            text = ...
+            fields["chars"] = len(text)
+        trace.finish(status="ok")
+    """
+
+    def __init__(self, filename: str, sink: Optional[MetricsSink] = None):
+        self.filename = filename
+        self.sink = sink
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str, **fields) -> Iterator[Dict[str, Any]]:
+        start = time.perf_counter()
+        try:
+            yield fields
+        finally:
+            self.record(name, time.perf_counter() - start, **fields)
+
+    def timed_iter(self, name: str, items: Iterable, **fields) -> Iterator:
+        """
+        Yield `items`, recording the time spent producing them (not the
+        consumer's time) and their count as stage `name` once exhausted.
+        """
+        it = iter(items)
+        seconds, count = 0.0, 0
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                seconds += time.perf_counter() - start
+                break
+            seconds += time.perf_counter() - start
+            count += 1
+            yield item
+        self.record(name, seconds, chunks=count, **fields)
+
+    def record(self, name: str, seconds: float, **fields) -> Dict[str, Any]:
+        entry = {"file": self.filename, "seconds": round(seconds, 3), **fields}
+        for field in _RATE_FIELDS:
+            if fields.get(field) and seconds > 0:
+                entry[f"{field}_per_s"] = round(fields[field] / seconds, 1)
+        self.stages[name] = entry
+        self._emit(f"ingest.{name}", entry)
+        return entry
+
+    def finish(self, **fields) -> Dict[str, Any]:
+        summary = {
+            "file": self.filename,
+            "seconds": round(time.perf_counter() - self._start, 3),
+            **{f"{name}_seconds": entry["seconds"] for name, entry in self.stages.items()},
+            **fields,
+        }
+        self._emit("ingest.document", summary)
+        return summary
+
+    def _emit(self, event: str, fields: Dict[str, Any]) -> None:
+        # Metrics must never fail an ingestion
+        try:
+            (self.sink or get_metrics_sink()).emit(event, fields)
+        except Exception:
+            logging.exception(f"Metrics sink failed on {event}")
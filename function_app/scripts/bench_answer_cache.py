@@ -0,0 +1,122 @@
+"""
+Benchmark: chat turns with and without the semantic answer cache (stubbed backends).
+
+A stream of questions is drawn from a small pool of standalone questions about
+the stories, asked in slightly different wordings (case, punctuation, filler
+words) as the first turn of a session, mixed with follow-ups in sessions with
+history that must never be served from the cache. Embeddings are hashed bag-of-words vectors, so rewordings land close
+together; chat, search and Cosmos calls sleep for a configurable latency.
+Reports the hit rate, p50 latency of hits and misses, chat calls avoided and the
+latency the cache reports as saved.
+
+Usage:
+    python function_app/scripts/bench_answer_cache.py [--turns 200] [--threshold 0.95] [--chat-ms 600]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import re
+import statistics
+from types import SimpleNamespace
+
+from bench_support import use_stub_env
+
+use_stub_env()
+os.environ["ANSWER_CACHE_ENABLED"] = "true"
+
+import numpy as np  # noqa: E402
+
+from bench_async_pipeline import StubOpenAI, StubSearch, StubSession  # noqa: E402
+from function_app.chatbot_function import pipeline  # noqa: E402
+from function_app.chatbot_function.answer_cache import answer_cache  # noqa: E402
+
+QUESTIONS = [
+    "Who is the wolf in Little Red Riding Hood",
+    "What does the fox teach the Little Prince",
+    "How does Cinderella lose her glass slipper",
+    "Why does Peter Pan refuse to grow up",
+    "Where does Alice follow the White Rabbit",
+    "What happens to the Tin Man in the storm",
+    "Who helps Hansel and Gretel escape",
+    "Describe the teacher in the village story",
+]
+FILLERS = ["", "please", "tell me", "exactly", "in the story"]
+FOLLOW_UPS = ["what did she do next?", "and then what happened to him?", "tell me more about that"]
+
+
+def _embed(text: str):
+    v = np.zeros(256, dtype=np.float32)
+    for word in re.findall(r"\w+", text.lower()):
+        h = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=4).digest(), "little")
+        v[h % 256] += 1.0 if h & 1 << 20 else -1.0
+    return v.tolist()
+
+
+class _Embeddings:
+    async def create(self, model, input, **kwargs):
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=_embed(t)) for i, t in enumerate(input)])
+
+
+def _question(rng: random.Random) -> str:
+    q = rng.choice(QUESTIONS)
+    filler = rng.choice(FILLERS)
+    q = f"{q} {filler}".strip() if rng.random() < 0.5 else f"{filler} {q}".strip()
+    return (q.lower() if rng.random() < 0.3 else q) + rng.choice(["?", "", " ?"])
+
+
+async def _run(args):
+    client = StubOpenAI(args.chat_ms / 1000, 0)
+    client.embeddings = _Embeddings()
+    chat_calls = {"n": 0}
+    create = client.chat.completions.create
+
+    async def counted(**kwargs):
+        chat_calls["n"] += 1
+        return await create(**kwargs)
+
+    client.chat.completions.create = counted
+    search_client = StubSearch(args.search_ms / 1000)
+    rng = random.Random(5)
+    deployment = os.environ["AZURE_OPENAI_DEPLOYMENT_NAME"]
+
+    samples = {"hit": [], "miss": [], "skipped": []}
+    for _ in range(args.turns):
+        if rng.random() < args.follow_ups:
+            session, question = StubSession("s", 2, args.cosmos_ms / 1000), rng.choice(FOLLOW_UPS)
+        else:
+            session, question = StubSession("s", 0, args.cosmos_ms / 1000), _question(rng)
+        start = asyncio.get_running_loop().time()
+        reply, _, diagnostics = await pipeline.run_turn(
+            session, question, client, deployment, allow_image_tool=False, search_client=search_client
+        )
+        samples[diagnostics["answer_cache"]].append((asyncio.get_running_loop().time() - start) * 1000)
+
+    stats = answer_cache.stats()
+    print(f"{args.turns} turns, threshold {answer_cache.threshold}, {len(QUESTIONS)} distinct questions, "
+          f"{args.follow_ups:.0%} follow-ups")
+    for status, ms in samples.items():
+        if ms:
+            print(f"{status:<8} turns {len(ms):4d}  p50 {statistics.median(ms):7.1f} ms")
+    print(f"hit rate {stats['hit_rate']:.2f} (of standalone turns)  chat calls {chat_calls['n']} "
+          f"for {args.turns} turns  saved {stats['saved_ms'] / 1000:.1f} s (avg {stats['avg_saved_ms']:.0f} ms per hit)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--threshold", type=float, default=None, help="default: ANSWER_CACHE_THRESHOLD")
+    parser.add_argument("--follow-ups", type=float, default=0.2, help="share of history-dependent turns")
+    parser.add_argument("--chat-ms", type=float, default=600.0)
+    parser.add_argument("--search-ms", type=float, default=120.0)
+    parser.add_argument("--cosmos-ms", type=float, default=15.0)
+    args = parser.parse_args()
+    if args.threshold is not None:
+        answer_cache.threshold = args.threshold
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
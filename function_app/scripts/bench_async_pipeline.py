@@ -0,0 +1,160 @@
+"""
+Benchmark: sequential vs async chat-turn pipeline against stubbed backends.
+
+Every backend call (chat completion, embedding, search, Cosmos save) is replaced
+by an asyncio.sleep of a configurable latency, so the numbers show the
+critical-path reduction (summarization moved off the request path), not model speed.
+
+Usage:
+    python function_app/scripts/bench_async_pipeline.py [--turns 20] [--chat-ms 600]
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import time
+from types import SimpleNamespace
+
+from bench_support import use_stub_env
+
+use_stub_env()
+
+from function_app.chatbot_function import pipeline  # noqa: E402
+from function_app.chatbot_function.embed import embedding_cache  # noqa: E402
+from function_app.chatbot_function.search_cache import search_cache  # noqa: E402
+from function_app.chatbot_function.query_rewrite import arewrite_query  # noqa: E402
+from function_app.chatbot_function.retrieval import asearch_top_k_hybrid  # noqa: E402
+
+
+class _StubCompletions:
+    def __init__(self, latency):
+        self.latency = latency
+
+    async def create(self, **kwargs):
+        await asyncio.sleep(self.latency)
+        message = SimpleNamespace(content="stub reply", tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class _StubEmbeddings:
+    def __init__(self, latency):
+        self.latency = latency
+
+    async def create(self, model, input, **kwargs):
+        await asyncio.sleep(self.latency)
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[0.0] * 1536) for _ in input])
+
+
+class StubOpenAI:
+    def __init__(self, chat_latency, embed_latency):
+        self.chat = SimpleNamespace(completions=_StubCompletions(chat_latency))
+        self.embeddings = _StubEmbeddings(embed_latency)
+
+
+class _StubResults:
+    def __init__(self, docs):
+        self._docs = list(docs)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self._docs:
+            raise StopAsyncIteration
+        return self._docs.pop(0)
+
+
+class StubSearch:
+    def __init__(self, latency):
+        self.latency = latency
+
+    async def search(self, **kwargs):
+        await asyncio.sleep(self.latency)
+        return _StubResults(
+            {"title": "Story", "chunk": f"passage {i}", "chunkId": i, "fileName": "story.txt"}
+            for i in range(kwargs.get("top", 5))
+        )
+
+
+class StubSession:
+    def __init__(self, session_id, turns, latency):
+        self.session_id = session_id
+        self.latency = latency
+        self.summary = ""
+        self.summary_upto = 0
+        self.messages = []
+        for i in range(turns):
+            self.messages.append({"role": "user", "content": f"question {i}"})
+            self.messages.append({"role": "assistant", "content": f"answer {i}"})
+
+    async def save(self, if_match=False):
+        await asyncio.sleep(self.latency)
+
+
+async def sequential_turn(session, user_input, client, deployment, search_client):
+    """The pre-async ordering: every call waits for the previous one."""
+    conversation = [{"role": "system", "content": "system"}] + session.messages
+    query = await arewrite_query(client, deployment, conversation, user_input)
+    await asearch_top_k_hybrid(query, k=5, search_client=search_client, openai_client=client)
+    conversation = conversation + [{"role": "user", "content": user_input}]
+    if len(conversation) > 11:
+        # summarize() of the oldest messages, once the history is long enough
+        await client.chat.completions.create(model=deployment, messages=conversation[1:6])
+    await client.chat.completions.create(model=deployment, messages=conversation)
+    await session.save()
+
+
+async def _time(factory, turns):
+    samples = []
+    for _ in range(turns):
+        # Measure cold turns: no cached embeddings or search results
+        embedding_cache.clear()
+        search_cache.bump_generation()
+        start = time.perf_counter()
+        await factory()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=10, help="turns per variant (median reported)")
+    parser.add_argument("--history", type=int, default=6, help="prior user/assistant pairs in the session")
+    parser.add_argument("--chat-ms", type=float, default=600.0)
+    parser.add_argument("--embed-ms", type=float, default=80.0)
+    parser.add_argument("--search-ms", type=float, default=120.0)
+    parser.add_argument("--cosmos-ms", type=float, default=15.0)
+    args = parser.parse_args()
+
+    client = StubOpenAI(args.chat_ms / 1000, args.embed_ms / 1000)
+    search_client = StubSearch(args.search_ms / 1000)
+    deployment = os.environ["AZURE_OPENAI_DEPLOYMENT_NAME"]
+
+    def new_session():
+        return StubSession("bench", args.history, args.cosmos_ms / 1000)
+
+    # A follow-up that needs a rewrite; numbered so the rewrite cache never hits
+    questions = (f"what happened next in part {i}?" for i in itertools.count())
+
+    seq = await _time(
+        lambda: sequential_turn(new_session(), next(questions), client, deployment, search_client),
+        args.turns,
+    )
+    conc = await _time(
+        lambda: pipeline.run_turn(
+            new_session(), next(questions), client, deployment,
+            allow_image_tool=False, search_client=search_client,
+        ),
+        args.turns,
+    )
+
+    print(f"history pairs: {args.history}  turns: {args.turns}")
+    print(f"sequential p50: {seq * 1000:8.1f} ms")
+    print(f"async      p50: {conc * 1000:8.1f} ms")
+    print(f"saved         : {(seq - conc) * 1000:8.1f} ms ({(1 - conc / seq) * 100:.0f}%)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
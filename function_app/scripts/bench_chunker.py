@@ -0,0 +1,93 @@
+"""
+Micro-benchmark: fixed token windows vs the streaming sentence-aware chunker.
+
+Generates a multi-megabyte story-like text (paragraphs of sentences) and chunks
+it with the previous _split_text_into_chunks() logic (whole-document encode,
+300/60 token windows, one decode per window) and with chunker.iter_chunks().
+Reports throughput, tracemalloc peak, chunk count, mean tokens per chunk and
+the share of chunks that end on a sentence boundary.
+
+Usage:
+    python function_app/scripts/bench_chunker.py [--mb 4] [--max-tokens 300]
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+
+import tiktoken
+
+from bench_support import use_stub_env
+
+use_stub_env()
+
+from function_app.ingest_trigger.chunker import iter_chunks  # noqa: E402
+
+
+def legacy_chunks(text: str, max_tokens: int = 300, overlap: int = 60, encoding_name: str = "cl100k_base"):
+    """The replaced _split_text_into_chunks(), kept here as the baseline."""
+    enc = tiktoken.get_encoding(encoding_name)
+    tokens = enc.encode(text)
+    n = len(tokens)
+    chunks = []
+    start = 0
+    step = max_tokens - overlap if max_tokens > overlap else max_tokens
+    while start < n:
+        end = min(start + max_tokens, n)
+        chunk = enc.decode(tokens[start:end]).strip()
+        if chunk:
+            chunks.append(chunk)
+        if end == n:
+            break
+        start += step
+    return chunks
+
+
+def _text(mb: float) -> str:
+    rng = random.Random(11)
+    vocab = [f"word{i}" for i in range(4000)] + ["the", "a", "and", "of", "to", "in"]
+    paragraphs, size = [], 0
+    while size < mb * 1024 * 1024:
+        sentences = []
+        for _ in range(rng.randint(2, 9)):
+            words = [rng.choice(vocab) for _ in range(rng.randint(6, 30))]
+            sentences.append(" ".join(words).capitalize() + rng.choice([".", ".", ".", "!", "?"]))
+        paragraphs.append(" ".join(sentences))
+        size += len(paragraphs[-1]) + 2
+    return "\n\n".join(paragraphs)
+
+
+def _measure(name, fn, text, enc):
+    tracemalloc.start()
+    start = time.perf_counter()
+    chunks = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    sample = chunks[:: max(1, len(chunks) // 500)]
+    mean_tokens = sum(len(enc.encode(c)) for c in sample) / len(sample)
+    aligned = sum(c.rstrip()[-1:] in ".!?" for c in chunks) / len(chunks)
+    mb = len(text) / 1024 / 1024
+    print(f"{name:<10} {mb / elapsed:6.2f} MiB/s  {elapsed:6.2f} s  peak {peak / 1024 / 1024:7.1f} MiB  "
+          f"chunks {len(chunks):6d}  mean tokens {mean_tokens:5.0f}  sentence-aligned {aligned:5.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mb", type=float, default=4.0)
+    parser.add_argument("--max-tokens", type=int, default=300)
+    args = parser.parse_args()
+
+    text = _text(args.mb)
+    enc = tiktoken.get_encoding("cl100k_base")
+    print(f"input: {len(text) / 1024 / 1024:.1f} MiB")
+
+    _measure("windows", lambda: legacy_chunks(text, args.max_tokens), text, enc)
+    # The chunker is a generator; only the chunk texts are kept, as a consumer would
+    _measure("sentences", lambda: [c.text for c in iter_chunks(text, args.max_tokens)], text, enc)
+
+
+if __name__ == "__main__":
+    main()
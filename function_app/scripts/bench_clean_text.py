@@ -0,0 +1,138 @@
+"""
+Micro-benchmark + parity check: the previous clean_text() vs utils.clean_text().
+
+Parity: both implementations must return identical strings for hand-picked
+edge cases (CRLF/CR, tab and form-feed runs, control characters next to
+newlines, Unicode word characters and whitespace) and for random strings
+drawn from an alphabet heavy in those characters. Any mismatch is printed
+and the script exits non-zero.
+
+Benchmark: OCR-like text (hard-wrapped lines, CRLF, runs of spaces and tabs,
+blank-line runs, stray control characters) at several sizes.
+
+Usage:
+    python function_app/scripts/bench_clean_text.py [--sizes 0.1,1,8] [--cases 20000]
+"""
+
+import argparse
+import random
+import re
+import sys
+import time
+
+from bench_support import use_stub_env
+
+use_stub_env()
+
+from function_app.chatbot_function.utils import clean_text  # noqa: E402
+
+
+def legacy_clean_text(text: str) -> str:
+    """The replaced clean_text(), kept here as the reference."""
+    if not text:
+        return ""
+    t = text.replace("\r\n", "\n").replace("\r", "\n")
+    t = re.sub(r"[ \t\f\v]+", " ", t)
+    t = re.sub(r"(?<=\w)\n(?=\w)", " ", t)
+    t = re.sub(r"\n{3,}", "\n\n", t)
+    t = "".join(ch for ch in t if ch == "\n" or ch == "\t" or ord(ch) >= 32)
+    return t.strip()
+
+
+EDGE_CASES = [
+    "",
+    " ",
+    "\n\n\n",
+    "a\r\nb\rc\n\rd",
+    "a \t\f\v b\t\tc",
+    "word\nword",
+    "word \nword",
+    "end.\nStart",
+    "a\n\n\n\n\nb",
+    "a\n\x00\n\nb",
+    "a\x00\nb",
+    "a\n\x01b",
+    "a\x1f\x1e\x1c \x1d",
+    "\x1fpadded\x1f",
+    "\x7f\x85\xa0kept ",
+    "é\nß",
+    "日本\n語",
+    "x　\ny",
+    "tab\there\x0b\x0cdone",
+    "\r\r\r\rx\r\n\r\ny",
+    "\x00\x01\x02",
+]
+
+_ALPHABET = "ab_é日 \t\f\v\r\n\x00\x01\x1f\x7f\xa0\u2028\u3000 .,"
+
+
+def _random_cases(n: int, rng: random.Random):
+    for _ in range(n):
+        yield "".join(rng.choice(_ALPHABET) for _ in range(rng.randint(0, 40)))
+
+
+def check_parity(cases: int) -> int:
+    rng = random.Random(5)
+    failures = 0
+    for text in list(EDGE_CASES) + list(_random_cases(cases, rng)):
+        expected, actual = legacy_clean_text(text), clean_text(text)
+        if expected != actual:
+            failures += 1
+            if failures <= 10:
+                print(f"MISMATCH input={text!r}\n  legacy={expected!r}\n  new   ={actual!r}")
+    print(f"parity: {len(EDGE_CASES) + cases} cases, {failures} mismatches")
+    return failures
+
+
+def _ocr_text(mb: float, rng: random.Random) -> str:
+    vocab = [f"word{i}" for i in range(3000)] + ["the", "a", "of", "and", "Überall", "naïve"]
+    parts, size = [], 0
+    while size < mb * 1024 * 1024:
+        line = " ".join(rng.choice(vocab) for _ in range(rng.randint(5, 14)))
+        r = rng.random()
+        if r < 0.05:
+            line = line.replace(" ", "  \t", 2)
+        elif r < 0.07:
+            line += "\x0c"
+        elif r < 0.08:
+            line = "\x00" + line
+        parts.append(line)
+        parts.append(rng.choice(["\r\n", "\r\n", "\r\n", ".\r\n\r\n", "\r\n\r\n\r\n\r\n"]))
+        size += len(line) + 2
+    return "".join(parts)
+
+
+def _time(fn, text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="0.1,1,8", help="document sizes in MiB, comma-separated")
+    parser.add_argument("--cases", type=int, default=20000, help="random parity cases")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    failures = check_parity(args.cases)
+
+    rng = random.Random(7)
+    for mb in (float(s) for s in args.sizes.split(",")):
+        text = _ocr_text(mb, rng)
+        same = legacy_clean_text(text) == clean_text(text)
+        legacy = _time(legacy_clean_text, text, args.repeat)
+        new = _time(clean_text, text, args.repeat)
+        size = len(text) / 1024 / 1024
+        print(f"{size:6.1f} MiB  legacy {legacy * 1000:8.1f} ms ({size / legacy:6.1f} MiB/s)  "
+              f"new {new * 1000:8.1f} ms ({size / new:6.1f} MiB/s)  x{legacy / new:4.1f}  identical: {same}")
+        failures += not same
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
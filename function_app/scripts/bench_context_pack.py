@@ -0,0 +1,113 @@
+"""
+Benchmark: unbudgeted `title: content` lines vs the token-budgeted context packer.
+
+Synthetic stories are chunked with the ingestion chunker (one sentence of
+overlap, so adjacent chunks repeat text) and each query "retrieves" k chunks:
+a run of neighbouring chunks from one story plus chunks of other stories, with
+chunk lengths varying like real retrieval results. Reports the Sources block
+size in tokens (mean / p95 / max), how many titles repeat, the overlap removed
+and the time to build the block.
+
+Usage:
+    python function_app/scripts/bench_context_pack.py [--queries 500] [--k 5] [--budget 1200]
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from bench_support import use_stub_env
+
+use_stub_env()
+
+from function_app.chatbot_function.context_pack import pack_sources  # noqa: E402
+from function_app.chatbot_function.tokens import get_encoding  # noqa: E402
+from function_app.ingest_trigger.chunker import iter_chunks  # noqa: E402
+
+WORDS = [f"w{i}" for i in range(3000)]
+
+
+def _story(rng: random.Random) -> str:
+    paragraphs = []
+    for _ in range(rng.randint(8, 30)):
+        sentences = [
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 40))).capitalize() + "."
+            for _ in range(rng.randint(2, 8))
+        ]
+        paragraphs.append(" ".join(sentences))
+    return "\n\n".join(paragraphs)
+
+
+def _passage(story_id: int, chunk_id: int, text: str):
+    title = f"Story {story_id}"
+    return {"title": title, "content": text, "raw": {"fileId": f"s{story_id}", "chunkId": chunk_id, "title": title}}
+
+
+def _legacy(passages) -> str:
+    return "\n".join(f'{p["title"]}: {p["content"]}' for p in passages)
+
+
+def _results(stories, k: int, rng: random.Random):
+    main = rng.randrange(len(stories))
+    chunks = stories[main]
+    run = min(len(chunks), rng.randint(1, 3))
+    first = rng.randrange(len(chunks) - run + 1)
+    hits = [_passage(main, c, chunks[c]) for c in range(first, first + run)]
+    while len(hits) < k:
+        other = rng.randrange(len(stories))
+        c = rng.randrange(len(stories[other]))
+        hits.append(_passage(other, c, stories[other][c]))
+    rng.shuffle(hits)
+    return hits
+
+
+def _summary(values) -> str:
+    values = sorted(values)
+    return f"mean {statistics.mean(values):7.1f}  p95 {values[int(len(values) * 0.95) - 1]:5d}  max {values[-1]:5d}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--stories", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--budget", type=int, default=1200)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    stories = [
+        [c.text for c in iter_chunks(_story(rng), 300, overlap_sentences=1)]
+        for _ in range(args.stories)
+    ]
+    results = [_results(stories, args.k, rng) for _ in range(args.queries)]
+    enc = get_encoding("gpt-4")
+
+    start = time.perf_counter()
+    legacy = [_legacy(r) for r in results]
+    legacy_ms = (time.perf_counter() - start) * 1000 / len(results)
+    legacy_tokens = [len(enc.encode(text)) for text in legacy]
+    repeated = statistics.mean(len(r) - len({p["title"] for p in r}) for r in results)
+
+    stats = []
+    start = time.perf_counter()
+    for r in results:
+        stats.append({})
+        pack_sources(r, args.budget, "gpt-4", stats[-1])
+    packed_ms = (time.perf_counter() - start) * 1000 / len(results)
+
+    def avg(field):
+        return statistics.mean(s[field] for s in stats)
+
+    print(f"{args.queries} queries, k={args.k}, budget={args.budget} tokens")
+    print(f"unbudgeted  tokens {_summary(legacy_tokens)}  repeated titles {repeated:4.2f}  "
+          f"build {legacy_ms:6.3f} ms (no token count)")
+    print(f"packed      tokens {_summary([s['source_tokens'] for s in stats])}  repeated titles 0.00  "
+          f"build {packed_ms:6.3f} ms")
+    print(f"            merged chunks {avg('source_merged'):4.2f}  overlap stripped {avg('source_overlap_chars'):6.1f} chars  "
+          f"truncated {avg('source_truncated'):4.2f}  dropped {avg('source_dropped'):4.2f}  "
+          f"over budget {sum(s['source_tokens'] > args.budget for s in stats)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Micro-benchmark: Cosmos HTTP calls per chat turn.
+
+Counts every request that reaches the azure-core transport, using a stub
+transport that answers with canned JSON (no account needed). Compares the old
+per-request setup (new CosmosClient + create_database_if_not_exists +
+create_container_if_not_exists + read + upsert) with the shared handles in
+chatbot_function.cosmos_session_manager (sync and async).
+
+Usage:
+    python function_app/scripts/bench_cosmos_calls.py [--turns 20]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+from collections import Counter
+
+from azure.core.pipeline.transport import (
+    AsyncHttpResponse,
+    AsyncHttpTransport,
+    HttpResponse,
+    HttpTransport,
+)
+from azure.cosmos import CosmosClient, PartitionKey
+
+from bench_support import use_stub_env
+
+use_stub_env()
+
+from function_app.chatbot_function import cosmos_session_manager as csm  # noqa: E402
+
+_CANNED = {
+    "id": "stub",
+    "_rid": "stub",
+    "_self": "stub",
+    "writableLocations": [],
+    "readableLocations": [],
+    "userConsistencyPolicy": {"defaultConsistencyLevel": "Session"},
+    "partitionKey": {"paths": ["/session_id"], "kind": "Hash"},
+    "messages": [{"role": "user", "content": "hi"}],
+}
+
+
+def _kind(method: str, url: str) -> str:
+    path = url.split(".com:443", 1)[-1].rstrip("/")
+    if "/docs" in path:
+        return f"{method} item"
+    if "/colls" in path:
+        return f"{method} container"
+    if "/dbs" in path:
+        return f"{method} database"
+    return f"{method} account"
+
+
+class _StubResponse(HttpResponse):
+    def __init__(self, request):
+        super().__init__(request, None)
+        self.status_code = 200
+        self.reason = "OK"
+        self.headers = {"content-type": "application/json"}
+        self._body = json.dumps(_CANNED).encode("utf-8")
+
+    def body(self):
+        return self._body
+
+
+class _AsyncStubResponse(AsyncHttpResponse):
+    def __init__(self, request):
+        super().__init__(request, None)
+        self.status_code = 200
+        self.reason = "OK"
+        self.headers = {"content-type": "application/json"}
+        self._body = json.dumps(_CANNED).encode("utf-8")
+
+    def body(self):
+        return self._body
+
+    async def load_body(self):
+        pass
+
+
+class CountingTransport(HttpTransport):
+    def __init__(self, counter: Counter):
+        self.counter = counter
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send(self, request, **kwargs):
+        self.counter[_kind(request.method, request.url)] += 1
+        return _StubResponse(request)
+
+
+class AsyncCountingTransport(AsyncHttpTransport):
+    def __init__(self, counter: Counter):
+        self.counter = counter
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def send(self, request, **kwargs):
+        self.counter[_kind(request.method, request.url)] += 1
+        return _AsyncStubResponse(request)
+
+
+def legacy_turn(counter: Counter, session_id: str):
+    """What CosmosSessionManager.__init__ + save() did per request before."""
+    client = CosmosClient(os.environ["COSMOS_URI"], credential=os.environ["COSMOS_KEY"],
+                          transport=CountingTransport(counter))
+    db = client.create_database_if_not_exists(id="ChatDB")
+    container = db.create_container_if_not_exists(id="Sessions", partition_key=PartitionKey(path="/session_id"))
+    container.read_item(item=session_id, partition_key=session_id)
+    container.upsert_item({"id": session_id, "session_id": session_id, "messages": []})
+
+
+def shared_turn(session_id: str):
+    session = csm.CosmosSessionManager(session_id)
+    session.save()
+
+
+async def async_shared_turn(session_id: str):
+    session = await csm.AsyncCosmosSessionManager.open(session_id)
+    await session.save()
+
+
+def _report(name, counter: Counter, first: int, turns: int):
+    total = sum(counter.values())
+    steady = (total - first) / max(turns - 1, 1)
+    detail = ", ".join(f"{k}={v}" for k, v in sorted(counter.items()))
+    print(f"{name:<14} first turn: {first:3d}  steady per turn: {steady:5.2f}  total: {total:4d}  ({detail})")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=20)
+    args = parser.parse_args()
+
+    legacy = Counter()
+    legacy_turn(legacy, "s0")
+    first = sum(legacy.values())
+    for i in range(1, args.turns):
+        legacy_turn(legacy, f"s{i}")
+    _report("legacy", legacy, first, args.turns)
+
+    shared = Counter()
+    csm.get_cosmos_client(transport=CountingTransport(shared))
+    shared_turn("s0")
+    first = sum(shared.values())
+    for i in range(1, args.turns):
+        shared_turn(f"s{i}")
+    _report("shared sync", shared, first, args.turns)
+
+    shared_async = Counter()
+    csm.get_async_cosmos_client(transport=AsyncCountingTransport(shared_async))
+    await async_shared_turn("s0")
+    first = sum(shared_async.values())
+    for i in range(1, args.turns):
+        await async_shared_turn(f"s{i}")
+    _report("shared async", shared_async, first, args.turns)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,147 @@
+"""
+Benchmark: plain top-k vs over-fetch + adjacency dedupe + MMR (RETRIEVAL_DIVERSIFY).
+
+Indexes synthetic stories into the in-process search backend, chunked with
+overlapping sentence windows (as the ingestion chunker's neighbours overlap in
+content), several stories per topic. Embeddings are hashed bag-of-words
+vectors from a stub client, so similarity follows word overlap. For each query
+both modes run through asearch_top_k_hybrid() and the script reports the
+source tokens sent to the prompt (packed as the pipeline does), distinct
+stories and adjacent-chunk pairs in the k results, mean query similarity of
+the results, and latency.
+
+Usage:
+    python function_app/scripts/bench_diversify.py [--stories 300] [--queries 200] [--k 5] [--candidates 30]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import statistics
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from bench_support import use_stub_env
+
+use_stub_env()
+os.environ["SEARCH_CACHE_TTL_SECONDS"] = "0"
+os.environ["RETRIEVAL_MMR_USE_VECTORS"] = "true"  # the in-process index returns contentVector
+
+from function_app.chatbot_function import diversify, retrieval  # noqa: E402
+from function_app.chatbot_function.local_search import AsyncLocalSearchClient, LocalSearchIndex  # noqa: E402
+
+DIM = 384
+COMMON = [f"common{i}" for i in range(400)]
+
+
+def _embed(text: str) -> list:
+    v = np.zeros(DIM, dtype=np.float32)
+    for word in text.lower().split():
+        h = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=4).digest(), "little")
+        v[h % DIM] += 1.0 if h & 1 << 20 else -1.0
+    norm = np.linalg.norm(v)
+    return (v / norm if norm else v).tolist()
+
+
+class _StubEmbeddings:
+    async def create(self, model, input, **kwargs):
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=_embed(t)) for i, t in enumerate(input)])
+
+
+def _corpus(stories: int, rng: random.Random):
+    topics = max(1, stories // 4)
+    topic_words = [[f"topic{t}w{i}" for i in range(25)] for t in range(topics)]
+    docs = []
+    for s in range(stories):
+        topic = s % topics
+        own = [f"story{s}w{i}" for i in range(15)]
+        sentences = [
+            " ".join(rng.choice(topic_words[topic] if r < 0.4 else own if r < 0.6 else COMMON)
+                     for r in (rng.random() for _ in range(14))) + "."
+            for _ in range(36)
+        ]
+        # 6-sentence windows, stride 4: neighbouring chunks share two sentences
+        for chunk_id, start in enumerate(range(0, len(sentences) - 5, 4)):
+            text = " ".join(sentences[start : start + 6])
+            docs.append({
+                "id": f"s{s}-{chunk_id}",
+                "fileId": f"story-{s}",
+                "fileName": f"story-{s}.txt",
+                "title": f"Story {s}",
+                "chunk": text,
+                "chunkId": chunk_id,
+                "contentVector": _embed(text),
+            })
+    return docs, topic_words
+
+
+def _adjacent_pairs(passages) -> int:
+    seen = {(p["raw"].get("fileId"), p["raw"].get("chunkId")) for p in passages}
+    return sum((f, c + 1) in seen for f, c in seen)
+
+
+def _mean_similarity(query: str, passages) -> float:
+    q = np.asarray(_embed(query))
+    return float(np.mean([q @ np.asarray(_embed(p["content"])) for p in passages])) if passages else 0.0
+
+
+async def _run(queries, k, mode, search_client, openai_client):
+    rows = []
+    for query in queries:
+        diagnostics = {}
+        start = time.perf_counter()
+        passages = await retrieval.asearch_top_k_hybrid(
+            query, k=k, search_client=search_client, openai_client=openai_client,
+            diversify=mode, diagnostics=diagnostics,
+        )
+        ms = (time.perf_counter() - start) * 1000
+        retrieval.format_sources_for_prompt(passages, stats=diagnostics)
+        rows.append({
+            "ms": ms,
+            "tokens": diagnostics["source_tokens"],
+            "files": len({p["raw"].get("fileId") for p in passages}),
+            "adjacent": _adjacent_pairs(passages),
+            "similarity": _mean_similarity(query, passages),
+            "diversify_ms": diagnostics.get("diversify_ms", 0.0),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--stories", type=int, default=300)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--candidates", type=int, default=diversify.RETRIEVAL_CANDIDATES)
+    args = parser.parse_args()
+
+    retrieval.RETRIEVAL_CANDIDATES = args.candidates
+    rng = random.Random(7)
+    docs, topic_words = _corpus(args.stories, rng)
+    index = LocalSearchIndex()
+    index.upload_documents(docs)
+    search_client = AsyncLocalSearchClient(index)
+    openai_client = SimpleNamespace(embeddings=_StubEmbeddings())
+    queries = [" ".join(rng.sample(rng.choice(topic_words), 4)) for _ in range(args.queries)]
+
+    print(f"{len(docs)} chunks from {args.stories} stories, {args.queries} queries, "
+          f"k={args.k}, candidates={args.candidates}")
+    for label, mode in (("plain top-k", False), ("diversified", True)):
+        rows = asyncio.run(_run(queries, args.k, mode, search_client, openai_client))
+
+        def avg(field):
+            return statistics.mean(r[field] for r in rows)
+
+        ms = sorted(r["ms"] for r in rows)
+        print(f"{label:<12} source tokens {avg('tokens'):7.1f}  stories {avg('files'):4.2f}  "
+              f"adjacent pairs {avg('adjacent'):4.2f}  similarity {avg('similarity'):5.3f}  "
+              f"latency p50 {statistics.median(ms):6.2f} ms p95 {ms[int(len(ms) * 0.95) - 1]:6.2f} ms  "
+              f"(mmr {avg('diversify_ms'):4.2f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Micro-benchmark: one prebuilt-read poller vs concurrent page-range analysis.
+
+Runs extract_text_from_document() against a local stub Document Intelligence
+client (swapped in with set_document_analysis_client) whose pollers take a fixed
+startup latency plus a per-page cost, and return "[page N]" lines for the pages
+of the PDF they were sent. The input is a blank N-page PDF written with pypdf
+whose page widths encode the page numbers, so the stub can tell which pages a
+split range carries. Checks that the reassembled text is in page order and
+reports the bytes uploaded.
+
+Usage:
+    python function_app/scripts/bench_document_intelligence.py [--pages 300] [--page-ms 20]
+"""
+
+import argparse
+import io
+import threading
+import time
+
+from bench_support import use_stub_env
+
+use_stub_env()
+
+from pypdf import PdfReader, PdfWriter  # noqa: E402
+
+from function_app.ingest_trigger import document_intelligence as di  # noqa: E402
+
+_WIDTH = 100  # page N is _WIDTH + N points wide
+
+
+class _StubResult:
+    def __init__(self, content: str):
+        self.content = content
+        self.pages = []
+
+
+class _StubPoller:
+    def __init__(self, content: str, seconds: float):
+        self._content = content
+        self._seconds = seconds
+
+    def result(self):
+        time.sleep(self._seconds)
+        return _StubResult(self._content)
+
+
+class StubAnalysisClient:
+    def __init__(self, startup_s: float, page_s: float):
+        self.startup_s = startup_s
+        self.page_s = page_s
+        self.calls = 0
+        self.bytes_sent = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def begin_analyze_document(self, model_id, document, **kwargs):
+        numbers = [int(page.mediabox.width) - _WIDTH for page in PdfReader(io.BytesIO(document)).pages]
+        with self._lock:
+            self.calls += 1
+            self.bytes_sent += len(document)
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+        try:
+            content = "\n".join(f"[page {n}]" for n in numbers)
+            poller = _StubPoller(content, self.startup_s + self.page_s * len(numbers))
+            poller.result()  # spend the time while counted as in flight
+            return _StubPoller(content, 0)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+
+def _pdf(page_count: int) -> bytes:
+    writer = PdfWriter()
+    for n in range(1, page_count + 1):
+        writer.add_blank_page(width=_WIDTH + n, height=792)
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+def _run(name, data, client, page_count):
+    di.set_document_analysis_client(client)
+    start = time.perf_counter()
+    text = di.extract_text_from_document(data, "book.pdf")
+    elapsed = time.perf_counter() - start
+    ordered = text.splitlines() == [f"[page {n}]" for n in range(1, page_count + 1)]
+    print(f"{name:<9} {elapsed:6.2f} s  calls {client.calls:3d}  max concurrent {client.max_in_flight}  "
+          f"uploaded {client.bytes_sent / 1024:7.1f} KiB  pages in order: {ordered}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--page-ms", type=float, default=20.0)
+    parser.add_argument("--startup-ms", type=float, default=500.0)
+    args = parser.parse_args()
+
+    data = _pdf(args.pages)
+    print(f"pages detected: {di.pdf_page_count(data)}  range size: {di.DI_PAGES_PER_RANGE}  "
+          f"pollers: {di.DI_MAX_POLLERS}")
+
+    min_pages = di.DI_PARALLEL_MIN_PAGES
+    di.DI_PARALLEL_MIN_PAGES = args.pages + 1
+    _run("single", data, StubAnalysisClient(args.startup_ms / 1000, args.page_ms / 1000), args.pages)
+    di.DI_PARALLEL_MIN_PAGES = min_pages
+    _run("ranges", data, StubAnalysisClient(args.startup_ms / 1000, args.page_ms / 1000), args.pages)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Micro-benchmark: per-chunk vs batched embedding calls during ingestion.
+
+Starts a local stub of the Azure OpenAI embeddings route (fixed latency per
+request plus a small per-input cost, deterministic vectors) and embeds the same
+chunks with embed_text() one by one and with embed_texts(). Reports chunks/s
+and request counts, and checks that batched vectors come back in input order.
+
+--server-max-items makes the stub reject larger requests with HTTP 400, to
+exercise the split-and-retry path of embed_texts().
+
+Usage:
+    python function_app/scripts/bench_embed_batching.py [--chunks 2000] [--latency-ms 40]
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from array import array
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bench_support import use_stub_env
+
+DIMENSIONS = 1536
+
+
+def _vector(text: str):
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "little")
+    return [((seed + d) % 997) / 997.0 for d in range(8)] + [0.0] * (DIMENSIONS - 8)
+
+
+def _encode(vector, encoding_format):
+    # The openai client asks for base64 (packed float32), which the service supports
+    if encoding_format == "base64":
+        return base64.b64encode(array("f", vector).tobytes()).decode("ascii")
+    return vector
+
+
+class StubEmbeddingsHandler(BaseHTTPRequestHandler):
+    latency = 0.04
+    per_item = 0.0002
+    max_items = None
+    requests = 0
+    rejected = 0
+    _lock = threading.Lock()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        inputs = body["input"]
+        cls = type(self)
+        with cls._lock:
+            cls.requests += 1
+            reject = cls.max_items is not None and len(inputs) > cls.max_items
+            if reject:
+                cls.rejected += 1
+
+        time.sleep(cls.latency + cls.per_item * len(inputs))
+        if reject:
+            self._send(400, {"error": {"message": "Too many inputs", "type": "invalid_request_error"}})
+            return
+
+        fmt = body.get("encoding_format")
+        data = [{"object": "embedding", "index": i, "embedding": _encode(_vector(t), fmt)}
+                for i, t in enumerate(inputs)]
+        # Out of order on purpose: callers must sort by index
+        data.reverse()
+        self._send(200, {
+            "object": "list",
+            "data": data,
+            "model": "stub",
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        })
+
+    def _send(self, status, payload):
+        raw = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def log_message(self, *args):
+        pass
+
+
+def _chunks(n: int, words_per_chunk: int = 220):
+    rng = random.Random(7)
+    vocab = [f"word{i}" for i in range(5000)]
+    return [" ".join(rng.choice(vocab) for _ in range(words_per_chunk)) for _ in range(n)]
+
+
+def _timed(name, fn, n):
+    StubEmbeddingsHandler.requests = 0
+    StubEmbeddingsHandler.rejected = 0
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<10} {n / elapsed:9.1f} chunks/s  {elapsed:7.2f} s  "
+          f"requests: {StubEmbeddingsHandler.requests} (rejected {StubEmbeddingsHandler.rejected})")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--per-chunk-sample", type=int, default=200,
+                        help="chunks embedded one by one (the serial path is slow)")
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    parser.add_argument("--server-max-items", type=int, default=None)
+    args = parser.parse_args()
+
+    StubEmbeddingsHandler.latency = args.latency_ms / 1000
+    StubEmbeddingsHandler.max_items = args.server_max_items
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubEmbeddingsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    os.environ["AZURE_OPENAI_ENDPOINT"] = f"http://127.0.0.1:{server.server_port}/"
+    use_stub_env()
+    from function_app.chatbot_function import embed
+
+    chunks = _chunks(args.chunks)
+    sample = chunks[: args.per_chunk_sample]
+
+    embed.embedding_cache.clear()
+    _timed("per-chunk", lambda: [embed.embed_text(c) for c in sample], len(sample))
+
+    embed.embedding_cache.clear()
+    vectors = _timed("batched", lambda: embed.embed_texts(chunks), len(chunks))
+
+    ordered = all(array("f", v[:8]) == array("f", _vector(c)[:8]) for c, v in zip(chunks, vectors))
+    print(f"order preserved: {ordered}  batches planned: "
+          f"{len(embed.pack_batches(chunks, embed.EMBED_BATCH_MAX_ITEMS, embed.EMBED_BATCH_MAX_TOKENS))}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Micro-benchmark: sequential vs pipelined ingestion of one large document.
+
+Embedding and upload are stubs with fixed per-call latency; vectors are fresh
+1536-float lists, as the embeddings API returns. The sequential baseline is the
+previous process_and_index_text() shape: embed every chunk, keep all docs (with
+vectors) in memory, then upload in batches of 100. The pipelined run uses
+IngestionEngine. Reports wall time and tracemalloc peak for both.
+
+A third run sends the document through process_and_index_text() against a stub
+index, with a MemorySink collecting the metrics events, and prints the stage
+breakdown; it fails if a stage event is missing or its counts disagree with
+the run's stats.
+
+Usage:
+    python function_app/scripts/bench_ingest_pipeline.py [--mb 2] [--embed-ms 60] [--upload-ms 80]
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from bench_support import use_stub_env
+
+use_stub_env()
+
+from function_app.ingest_trigger import ingestion_pipeline as ip  # noqa: E402
+from function_app.ingest_trigger.chunker import iter_chunks  # noqa: E402
+from function_app.ingest_trigger.ingest_engine import IngestConfig, IngestionEngine  # noqa: E402
+from function_app.ingest_trigger.metrics import MemorySink, set_metrics_sink  # noqa: E402
+
+DIMENSIONS = 1536
+
+
+class StubStages:
+    def __init__(self, embed_ms: float, upload_ms: float, embed_batch: int):
+        self.embed_s = embed_ms / 1000
+        self.upload_s = upload_ms / 1000
+        self.embed_batch = embed_batch
+        self.uploaded = 0
+
+    def embed(self, texts):
+        vectors = []
+        for start in range(0, len(texts), self.embed_batch):
+            time.sleep(self.embed_s)
+            vectors += [[(len(t) % 97) * 1.0 + d for d in range(DIMENSIONS)]
+                        for t in texts[start:start + self.embed_batch]]
+        return vectors
+
+    def upload(self, docs):
+        time.sleep(self.upload_s)
+        self.uploaded += len(docs)
+
+
+class StubIndex:
+    """Empty index for process_and_index_text(): no existing chunks, every upload succeeds."""
+
+    def __init__(self, stages: StubStages):
+        self.stages = stages
+
+    def search(self, *args, **kwargs):
+        return []
+
+    def upload_documents(self, docs):
+        self.stages.upload(docs)
+        return [SimpleNamespace(key=d["id"], succeeded=True, status_code=201, error_message=None) for d in docs]
+
+    def delete_documents(self, docs):
+        pass
+
+
+def _text(mb: float) -> str:
+    rng = random.Random(3)
+    vocab = [f"word{i}" for i in range(3000)]
+    words, size = [], 0
+    while size < mb * 1024 * 1024:
+        w = rng.choice(vocab)
+        words.append(w + (". " if rng.random() < 0.07 else " "))
+        size += len(words[-1])
+    return "".join(words)
+
+
+def sequential(chunks, stages: StubStages):
+    docs = list(ip._chunk_docs(chunks, "book.txt", "Ym9vaw", "book", "2024-01-01T00:00:00Z"))
+    for doc, vector in zip(docs, stages.embed([d["chunk"] for d in docs])):
+        doc["contentVector"] = vector
+    for i in range(0, len(docs), 100):
+        stages.upload(docs[i:i + 100])
+
+
+def pipelined(chunks, stages: StubStages, config: IngestConfig):
+    engine = IngestionEngine(embed=stages.embed, upload=stages.upload, config=config)
+    return engine.run(ip._chunk_docs(chunks, "book.txt", "Ym9vaw", "book", "2024-01-01T00:00:00Z"))
+
+
+def traced(text: str, stages: StubStages, config: IngestConfig):
+    """process_and_index_text() with its metrics events collected; checks every stage was reported."""
+    index = StubIndex(stages)
+    ip.get_search_client = lambda: index
+    ip.embed_texts = lambda texts, **kwargs: stages.embed(texts)
+    sink = MemorySink()
+    set_metrics_sink(sink)
+    try:
+        stats = ip.process_and_index_text(text, "book.txt", config=config)
+    finally:
+        set_metrics_sink(None)
+
+    for stage in ("clean", "chunk", "lookup", "embed", "upload", "pipeline", "delete"):
+        events = sink.find(f"ingest.{stage}")
+        assert len(events) == 1, f"expected one ingest.{stage} event, got {len(events)}"
+        fields = events[0]
+        rate = next((f"{fields[k]:>12,.0f} {k}" for k in fields if k.endswith("_per_s")), "")
+        print(f"  {stage:<9} {fields['seconds']:7.3f} s {rate}")
+    assert sink.find("ingest.embed")[0]["chunks"] == stats["embedded"]
+    assert sink.find("ingest.upload")[0]["chunks"] == stats["uploaded"] == stats["chunks"]
+    summary = sink.find("ingest.document")
+    assert len(summary) == 1 and summary[0]["status"] == "indexed", summary
+    print(f"  document  {summary[0]['seconds']:7.3f} s  ({len(sink.events)} events)")
+
+
+def _measure(name, fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<11} {elapsed:7.2f} s   peak {peak / 1024 / 1024:8.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mb", type=float, default=2.0)
+    parser.add_argument("--embed-ms", type=float, default=60.0)
+    parser.add_argument("--upload-ms", type=float, default=80.0)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queue-size", type=int, default=256)
+    args = parser.parse_args()
+
+    text = ip.clean_text(_text(args.mb))
+    chunks = list(iter_chunks(text))
+    print(f"document: {len(text) / 1024 / 1024:.1f} MiB, {len(chunks)} chunks")
+
+    config = IngestConfig(embed_workers=args.workers, embed_batch=64, queue_size=args.queue_size, upload_batch=100)
+    _measure("sequential", lambda: sequential(chunks, StubStages(args.embed_ms, args.upload_ms, 64)))
+    _measure("pipelined", lambda: pipelined(chunks, StubStages(args.embed_ms, args.upload_ms, 64), config))
+    print("traced stages:")
+    traced(text, StubStages(args.embed_ms, args.upload_ms, 64), config)
+
+
+if __name__ == "__main__":
+    main()
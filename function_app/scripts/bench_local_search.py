@@ -0,0 +1,120 @@
+"""
+Micro-benchmark: query latency of the in-process search backend vs corpus size.
+
+Builds a LocalSearchIndex (brute force, and HNSW when hnswlib is installed)
+over synthetic chunks whose unit vectors are clustered around topic centroids
+(as real embeddings are), then times vector, BM25 and hybrid (RRF) queries at
+each corpus size. Reports build time, p50/p95 query latency and the recall@k of
+HNSW against the exact brute-force results.
+
+Usage:
+    python function_app/scripts/bench_local_search.py [--sizes 1000,10000,20000] [--dim 1536] [--queries 200]
+"""
+
+import argparse
+import random
+import statistics
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from bench_support import use_stub_env
+
+use_stub_env()
+
+from function_app.chatbot_function import local_search  # noqa: E402
+from function_app.chatbot_function.local_search import LocalSearchIndex  # noqa: E402
+
+VOCAB = [f"word{i}" for i in range(20000)]
+
+
+def _clustered(n: int, centroids: np.ndarray, rng: np.random.Generator, noise: float) -> np.ndarray:
+    """Unit vectors scattered around topic centroids (embeddings are clustered, not uniform)."""
+    picks = centroids[rng.integers(0, len(centroids), n)]
+    vectors = picks + noise * rng.standard_normal(picks.shape, dtype=np.float32) / np.sqrt(centroids.shape[1])
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _docs(vectors: np.ndarray, words: random.Random):
+    n = len(vectors)
+    for i in range(n):
+        yield {
+            "id": f"doc-{i}",
+            "fileId": f"file-{i // 50}",
+            "title": f"Story {i // 50}",
+            "chunk": " ".join(words.choice(VOCAB) for _ in range(60)),
+            "chunkId": i % 50,
+            "contentVector": vectors[i],
+        }
+
+
+def _latencies(fn, queries) -> list:
+    out = []
+    for q in queries:
+        start = time.perf_counter()
+        fn(q)
+        out.append((time.perf_counter() - start) * 1000)
+    return out
+
+
+def _fmt(ms: list) -> str:
+    ms = sorted(ms)
+    return f"p50 {statistics.median(ms):7.2f} ms  p95 {ms[int(len(ms) * 0.95) - 1]:7.2f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="1000,10000,20000")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    backends = ["bruteforce"] + (["hnsw"] if local_search.hnswlib is not None else [])
+    if len(backends) == 1:
+        print("hnswlib not installed: brute force only")
+
+    for n in (int(s) for s in args.sizes.split(",")):
+        rng = np.random.default_rng(3)
+        words = random.Random(3)
+        centroids = rng.standard_normal((max(8, n // 100), args.dim), dtype=np.float32)
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True)
+        docs = list(_docs(_clustered(n, centroids, rng, noise=1.0), words))
+        query_vectors = _clustered(args.queries, centroids, rng, noise=1.0)
+        query_texts = [" ".join(words.choice(VOCAB) for _ in range(4)) for _ in range(args.queries)]
+        print(f"-- {n} docs x {args.dim} dims")
+
+        exact = None
+        for ann in backends:
+            index = LocalSearchIndex(ann=ann)
+            start = time.perf_counter()
+            for i in range(0, n, 1000):
+                index.upload_documents(docs[i : i + 1000])
+            build = time.perf_counter() - start
+
+            def vector(i):
+                vq = SimpleNamespace(vector=query_vectors[i], k_nearest_neighbors=args.k)
+                return [r["id"] for r in index.search(None, vector_queries=[vq], select=["id"], top=args.k)]
+
+            def hybrid(i):
+                vq = SimpleNamespace(vector=query_vectors[i], k_nearest_neighbors=args.k)
+                return index.search(query_texts[i], vector_queries=[vq], select=["id"], top=args.k)
+
+            results = [vector(i) for i in range(args.queries)]
+            recall = ""
+            if exact is None:
+                exact = results
+            else:
+                hits = sum(len(set(a) & set(b)) for a, b in zip(exact, results))
+                recall = f"  recall@{args.k} {hits / (args.k * args.queries):.3f}"
+
+            ids = range(args.queries)
+            print(f"{ann:<10} build {build:6.2f} s  vector {_fmt(_latencies(vector, ids))}{recall}")
+            print(f"{'':<10} {'':14}  hybrid {_fmt(_latencies(hybrid, ids))}")
+        print(f"{'bm25':<10} {'':14}  text   "
+              f"{_fmt(_latencies(lambda i: index.search(query_texts[i], select=['id'], top=args.k), range(args.queries)))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark: wall clock of single-query vs multi-query retrieval against stubbed backends.
+
+The embeddings call and every search sleep for a configurable latency (search
+results come from an in-process index), so the numbers show how much the
+multi-query mode adds on the critical path: one batched embedding call plus
+concurrent searches, compared with a single search and with embedding and
+searching the same variants one after another.
+
+Usage:
+    python function_app/scripts/bench_multi_query.py [--turns 20] [--embed-ms 60] [--search-ms 120]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from types import SimpleNamespace
+
+from bench_support import use_stub_env
+
+use_stub_env()
+os.environ["SEARCH_CACHE_TTL_SECONDS"] = "0"
+os.environ["EMBEDDING_CACHE_MAX_MB"] = "0"
+
+from function_app.chatbot_function import retrieval  # noqa: E402
+from function_app.chatbot_function.local_search import AsyncLocalSearchClient, LocalSearchIndex  # noqa: E402
+from function_app.chatbot_function.multi_query import query_variants  # noqa: E402
+
+DIM = 64
+
+
+class _StubEmbeddings:
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+
+    async def create(self, model, input, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return SimpleNamespace(data=[
+            SimpleNamespace(index=i, embedding=[float(len(t) % 7 == d % 7) for d in range(DIM)])
+            for i, t in enumerate(input)
+        ])
+
+
+class _SlowSearch(AsyncLocalSearchClient):
+    def __init__(self, index, latency):
+        super().__init__(index)
+        self.latency = latency
+        self.calls = 0
+
+    async def search(self, search_text=None, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return await super().search(search_text, **kwargs)
+
+
+def _index() -> LocalSearchIndex:
+    index = LocalSearchIndex()
+    index.upload_documents([
+        {
+            "id": f"d{i}",
+            "fileId": f"f{i // 10}",
+            "title": f"Story {i // 10}",
+            "chunk": f"Little Red Riding Hood met the Wolf in chapter {i} near grandmother's house",
+            "chunkId": i % 10,
+            "contentVector": [float((i + d) % 5 == 0) for d in range(DIM)],
+        }
+        for i in range(500)
+    ])
+    return index
+
+
+async def _sequential(queries, k, search_client, openai_client):
+    """Baseline for the variants: embed and search one query after another."""
+    rankings = []
+    for query in queries:
+        vec = await retrieval.aembed_text(query, client=openai_client)
+        top, select, extra = retrieval._fetch_plan(k, False)
+        rankings.append(await retrieval._asearch_candidates(search_client, query, vec, top, None, select, extra))
+    return rankings
+
+
+async def _time(turns, fn):
+    out = []
+    for turn in range(turns):
+        start = time.perf_counter()
+        await fn(turn)
+        out.append((time.perf_counter() - start) * 1000)
+    return statistics.median(out)
+
+
+async def _run(args):
+    embeddings = _StubEmbeddings(args.embed_ms / 1000)
+    openai_client = SimpleNamespace(embeddings=embeddings)
+    search_client = _SlowSearch(_index(), args.search_ms / 1000)
+    user_input = "what did she do when she met him?"
+    rewrite = "What did Little Red Riding Hood do when she met the Wolf?"
+
+    # Distinct text per turn so no cache serves a later turn
+    def variants(turn):
+        return query_variants(f"{user_input} ({turn})", f"{rewrite} ({turn})")
+
+    print(f"variants: {variants(0)}")
+    rows = [
+        ("single query", lambda t: retrieval.asearch_top_k_hybrid(
+            f"{rewrite} ({t})", k=args.k, search_client=search_client, openai_client=openai_client, diversify=False)),
+        ("multi-query, sequential", lambda t: _sequential(variants(t), args.k, search_client, openai_client)),
+        ("multi-query", lambda t: retrieval.asearch_multi_query(
+            variants(t), k=args.k, search_client=search_client, openai_client=openai_client, diversify=False)),
+    ]
+    for label, fn in rows:
+        embeddings.calls = search_client.calls = 0
+        ms = await _time(args.turns, fn)
+        print(f"{label:<24} p50 {ms:7.1f} ms   embedding calls/turn {embeddings.calls / args.turns:3.1f}  "
+              f"searches/turn {search_client.calls / args.turns:3.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--embed-ms", type=float, default=60)
+    parser.add_argument("--search-ms", type=float, default=120)
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
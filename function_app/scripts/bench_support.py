@@ -0,0 +1,35 @@
+"""
+Shared setup for the offline benchmarks in this folder.
+
+Puts the repo root on sys.path (so `function_app.*` imports work) and fills in
+placeholder settings that chatbot_function modules read at import time. Stub
+backends never send requests to these endpoints.
+"""
+
+import os
+import sys
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(os.path.dirname(SCRIPT_DIR))
+
+STUB_ENV = {
+    "AZURE_OPENAI_ENDPOINT": "https://stub.openai.azure.com/",
+    "AZURE_OPENAI_KEY": "stub",
+    "AZURE_OPENAI_API_VERSION": "2024-05-01-preview",
+    "AZURE_OPENAI_DEPLOYMENT_NAME": "gpt-4",
+    "AZURE_OPENAI_EMBEDDING_DEPLOYMENT": "text-embedding-ada-002",
+    "AZURE_SEARCH_ENDPOINT": "https://stub.search.windows.net",
+    "AZURE_SEARCH_INDEX": "stub-index",
+    "AZURE_SEARCH_API_KEY": "stub",
+    "COSMOS_URI": "https://stub.documents.azure.com:443/",
+    "COSMOS_KEY": "c3R1Yg==",
+    "DOCUMENT_INTELLIGENCE_ENDPOINT": "https://stub.cognitiveservices.azure.com/",
+    "DOCUMENT_INTELLIGENCE_KEY": "stub",
+}
+
+
+def use_stub_env():
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    for name, value in STUB_ENV.items():
+        os.environ.setdefault(name, value)
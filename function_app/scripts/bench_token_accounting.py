@@ -0,0 +1,104 @@
+"""
+Benchmark: trim_conversation_by_tokens on long histories.
+
+Compares the previous implementation (encoder looked up on every count,
+every message re-encoded every turn, list.insert(0, ...) while trimming) with
+the memoized token accounting in chatbot_function.tokens, cold (no stored
+counts) and warm (counts already persisted on the messages, i.e. every turn
+after the first).
+
+Usage:
+    python function_app/scripts/bench_token_accounting.py [--messages 500] [--repeat 20]
+"""
+
+import argparse
+import copy
+import random
+import time
+
+import tiktoken
+
+from bench_support import use_stub_env
+
+use_stub_env()
+
+from function_app.chatbot_function.utils import trim_conversation_by_tokens  # noqa: E402
+
+_WORDS = (
+    "the teacher walked into the quiet village school where children waited "
+    "for a story about the river the fox the old mill and the lantern festival"
+).split()
+
+
+def legacy_count_tokens(messages, model="gpt-4"):
+    encoding = tiktoken.encoding_for_model(model)
+    tokens = 0
+    for message in messages:
+        tokens += 4
+        for key, value in message.items():
+            tokens += len(encoding.encode(value))
+    tokens += 2
+    return tokens
+
+
+def legacy_trim(conversation, max_tokens=8192, model="gpt-4", safety_margin=500):
+    system_prompt = conversation[0]
+    allowed_tokens = max_tokens - safety_margin
+    total_tokens = legacy_count_tokens([system_prompt])
+
+    trimmed = []
+    for msg in reversed(conversation[1:]):
+        msg_tokens = legacy_count_tokens([msg])
+        if total_tokens + msg_tokens <= allowed_tokens:
+            trimmed.insert(0, msg)
+            total_tokens += msg_tokens
+        else:
+            break
+    return [system_prompt] + trimmed
+
+
+def make_history(n: int, seed: int = 7):
+    rng = random.Random(seed)
+    convo = [{"role": "system", "content": "You are a storytelling assistant."}]
+    for i in range(n):
+        role = "user" if i % 2 == 0 else "assistant"
+        length = rng.randint(8, 120)
+        convo.append({"role": role, "content": " ".join(rng.choice(_WORDS) for _ in range(length))})
+    return convo
+
+
+def _best(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    history = make_history(args.messages)
+    model = "gpt-4"
+
+    for budget in (8192, 1_000_000):
+        legacy = _best(lambda: legacy_trim(copy.deepcopy(history), max_tokens=budget, model=model), args.repeat)
+        cold = _best(lambda: trim_conversation_by_tokens(copy.deepcopy(history), max_tokens=budget, model=model),
+                     args.repeat)
+        warm_history = copy.deepcopy(history)
+        trim_conversation_by_tokens(warm_history, max_tokens=1_000_000, model=model)
+        warm = _best(lambda: trim_conversation_by_tokens(warm_history, max_tokens=budget, model=model), args.repeat)
+        kept = len(trim_conversation_by_tokens(copy.deepcopy(history), max_tokens=budget, model=model)) - 1
+
+        print(f"{args.messages} messages, budget {budget} tokens (keeps {kept}):")
+        print(f"  legacy      {legacy * 1000:8.2f} ms")
+        print(f"  memo, cold  {cold * 1000:8.2f} ms")
+        print(f"  memo, warm  {warm * 1000:8.2f} ms  ({legacy / warm:.0f}x faster than legacy)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+Bulk-ingest a local directory of stories into the Azure AI Search index.
+
+Same document shape and incremental behavior as the blob trigger
+(process_and_index_text), built for backfills:
+  - files are extracted, cleaned and chunked in a process pool
+  - chunks of all files share one IngestionEngine (batched embedding + uploader)
+  - a manifest records each file once all of its chunks are uploaded, so an
+    interrupted run resumes without redoing finished files (a file whose bytes
+    changed since it was recorded is ingested again)
+  - a file that fails to extract or chunk is logged and counted as "failed";
+    it stays out of the manifest, so the next run retries it
+
+Doc ids derive from the file name (as in the blob trigger), so two files with
+the same name in different folders would collide; the second one is skipped.
+
+.txt/.md files are read directly; other files go through Document Intelligence.
+Settings come from the environment (or function_app/scripts/.env), as for the
+Function App.
+
+Usage:
+    python function_app/scripts/bulk_ingest.py ./stories [--manifest ./stories/.ingest-manifest.json]
+        [--processes 4] [--extensions .txt,.md,.pdf] [--force]
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(os.path.dirname(SCRIPT_DIR))
+load_dotenv(os.path.join(SCRIPT_DIR, ".env"))
+sys.path.insert(0, REPO_ROOT)
+
+from function_app.ingest_trigger import ingestion_pipeline as ip  # noqa: E402
+from function_app.ingest_trigger.ingest_engine import IngestConfig, IngestionEngine  # noqa: E402
+
+_TEXT_EXTENSIONS = {".txt", ".md"}
+
+
+class Manifest:
+    """{relative path: {sha256, chunks, indexedAt}} of finished files, rewritten atomically."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.files: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.files = json.load(f).get("files", {})
+
+    def is_done(self, relpath: str, sha256: str) -> bool:
+        entry = self.files.get(relpath)
+        return bool(entry) and entry.get("sha256") == sha256
+
+    def mark_done(self, relpath: str, sha256: str, chunks: int):
+        with self._lock:
+            self.files[relpath] = {
+                "sha256": sha256,
+                "chunks": chunks,
+                "indexedAt": datetime.utcnow().isoformat() + "Z",
+            }
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"files": self.files}, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _prepare(path: str, relpath: str, sha256: str, max_tokens: int) -> Tuple[str, str, str, List[Dict]]:
+    """Worker process: extract, clean and chunk one file into docs without vectors."""
+    filename = os.path.basename(path)
+    with open(path, "rb") as f:
+        raw = f.read()
+
+    if os.path.splitext(filename)[1].lower() in _TEXT_EXTENSIONS:
+        try:
+            text = raw.decode("utf-8")
+        except UnicodeDecodeError:
+            text = raw.decode("latin-1", errors="replace")
+    else:
+        from function_app.ingest_trigger.document_intelligence import extract_text_from_document
+        text = extract_text_from_document(raw, filename)
+
+    docs = list(ip.document_chunks(text, filename, max_tokens_per_chunk=max_tokens))
+    return relpath, sha256, filename, docs
+
+
+class _Progress:
+    """
+    Tracks, per file, chunks handed to the engine but not yet uploaded. A file
+    is finished (orphans deleted, manifest entry written) once all its chunks are
+    uploaded and the producer has moved past it.
+    """
+
+    def __init__(self, manifest: Manifest):
+        self.manifest = manifest
+        self._lock = threading.Lock()
+        self._files: Dict[str, Dict] = {}
+        self._owner: Dict[str, str] = {}
+        self.finished = 0
+
+    def start(self, relpath: str, sha256: str, update: "ip.IncrementalUpdate"):
+        with self._lock:
+            self._files[relpath] = {"sha256": sha256, "update": update, "pending": 0, "chunks": 0, "produced": False}
+
+    def add(self, relpath: str, doc: Dict):
+        with self._lock:
+            self._files[relpath]["pending"] += 1
+            self._owner[doc["id"]] = relpath
+
+    def produced(self, relpath: str, chunks: int):
+        with self._lock:
+            state = self._files[relpath]
+            state["produced"] = True
+            state["chunks"] = chunks
+            done = state["pending"] == 0
+        if done:
+            self._finish(relpath)
+
+    def uploaded(self, docs: List[Dict]):
+        done = []
+        with self._lock:
+            for doc in docs:
+                relpath = self._owner.pop(doc["id"])
+                state = self._files[relpath]
+                state["pending"] -= 1
+                if state["pending"] == 0 and state["produced"]:
+                    done.append(relpath)
+        for relpath in done:
+            self._finish(relpath)
+
+    def _finish(self, relpath: str):
+        with self._lock:
+            state = self._files.pop(relpath)
+        deleted = state["update"].delete_orphans()
+        self.manifest.mark_done(relpath, state["sha256"], state["chunks"])
+        self.finished += 1
+        logging.info(f"Finished {relpath}: {state['chunks']} chunks, "
+                     f"{state['update'].counts['unchanged']} unchanged, {deleted} orphans deleted")
+
+
+def _walk(root: str, extensions: set) -> Iterator[Tuple[str, str]]:
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.startswith(".") or os.path.splitext(name)[1].lower() not in extensions:
+                continue
+            path = os.path.join(dirpath, name)
+            yield path, os.path.relpath(path, root).replace(os.sep, "/")
+
+
+def bulk_ingest(
+    root: str,
+    manifest_path: Optional[str] = None,
+    *,
+    processes: Optional[int] = None,
+    extensions: Optional[set] = None,
+    max_tokens: int = 300,
+    force: bool = False,
+    config: Optional[IngestConfig] = None,
+) -> Dict[str, int]:
+    manifest = Manifest(manifest_path or os.path.join(root, ".ingest-manifest.json"))
+    extensions = extensions or _TEXT_EXTENSIONS
+    processes = processes or os.cpu_count() or 1
+
+    todo, seen_ids, skipped = [], {}, 0
+    for path, relpath in _walk(root, extensions):
+        file_id = ip.document_id(os.path.basename(path))
+        if file_id in seen_ids:
+            logging.warning(f"Skipping {relpath}: same document id as {seen_ids[file_id]}")
+            continue
+        seen_ids[file_id] = relpath
+        sha256 = _file_sha256(path)
+        if not force and manifest.is_done(relpath, sha256):
+            skipped += 1
+            continue
+        todo.append((path, relpath, sha256))
+
+    logging.info(f"{len(todo)} files to ingest, {skipped} already in the manifest")
+    client = ip.get_search_client()
+    progress = _Progress(manifest)
+    failed: List[str] = []
+
+    def upload(docs: List[Dict]):
+        ip.upload_documents_to_search(docs)
+        progress.uploaded(docs)
+
+    def produce(pool) -> Iterator[Dict]:
+        # Keep at most 2 files per process in flight so prepared docs cannot pile up
+        queued = iter(todo)
+        running: Dict = {}  # future -> relpath
+        while True:
+            while len(running) < processes * 2:
+                item = next(queued, None)
+                if item is None:
+                    break
+                path, relpath, sha256 = item
+                running[pool.submit(_prepare, path, relpath, sha256, max_tokens)] = relpath
+            if not running:
+                return
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                relpath = running.pop(future)
+                try:
+                    relpath, sha256, filename, docs = future.result()
+                except Exception as e:
+                    logging.error(f"Failed {relpath}: {e}")
+                    failed.append(relpath)
+                    continue
+                update = ip.IncrementalUpdate(client, ip.document_id(filename))
+                progress.start(relpath, sha256, update)
+                for doc in update.changed(docs):
+                    progress.add(relpath, doc)
+                    yield doc
+                progress.produced(relpath, len(docs))
+
+    engine = IngestionEngine(embed=ip.embed_texts, upload=upload, config=config)
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        stats = engine.run(produce(pool))
+
+    # "chunks" counts only new/changed chunks; unchanged ones never reach the engine
+    stats.update({"files": progress.finished, "skipped": skipped, "failed": len(failed)})
+    if failed:
+        logging.warning(f"{len(failed)} files failed and will be retried next run: {', '.join(failed)}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("root", help="directory to ingest (walked recursively)")
+    parser.add_argument("--manifest", default=None, help="default: <root>/.ingest-manifest.json")
+    parser.add_argument("--processes", type=int, default=None, help="clean/chunk worker processes (default: CPUs)")
+    parser.add_argument("--extensions", default=".txt,.md", help="comma-separated, e.g. .txt,.md,.pdf")
+    parser.add_argument("--max-tokens", type=int, default=300)
+    parser.add_argument("--force", action="store_true", help="ignore the manifest and ingest every file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    extensions = {e.strip().lower() for e in args.extensions.split(",") if e.strip()}
+    stats = bulk_ingest(
+        args.root,
+        args.manifest,
+        processes=args.processes,
+        extensions=extensions,
+        max_tokens=args.max_tokens,
+        force=args.force,
+    )
+    print(json.dumps(stats, indent=1))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,45 @@
 """
-Create/Update a RAG-friendly Azure AI Search index (SDK 11.5.x)
+Create/Update a RAG-friendly Azure AI Search index (SDK 11.6+)
 - Loads .env (AZURE_SEARCH_ENDPOINT, AZURE_SEARCH_ADMIN_KEY, AZURE_SEARCH_INDEX_NAME)
 - Uses HNSW vector search profile
 - Declares vector field via SearchField with vector_search_dimensions + vector_search_profile_name
+- Optional vector compression: scalar (int8) or binary quantization, rescored with
+  the full-precision vectors over an oversampled candidate set
+- Optional smaller vectors (--dimensions, matching AZURE_OPENAI_EMBEDDING_DIMENSIONS)
+  and a vector field that is not retrievable or not stored at all
+
+Vector settings of an existing field cannot be changed in place: create a new index
+(--index) and re-ingest. A non-retrievable vector field still works for search, but
+re-ingestion then re-embeds moved chunks instead of reusing their stored vectors.
+Compare size and recall of two indexes with scripts/index_recall.py.
+
+Usage:
+    python function_app/scripts/create_search_index.py [--index NAME] [--dimensions 1536]
+        [--compression none|scalar|binary] [--oversampling 4] [--no-rescore] [--discard-originals]
+        [--truncate-dimension N] [--vector-not-retrievable] [--vector-not-stored]
+        [--hnsw-m 4] [--ef-construction 400] [--ef-search 500]
 """
 
+import argparse
 import os
 from dotenv import load_dotenv
-from azure.search.documents import __version__ as azsearch_version
 from azure.core.credentials import AzureKeyCredential
 from azure.search.documents.indexes import SearchIndexClient
 from azure.search.documents.indexes.models import (
     SearchIndex,
     SimpleField,
     SearchableField,
-    SearchField,               
+    SearchField,
     SearchFieldDataType,
     VectorSearch,
-    HnswAlgorithmConfiguration,  
+    HnswAlgorithmConfiguration,
+    HnswParameters,
     VectorSearchProfile,
+    ScalarQuantizationCompression,
+    ScalarQuantizationParameters,
+    BinaryQuantizationCompression,
+    RescoringOptions,
+    VectorSearchCompressionRescoreStorageMethod,
 )
 
 
@@ -30,56 +51,129 @@ admin_key  = os.getenv("AZURE_SEARCH_API_KEY")
 index_name = os.getenv("AZURE_SEARCH_INDEX")
 
 
-if not endpoint or not admin_key or not index_name:
-    print("Missing environment variables. Check .env (ENDPOINT / ADMIN_KEY or API_KEY / INDEX_NAME or INDEX).")
-    raise SystemExit(1)
-
-client = SearchIndexClient(endpoint=endpoint, credential=AzureKeyCredential(admin_key))
-
-
-fields = [
-    SimpleField(name="id",        type=SearchFieldDataType.String, key=True, filterable=True),
-    SimpleField(name="fileId",    type=SearchFieldDataType.String, filterable=True, sortable=True),
-    SearchableField(name="fileName", type=SearchFieldDataType.String, sortable=True),
-    SearchableField(name="title",    type=SearchFieldDataType.String, sortable=True),
-    SearchableField(name="chunk",    type=SearchFieldDataType.String),
-
-    SimpleField(name="chunkId",   type=SearchFieldDataType.Int32,  filterable=True, sortable=True),
-
-    
-    SearchField(
-        name="contentVector",
-        type=SearchFieldDataType.Collection(SearchFieldDataType.Single),
-        searchable=True,  
-        retrievable=True,
-        hidden=False,                        
-        vector_search_dimensions=1536,         
-        vector_search_profile_name="my-profile"
-                              
-    ),
-    SimpleField(name="createdAt", type=SearchFieldDataType.DateTimeOffset, filterable=True, sortable=True),
-]
-
-# --- Vector search config (HNSW) ---
-vector_search = VectorSearch(
-    algorithms=[
-        HnswAlgorithmConfiguration(
-            name="my-hnsw"
-        )
-    ],
-    profiles=[
-        VectorSearchProfile(
-            name="my-profile",
-            algorithm_configuration_name="my-hnsw",  
+def _compression(args):
+    """The compression config named "my-compression", or None for full precision."""
+    if args.compression == "none":
+        return None
+
+    rescoring = RescoringOptions(
+        enable_rescoring=args.rescore,
+        default_oversampling=args.oversampling if args.rescore else None,
+        rescore_storage_method=(
+            VectorSearchCompressionRescoreStorageMethod.DISCARD_ORIGINALS
+            if args.discard_originals
+            else VectorSearchCompressionRescoreStorageMethod.PRESERVE_ORIGINALS
+        ),
+    )
+    common = dict(
+        compression_name="my-compression",
+        rescoring_options=rescoring,
+        truncation_dimension=args.truncate_dimension,
+    )
+    if args.compression == "scalar":
+        return ScalarQuantizationCompression(
+            parameters=ScalarQuantizationParameters(quantized_data_type="int8"),
+            **common,
         )
-    ],
-)
+    return BinaryQuantizationCompression(**common)
+
+
+def build_index(name: str, args) -> SearchIndex:
+    # A vector that is not stored cannot be retrieved either
+    retrievable = args.vector_retrievable and args.vector_stored
+
+    fields = [
+        SimpleField(name="id",        type=SearchFieldDataType.String, key=True, filterable=True),
+        SimpleField(name="fileId",    type=SearchFieldDataType.String, filterable=True, sortable=True),
+        SearchableField(name="fileName", type=SearchFieldDataType.String, sortable=True),
+        SearchableField(name="title",    type=SearchFieldDataType.String, sortable=True),
+        SearchableField(name="chunk",    type=SearchFieldDataType.String),
+
+        SimpleField(name="chunkId",   type=SearchFieldDataType.Int32,  filterable=True, sortable=True),
+        # Character offsets of the chunk in the cleaned source text
+        SimpleField(name="chunkStart", type=SearchFieldDataType.Int32, filterable=True, sortable=True),
+        SimpleField(name="chunkEnd",   type=SearchFieldDataType.Int32, filterable=True),
+        # sha256(embedding deployment + chunk text): lets re-ingestion skip unchanged chunks
+        SimpleField(name="contentHash", type=SearchFieldDataType.String, filterable=True),
+
+        SearchField(
+            name="contentVector",
+            type=SearchFieldDataType.Collection(SearchFieldDataType.Single),
+            searchable=True,
+            retrievable=retrievable,
+            # stored=False drops the copy kept only for returning the vector in results
+            stored=args.vector_stored,
+            vector_search_dimensions=args.dimensions,
+            vector_search_profile_name="my-profile"
+        ),
+        SimpleField(name="createdAt", type=SearchFieldDataType.DateTimeOffset, filterable=True, sortable=True),
+    ]
+
+    # --- Vector search config (HNSW, optionally over compressed vectors) ---
+    hnsw_params = {
+        key: value
+        for key, value in (("m", args.hnsw_m), ("ef_construction", args.ef_construction), ("ef_search", args.ef_search))
+        if value is not None
+    }
+    compression = _compression(args)
+    vector_search = VectorSearch(
+        algorithms=[
+            HnswAlgorithmConfiguration(
+                name="my-hnsw",
+                parameters=HnswParameters(metric="cosine", **hnsw_params) if hnsw_params else None,
+            )
+        ],
+        profiles=[
+            VectorSearchProfile(
+                name="my-profile",
+                algorithm_configuration_name="my-hnsw",
+                compression_name=compression.compression_name if compression else None,
+            )
+        ],
+        compressions=[compression] if compression else None,
+    )
+
+    return SearchIndex(
+        name=name,
+        fields=fields,
+        vector_search=vector_search,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create/update the RAG index")
+    parser.add_argument("--index", default=index_name, help="default: AZURE_SEARCH_INDEX")
+    parser.add_argument("--dimensions", type=int,
+                        default=int(os.getenv("AZURE_OPENAI_EMBEDDING_DIMENSIONS") or 1536),
+                        help="vector size (default: AZURE_OPENAI_EMBEDDING_DIMENSIONS or 1536)")
+    parser.add_argument("--compression", choices=["none", "scalar", "binary"], default="none")
+    parser.add_argument("--no-rescore", dest="rescore", action="store_false",
+                        help="rank by the compressed vectors only")
+    parser.add_argument("--oversampling", type=float, default=4.0,
+                        help="candidates fetched per result before rescoring (compression only)")
+    parser.add_argument("--discard-originals", action="store_true",
+                        help="do not keep full-precision vectors (smallest index, rescoring is less exact)")
+    parser.add_argument("--truncate-dimension", type=int, default=None,
+                        help="compress only the first N dimensions (Matryoshka models such as text-embedding-3)")
+    parser.add_argument("--vector-not-retrievable", dest="vector_retrievable", action="store_false")
+    parser.add_argument("--vector-not-stored", dest="vector_stored", action="store_false",
+                        help="implies --vector-not-retrievable")
+    parser.add_argument("--hnsw-m", type=int, default=None)
+    parser.add_argument("--ef-construction", type=int, default=None)
+    parser.add_argument("--ef-search", type=int, default=None)
+    args = parser.parse_args()
+
+    if not endpoint or not admin_key or not args.index:
+        print("Missing environment variables. Check .env (ENDPOINT / ADMIN_KEY or API_KEY / INDEX_NAME or INDEX).")
+        raise SystemExit(1)
+    if args.compression == "none" and (args.discard_originals or args.truncate_dimension):
+        parser.error("--discard-originals and --truncate-dimension need --compression scalar|binary")
+
+    client = SearchIndexClient(endpoint=endpoint, credential=AzureKeyCredential(admin_key))
+    result = client.create_or_update_index(build_index(args.index, args))
+    print(f"Index '{result.name}' created/updated successfully "
+          f"(dimensions={args.dimensions}, compression={args.compression}).")
 
-index = SearchIndex(
-    name=index_name,
-    fields=fields,
-    vector_search=vector_search,
-)
 
-result = client.create_or_update_index(index)
-print(f"Index '{result.name}' created/updated successfully.")
+if __name__ == "__main__":
+    main()
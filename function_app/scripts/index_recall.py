@@ -0,0 +1,130 @@
+"""
+Report size and vector recall@k of a candidate index against a full-precision baseline.
+
+Both indexes must hold the same documents (e.g. the same folder ingested into
+each with bulk_ingest.py); the baseline is one created with the defaults of
+create_search_index.py (no compression, native dimensions). For each query:
+  - ground truth = exhaustive (exact) KNN on the baseline index
+  - the baseline's own HNSW result shows the loss from approximate search alone
+  - the candidate is queried as the app queries it (HNSW over compressed
+    vectors, rescored as configured in the index)
+recall@k = share of the exact top k ids a query returns, averaged over queries.
+Sizes come from get_index_statistics (needs an admin key).
+
+Queries are lines of --queries FILE, or chunk texts sampled from the baseline
+(--sample N); real user questions give the more honest number.
+
+Usage:
+    python function_app/scripts/index_recall.py --candidate stories-int8 [--baseline stories-index]
+        [--k 10] [--queries questions.txt | --sample 100] [--candidate-dimensions 512]
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from azure.core.credentials import AzureKeyCredential
+from azure.search.documents import SearchClient
+from azure.search.documents.indexes import SearchIndexClient
+from azure.search.documents.models import VectorizedQuery
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(os.path.dirname(SCRIPT_DIR))
+load_dotenv(os.path.join(SCRIPT_DIR, ".env"))
+sys.path.insert(0, REPO_ROOT)
+
+from function_app.chatbot_function import embed  # noqa: E402
+
+VECTOR_FIELD = "contentVector"
+
+
+def _embed(texts: List[str], dimensions: Optional[int]) -> List[List[float]]:
+    kwargs = {"dimensions": dimensions} if dimensions else {}
+    vectors = []
+    for i in range(0, len(texts), 256):
+        response = embed.client.embeddings.create(model=embed.embedding_model, input=texts[i : i + 256], **kwargs)
+        vectors.extend(d.embedding for d in sorted(response.data, key=lambda d: d.index))
+    return vectors
+
+
+def _top_ids(client: SearchClient, vector: List[float], k: int, exhaustive: bool = False) -> List[str]:
+    query = VectorizedQuery(vector=vector, k_nearest_neighbors=k, fields=VECTOR_FIELD, exhaustive=exhaustive)
+    return [r["id"] for r in client.search(search_text=None, vector_queries=[query], select=["id"], top=k)]
+
+
+def _sample_queries(client: SearchClient, n: int) -> List[str]:
+    return [r["chunk"] for r in client.search(search_text="*", select=["chunk"], top=n) if r.get("chunk")]
+
+
+def _size(index_client: SearchIndexClient, name: str) -> Dict[str, int]:
+    stats = index_client.get_index_statistics(name)
+    get = stats.get if isinstance(stats, dict) else lambda key: getattr(stats, key, None)
+    return {
+        "documents": get("document_count"),
+        "storage": get("storage_size"),
+        "vector_index": get("vector_index_size"),
+    }
+
+
+def _mib(value) -> str:
+    return f"{value / 1024 / 1024:10.1f} MiB" if value is not None else "         n/a"
+
+
+def _recall(truth: List[List[str]], results: List[List[str]], k: int) -> float:
+    return sum(len(set(t[:k]) & set(r[:k])) / max(1, min(k, len(t))) for t, r in zip(truth, results)) / len(truth)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--baseline", default=os.getenv("AZURE_SEARCH_INDEX"), help="default: AZURE_SEARCH_INDEX")
+    parser.add_argument("--candidate", required=True)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", default=None, help="file with one query per line")
+    parser.add_argument("--sample", type=int, default=50, help="chunks sampled as queries when --queries is not given")
+    parser.add_argument("--baseline-dimensions", type=int, default=None, help="embedding size of the baseline (default: native)")
+    parser.add_argument("--candidate-dimensions", type=int, default=None, help="embedding size of the candidate (default: native)")
+    args = parser.parse_args()
+
+    endpoint = os.getenv("AZURE_SEARCH_ENDPOINT")
+    credential = AzureKeyCredential(os.getenv("AZURE_SEARCH_API_KEY"))
+    baseline = SearchClient(endpoint, args.baseline, credential)
+    candidate = SearchClient(endpoint, args.candidate, credential)
+    index_client = SearchIndexClient(endpoint, credential)
+
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = _sample_queries(baseline, args.sample)
+    if not queries:
+        raise SystemExit("No queries")
+
+    base_vectors = _embed(queries, args.baseline_dimensions)
+    if args.candidate_dimensions == args.baseline_dimensions:
+        cand_vectors = base_vectors
+    else:
+        cand_vectors = _embed(queries, args.candidate_dimensions)
+
+    truth = [_top_ids(baseline, v, args.k, exhaustive=True) for v in base_vectors]
+
+    rows = []
+    for name, client, vectors in (("baseline hnsw", baseline, base_vectors), ("candidate", candidate, cand_vectors)):
+        start = time.perf_counter()
+        results = [_top_ids(client, v, args.k) for v in vectors]
+        ms = (time.perf_counter() - start) * 1000 / len(vectors)
+        rows.append((name, _recall(truth, results, args.k), ms))
+
+    print(f"{len(queries)} queries, k={args.k}; ground truth: exhaustive KNN on '{args.baseline}'")
+    for label, name in (("baseline", args.baseline), ("candidate", args.candidate)):
+        size = _size(index_client, name)
+        print(f"{label:<10} {name:<24} docs {size['documents']}  storage {_mib(size['storage'])}  "
+              f"vector index {_mib(size['vector_index'])}")
+    for name, recall, ms in rows:
+        print(f"{name:<14} recall@{args.k} {recall:6.3f}  {ms:7.1f} ms/query")
+
+
+if __name__ == "__main__":
+    main()